@@ -0,0 +1,137 @@
+"""Micro-batching of concurrent task parsing requests.
+
+Messages arriving within a short window are sent to the LLM as one
+completion returning a JSON array, and the results are fanned back out to
+the awaiting callers. If the batch fails, each message is parsed on its own.
+"""
+import asyncio
+from datetime import datetime
+from typing import Awaitable, Callable
+
+
+BatchParser = Callable[[list[str], datetime, list[int | None]], Awaitable[list[dict[str, str | None]]]]
+SingleParser = Callable[[str, datetime, int | None], Awaitable[dict[str, str | None]]]
+
+
+class ParseBatcher:
+    """Collects parse requests for a few milliseconds and sends them together."""
+
+    def __init__(
+        self,
+        parse_batch: BatchParser,
+        parse_single: SingleParser,
+        window: float = 0.02,
+        max_size: int = 8,
+    ) -> None:
+        """
+        Initialize the batcher.
+
+        Args:
+            parse_batch: Coroutine parsing a list of messages in one completion
+            parse_single: Coroutine parsing one message (used as fallback)
+            window: How long to wait for more messages, in seconds
+            max_size: Maximum number of messages in one batch
+        """
+        self.parse_batch = parse_batch
+        self.parse_single = parse_single
+        self.window = window
+        self.max_size = max_size
+
+        self._pending: list[tuple[str, int | None, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+        self.batches = 0
+        self.batched_messages = 0
+        self.fallbacks = 0
+
+    async def parse(self, user_message: str, user_id: int | None = None) -> dict[str, str | None]:
+        """
+        Queue a message for the next batch and wait for its result.
+
+        Args:
+            user_message: User's input message
+            user_id: Telegram user ID, used for fair queueing of LLM calls
+
+        Returns:
+            Dictionary with keys 'task' (str) and 'datetime' (str | None)
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((user_message, user_id, future))
+
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+
+        return await future
+
+    def _flush(self) -> None:
+        """Send all pending messages as one batch."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        task = asyncio.create_task(self._run(batch, datetime.now()))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: list[tuple[str, int | None, asyncio.Future]], current_dt: datetime) -> None:
+        """Parse a batch and resolve the callers' futures."""
+        if len(batch) == 1:
+            await self._run_single(*batch[0], current_dt)
+            return
+
+        try:
+            results = await self.parse_batch(
+                [message for message, _, _ in batch],
+                current_dt,
+                [user_id for _, user_id, _ in batch]
+            )
+        except Exception as e:
+            print(f"AI Batch Parsing Error, falling back to single requests: {e}")
+            self.fallbacks += 1
+            await asyncio.gather(*(
+                self._run_single(message, user_id, future, current_dt) for message, user_id, future in batch
+            ))
+            return
+
+        self.batches += 1
+        self.batched_messages += len(batch)
+        for (_, _, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def _run_single(
+        self, user_message: str, user_id: int | None, future: asyncio.Future, current_dt: datetime
+    ) -> None:
+        """Parse one message and resolve its future."""
+        if future.done():
+            return
+        try:
+            result = await self.parse_single(user_message, current_dt, user_id)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            return
+        if not future.done():
+            future.set_result(result)
+
+    def get_stats(self) -> dict[str, float]:
+        """
+        Return batching statistics.
+
+        Returns:
+            Dictionary with number of batches, batched messages, fallbacks and average batch size
+        """
+        return {
+            "batches": self.batches,
+            "batched_messages": self.batched_messages,
+            "fallbacks": self.fallbacks,
+            "avg_batch_size": self.batched_messages / self.batches if self.batches else 0.0,
+        }
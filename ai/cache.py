@@ -0,0 +1,153 @@
+"""In-process cache for task parsing results.
+
+Entries are keyed on the normalized message text. The scheduled time is
+stored as an offset from the moment of parsing, so a cached "через час"
+still resolves to one hour from *now* when reused later.
+"""
+import re
+import sys
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Anchors to the calendar or the clock - an offset from "now" is not stable for them
+ABSOLUTE_RE = re.compile(
+    r"\d[:.]\d|\bв\s+\d|\b(?:сегодня|завтра|послезавтра|вчера|утр|вечер|ноч|дн[её]м"
+    r"|обед|полд|полноч|понедельник|вторник|сред|четверг|пятниц|суббот|воскрес"
+    r"|январ|феврал|март|апрел|ма[йя]\b|июн|июл|август|сентябр|октябр|ноябр|декабр"
+    r"|числ|выходн|кажд|ежедн|будн)"
+)
+RELATIVE_RE = re.compile(r"\bчерез\b")
+
+
+def normalize_message(text: str) -> str:
+    """Normalize message text so that trivially different phrasings share a key."""
+    text = text.lower().replace("ё", "е")
+    text = " ".join(text.split())
+    return text.strip(" ,.!?:;-—")
+
+
+@dataclass
+class _Entry:
+    task: str
+    offset: timedelta | None
+    stored_at: float
+    size: int
+
+
+class ParseCache:
+    """Bounded LRU cache with TTL for parse_task_message results."""
+
+    def __init__(self, max_entries: int = 1000, max_bytes: int = 1_000_000, ttl: float = 86400) -> None:
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of cached messages
+            max_bytes: Approximate memory limit for keys and values
+            ttl: Entry lifetime in seconds
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, user_message: str, now: datetime) -> dict[str, str | None] | None:
+        """
+        Look up a cached parse and re-anchor it to the current time.
+
+        Args:
+            user_message: User's input message
+            now: Current datetime
+
+        Returns:
+            Parsed result in parse_task_message format or None on miss
+        """
+        key = normalize_message(user_message)
+        entry = self._entries.get(key)
+
+        if entry is not None and time.monotonic() - entry.stored_at > self.ttl:
+            self._remove(key)
+            entry = None
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+
+        scheduled = None
+        if entry.offset is not None:
+            scheduled = (now + entry.offset).strftime(DATETIME_FORMAT)
+        return {"task": entry.task, "datetime": scheduled}
+
+    def put(self, user_message: str, parsed: dict[str, str | None], now: datetime) -> None:
+        """
+        Store a parse result.
+
+        Results with a datetime are only cached when the message is purely
+        relative to the current moment ("через 2 часа"), because the stored
+        offset would be wrong for calendar anchored phrasings ("завтра в 9").
+
+        Args:
+            user_message: User's input message
+            parsed: Result of parse_task_message
+            now: Datetime the result was computed against
+        """
+        key = normalize_message(user_message)
+
+        offset = None
+        if parsed["datetime"]:
+            if not RELATIVE_RE.search(key) or ABSOLUTE_RE.search(key):
+                return
+            try:
+                offset = datetime.strptime(parsed["datetime"], DATETIME_FORMAT) - now
+            except ValueError:
+                return
+
+        size = sys.getsizeof(key) + sys.getsizeof(parsed["task"])
+        if size > self.max_bytes:
+            return
+
+        if key in self._entries:
+            self._remove(key)
+
+        self._entries[key] = _Entry(parsed["task"], offset, time.monotonic(), size)
+        self._bytes += size
+
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        """Remove an entry and release its size."""
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def get_stats(self) -> dict[str, float]:
+        """
+        Return cache statistics.
+
+        Returns:
+            Dictionary with hits, misses, evictions, entries, bytes and hit rate
+        """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
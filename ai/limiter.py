@@ -0,0 +1,206 @@
+"""Adaptive concurrency limiter for AI API calls.
+
+Caps the number of in-flight requests and adapts the cap AIMD-style: it
+grows slowly while requests succeed quickly and is cut on 429 responses or
+slow answers. Rate-limited requests are retried with jittered backoff,
+honoring Retry-After. Waiting callers are served round-robin per user so
+one chatty user cannot starve everyone else.
+"""
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, Hashable, TypeVar
+
+from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+
+
+T = TypeVar("T")
+
+
+def _retry_after(error: RateLimitError) -> float | None:
+    """Extract Retry-After (seconds) from a rate limit error, if present."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    value = response.headers.get("retry-after")
+    try:
+        return max(float(value), 0.0) if value is not None else None
+    except ValueError:
+        return None
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limiter with fair per-user queueing and retries."""
+
+    def __init__(
+        self,
+        max_limit: int = 8,
+        min_limit: int = 1,
+        latency_target: float = 10.0,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 20.0,
+    ) -> None:
+        """
+        Initialize the limiter.
+
+        Args:
+            max_limit: Upper bound for concurrent requests
+            min_limit: Lower bound for concurrent requests
+            latency_target: Responses slower than this (seconds) shrink the cap
+            max_retries: Retries for rate limited or failed requests
+            backoff_base: First backoff step in seconds
+            backoff_max: Maximum backoff in seconds
+        """
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.latency_target = latency_target
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.limit = float(max_limit)
+        self._inflight = 0
+        self._blocked_until = 0.0
+
+        # Per-user FIFO queues served in round-robin order
+        self._waiters: dict[Hashable, deque[asyncio.Future]] = {}
+        self._order: deque[Hashable] = deque()
+
+        self.rate_limited = 0
+        self.retries = 0
+
+    async def run(self, call: Callable[[], Awaitable[T]], user_id: Hashable = None) -> T:
+        """
+        Run an API call under the limiter, retrying on 429 and transient errors.
+
+        Args:
+            call: Factory returning a fresh awaitable for each attempt
+            user_id: Key for fair queueing (usually Telegram user ID)
+
+        Returns:
+            Result of the call
+
+        Raises:
+            Exception: The last error once retries are exhausted
+        """
+        attempt = 0
+        while True:
+            await self._acquire(user_id)
+            try:
+                pause = self._blocked_until - time.monotonic()
+                if pause > 0:
+                    await asyncio.sleep(pause)
+
+                started = time.monotonic()
+                result = await call()
+            except RateLimitError as e:
+                self.rate_limited += 1
+                self._decrease()
+                retry_after = _retry_after(e)
+                if retry_after is not None:
+                    self._blocked_until = max(self._blocked_until, time.monotonic() + retry_after)
+                if attempt >= self.max_retries:
+                    raise
+                delay = retry_after if retry_after is not None else self._backoff(attempt)
+            except (InternalServerError, APIConnectionError, APITimeoutError):
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+            else:
+                self._on_success(time.monotonic() - started)
+                return result
+            finally:
+                self._release()
+
+            attempt += 1
+            self.retries += 1
+            await asyncio.sleep(delay)
+
+    def _backoff(self, attempt: int) -> float:
+        """Exponential backoff with full jitter."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _on_success(self, latency: float) -> None:
+        """Additive increase on fast responses, multiplicative decrease on slow ones."""
+        if latency > self.latency_target:
+            self._decrease()
+        else:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._wake()
+
+    def _decrease(self) -> None:
+        """Halve the concurrency cap."""
+        self.limit = max(self.min_limit, self.limit / 2)
+
+    async def _acquire(self, user_id: Hashable) -> None:
+        """Wait for a free slot, queueing fairly per user."""
+        if self._inflight < int(self.limit) and not self._waiters:
+            self._inflight += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        if user_id not in self._waiters:
+            self._waiters[user_id] = deque()
+            self._order.append(user_id)
+        self._waiters[user_id].append(future)
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Slot was granted right before cancellation - give it back
+                self._release()
+            else:
+                self._discard(user_id, future)
+            raise
+
+    def _discard(self, user_id: Hashable, future: asyncio.Future) -> None:
+        """Remove a cancelled waiter from its user queue."""
+        queue = self._waiters.get(user_id)
+        if queue is None:
+            return
+        try:
+            queue.remove(future)
+        except ValueError:
+            return
+        if not queue:
+            del self._waiters[user_id]
+            self._order.remove(user_id)
+
+    def _release(self) -> None:
+        """Free a slot and hand it to the next waiter."""
+        self._inflight -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        """Grant free slots to waiting users in round-robin order."""
+        while self._order and self._inflight < int(self.limit):
+            user_id = self._order.popleft()
+            queue = self._waiters[user_id]
+            future = queue.popleft()
+            if queue:
+                self._order.append(user_id)
+            else:
+                del self._waiters[user_id]
+
+            if future.done():
+                continue
+            self._inflight += 1
+            future.set_result(None)
+
+    def get_stats(self) -> dict[str, float]:
+        """
+        Return limiter statistics.
+
+        Returns:
+            Dictionary with current cap, in-flight and queued requests, 429 count and retries
+        """
+        return {
+            "limit": self.limit,
+            "inflight": self._inflight,
+            "queued": sum(len(queue) for queue in self._waiters.values()),
+            "rate_limited": self.rate_limited,
+            "retries": self.retries,
+        }
@@ -0,0 +1,224 @@
+"""Rule-based parser for common Russian date/time phrasings.
+
+Resolves simple messages like "завтра в 9 купить хлеб" or "через 2 часа
+позвонить" in-process, so the LLM is only asked when the phrasing is unusual.
+The parser is deliberately conservative: anything it does not fully
+understand is rejected and left for the LLM.
+"""
+import re
+from datetime import datetime, timedelta
+
+
+# Longer messages usually carry context that needs the LLM to extract the task
+MAX_WORDS = 12
+
+NUMBER_WORDS = {
+    "один": 1, "одну": 1, "одна": 1, "пару": 2, "два": 2, "две": 2,
+    "три": 3, "четыре": 4, "пять": 5, "шесть": 6, "семь": 7, "восемь": 8,
+    "девять": 9, "десять": 10, "пятнадцать": 15, "двадцать": 20,
+    "тридцать": 30, "сорок": 40,
+}
+
+WEEKDAYS = {
+    "понедельник": 0, "вторник": 1, "среду": 2, "среда": 2, "четверг": 3,
+    "пятницу": 4, "пятница": 4, "субботу": 5, "суббота": 5, "воскресенье": 6,
+}
+
+DAY_WORDS = {"сегодня": 0, "завтра": 1, "послезавтра": 2}
+
+_NUMBER = r"\d{1,3}|" + "|".join(NUMBER_WORDS)
+
+RELATIVE_RE = re.compile(
+    rf"\bчерез\s+(?:(?P<amount>{_NUMBER})\s+)?"
+    r"(?P<unit>полчаса|минут[уы]?|час(?:а|ов)?|д(?:ень|ня|ней)|недел[юиь])\b"
+)
+WEEKDAY_RE = re.compile(
+    r"\bв(?:о)?\s+(?:(?P<modifier>следующ(?:ий|ую|ее)|эт(?:от|у|о))\s+)?"
+    r"(?P<weekday>" + "|".join(WEEKDAYS) + r")\b"
+)
+DAY_RE = re.compile(r"\b(?P<day>" + "|".join(DAY_WORDS) + r")\b")
+# A bare "12.05" is usually a date (dd.mm), so a dot separates hours and
+# minutes only after "в" or before "ч"/"час" ("12.05 ч")
+TIME_RE = re.compile(
+    r"(?:\bв\s+(?P<hour>\d{1,2})(?:[:.](?P<minute>\d{2}))?"
+    r"|\b(?P<hour2>\d{1,2})(?::|\.(?=\d{2}\s*ч))(?P<minute2>\d{2}))"
+    r"(?:\s+час(?:а|ов)?|\s*ч\b)?"
+    r"(?:\s+(?P<period>утра|дня|вечера|ночи))?\b"
+)
+
+# A time right after these is a deadline or a range ("до 18:00", "к 9:30"),
+# not the moment to remind at
+TIME_PREPOSITION_RE = re.compile(r"\b(?:до|к|ко|после|около|от|с|со)\s+$")
+
+FILLER_RE = re.compile(
+    r"^(?:напомни(?:те)?|напомнить)(?:\s+мне)?(?:\s+(?:о|об|про|что|чтобы))?\b",
+    re.IGNORECASE,
+)
+POLITE_RE = re.compile(r"\bпожалуйста\b", re.IGNORECASE)
+
+# Leftovers that mean the message has a time expression we did not understand
+UNRESOLVED_RE = re.compile(
+    r"\d|\b(?:утр|вечер|ноч|дн[её]м|обед|полд|полноч|недел|месяц|год|выходн"
+    r"|понедельник|вторник|сред|четверг|пятниц|суббот|воскрес|январ|феврал"
+    r"|март|апрел|ма[йя]\b|июн|июл|август|сентябр|октябр|ноябр|декабр"
+    r"|сегодня|завтра|послезавтра|через|числ|минут|час|кажд|ежедн|будн"
+    r"|рано|поздн|скоро|позже|потом|вчера)",
+    re.IGNORECASE,
+)
+
+
+def _parse_amount(value: str | None) -> int:
+    """Convert a number written with digits or words to int (default 1)."""
+    if value is None:
+        return 1
+    if value.isdigit():
+        return int(value)
+    return NUMBER_WORDS[value]
+
+
+def _relative_delta(amount: int, unit: str) -> timedelta:
+    """Map a "через N <unit>" expression to a timedelta."""
+    if unit == "полчаса":
+        return timedelta(minutes=30)
+    if unit.startswith("минут"):
+        return timedelta(minutes=amount)
+    if unit.startswith("час"):
+        return timedelta(hours=amount)
+    if unit.startswith("недел"):
+        return timedelta(weeks=amount)
+    return timedelta(days=amount)
+
+
+def _resolve_time(match: re.Match) -> tuple[int, int] | None:
+    """
+    Resolve hour and minute from a time match.
+
+    Returns:
+        (hour, minute) or None if the time is ambiguous or invalid
+    """
+    hour = int(match.group("hour") or match.group("hour2"))
+    minute_str = match.group("minute") or match.group("minute2")
+    minute = int(minute_str) if minute_str else 0
+    period = match.group("period")
+
+    if period in ("дня", "вечера") and hour < 12:
+        hour += 12
+    elif period == "ночи" and hour == 12:
+        hour = 0
+    elif period is None and minute_str is None and hour < 8:
+        # "в 3" may mean 03:00 or 15:00 - let the LLM decide
+        return None
+
+    if hour > 23 or minute > 59:
+        return None
+    return hour, minute
+
+
+def _single_match(pattern: re.Pattern, text: str) -> re.Match | None | bool:
+    """Return the only match of pattern, None if absent, False if repeated."""
+    matches = list(pattern.finditer(text))
+    if len(matches) > 1:
+        return False
+    return matches[0] if matches else None
+
+
+def _normalize(text: str) -> str:
+    """Lowercase text and fold ё into е for matching (keeps character positions)."""
+    return text.lower().replace("ё", "е")
+
+
+def _clean_task(text: str, spans: list[tuple[int, int]]) -> str | None:
+    """Cut matched date/time spans out of the original text and tidy up the task."""
+    for start, end in sorted(spans, reverse=True):
+        text = text[:start] + " " + text[end:]
+
+    text = " ".join(text.split())
+    text = FILLER_RE.sub("", text)
+    text = POLITE_RE.sub("", text)
+    text = " ".join(text.split()).strip(" ,.!?:;-—")
+
+    if not text or UNRESOLVED_RE.search(_normalize(text)):
+        return None
+    return text[0].upper() + text[1:]
+
+
+def parse_task_locally(user_message: str, now: datetime) -> dict[str, str | None] | None:
+    """
+    Try to parse a task message without calling the LLM.
+
+    Args:
+        user_message: User's input message
+        now: Current datetime used to resolve relative expressions
+
+    Returns:
+        Dictionary with keys 'task' and 'datetime' in the same format as
+        AIService.parse_task_message, or None if the parser is not confident
+    """
+    if "\n" in user_message or len(user_message.split()) > MAX_WORDS:
+        return None
+
+    # Patterns match a normalized copy; spans are cut from the untouched message
+    text = _normalize(user_message)
+    if len(text) != len(user_message):
+        return None
+
+    relative = _single_match(RELATIVE_RE, text)
+    weekday = _single_match(WEEKDAY_RE, text)
+    day = _single_match(DAY_RE, text)
+    time = _single_match(TIME_RE, text)
+    if False in (relative, weekday, day, time):
+        return None
+
+    if time and TIME_PREPOSITION_RE.search(text[:time.start()]):
+        return None
+
+    date_parts = [m for m in (relative, weekday, day) if m]
+    if len(date_parts) > 1:
+        return None
+
+    spans = [m.span() for m in (relative, weekday, day, time) if m]
+    task = _clean_task(user_message, spans)
+    if task is None:
+        return None
+
+    clock = _resolve_time(time) if time else None
+    if time and clock is None:
+        return None
+
+    if relative:
+        unit = relative.group("unit")
+        delta = _relative_delta(_parse_amount(relative.group("amount")), unit)
+        scheduled = now.replace(microsecond=0) + delta
+        if clock:
+            # "через 2 часа в 15:00" is contradictory, "через 2 дня в 15:00" is not
+            if delta < timedelta(days=1):
+                return None
+            scheduled = scheduled.replace(hour=clock[0], minute=clock[1], second=0)
+    elif weekday or day:
+        if clock is None:
+            # No time of day given - the LLM knows better what to pick
+            return None
+        if weekday:
+            if weekday.group("modifier"):
+                # "следующий вторник" may mean this or next week's Tuesday - let the LLM decide
+                return None
+            target = WEEKDAYS[weekday.group("weekday")]
+            days_ahead = (target - now.weekday()) % 7 or 7
+        else:
+            days_ahead = DAY_WORDS[day.group("day")]
+        scheduled = (now + timedelta(days=days_ahead)).replace(
+            hour=clock[0], minute=clock[1], second=0, microsecond=0
+        )
+        if scheduled <= now:
+            return None
+    elif clock:
+        scheduled = now.replace(hour=clock[0], minute=clock[1], second=0, microsecond=0)
+        if scheduled <= now:
+            scheduled += timedelta(days=1)
+    else:
+        scheduled = None
+
+    return {
+        "task": task,
+        "datetime": scheduled.strftime("%Y-%m-%d %H:%M:%S") if scheduled else None,
+    }
@@ -0,0 +1,197 @@
+"""LLM providers and latency-budget hedged requests.
+
+Requests go to the primary provider first. If it has not answered within
+the latency budget (or has failed), the same request is sent to the next
+provider; the first successful answer wins and the others are cancelled.
+"""
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, TypeVar
+
+from openai import AsyncOpenAI
+
+from .limiter import AdaptiveLimiter
+
+
+T = TypeVar("T")
+
+# Number of latency samples kept per provider for percentiles
+LATENCY_WINDOW = 200
+
+
+@dataclass
+class Provider:
+    """Chat completion provider (OpenAI-compatible API) with its own limiter and stats."""
+
+    name: str
+    client: AsyncOpenAI
+    model: str
+    limiter: AdaptiveLimiter
+    # Cleared when the provider rejects JSON schema output; its requests then use the text path
+    structured_output: bool = True
+    requests: int = 0
+    wins: int = 0
+    errors: int = 0
+    cancelled: int = 0
+    latencies: deque[float] = field(default_factory=lambda: deque(maxlen=LATENCY_WINDOW))
+
+    def get_stats(self) -> dict[str, float]:
+        """
+        Return latency and win-rate statistics of the provider.
+
+        Returns:
+            Dictionary with structured output support (1/0), request counters,
+            win rate and latency percentiles (seconds)
+        """
+        samples = sorted(self.latencies)
+
+        def percentile(q: float) -> float:
+            return samples[min(len(samples) - 1, int(q * len(samples)))] if samples else 0.0
+
+        return {
+            "structured_output": int(self.structured_output),
+            "requests": self.requests,
+            "wins": self.wins,
+            "errors": self.errors,
+            "cancelled": self.cancelled,
+            "win_rate": self.wins / self.requests if self.requests else 0.0,
+            "latency_p50": percentile(0.5),
+            "latency_p95": percentile(0.95),
+            "latency_p99": percentile(0.99),
+        }
+
+
+def parse_providers(value: str, limiter_settings: dict) -> list[Provider]:
+    """
+    Parse additional providers from an environment variable.
+
+    Format: "base_url,api_key,model;base_url,api_key,model"
+
+    Args:
+        value: Environment variable value
+        limiter_settings: Keyword arguments for each provider's AdaptiveLimiter
+
+    Returns:
+        List of providers in the given order
+
+    Raises:
+        ValueError: If an entry does not have exactly three fields
+    """
+    providers = []
+    for index, entry in enumerate(item.strip() for item in value.split(";")):
+        if not entry:
+            continue
+        parts = [part.strip() for part in entry.split(",")]
+        if len(parts) != 3:
+            raise ValueError(f"Invalid provider entry (expected base_url,api_key,model): {entry}")
+        base_url, api_key, model = parts
+        providers.append(Provider(
+            name=f"fallback{index + 1}:{model}",
+            client=AsyncOpenAI(api_key=api_key, base_url=base_url, max_retries=0),
+            model=model,
+            limiter=AdaptiveLimiter(**limiter_settings),
+        ))
+    return providers
+
+
+class HedgedCaller:
+    """Runs a request against an ordered list of providers with hedging."""
+
+    def __init__(self, providers: list[Provider], hedge_delay: float) -> None:
+        """
+        Initialize the caller.
+
+        Args:
+            providers: Providers in priority order (primary first)
+            hedge_delay: Latency budget in seconds before the next provider is tried
+        """
+        self.providers = providers
+        self.hedge_delay = hedge_delay
+        self.hedges = 0
+
+    async def call(self, request: Callable[[Provider], Awaitable[T]]) -> T:
+        """
+        Run a request, hedging to the next provider when the budget is exceeded.
+
+        Args:
+            request: Coroutine factory performing the request on a provider
+
+        Returns:
+            Result of the first provider that answered successfully
+
+        Raises:
+            Exception: The first error if every provider failed
+        """
+        if len(self.providers) == 1:
+            result = await self._timed(self.providers[0], request)
+            self.providers[0].wins += 1
+            return result
+
+        pending: dict[asyncio.Task, Provider] = {}
+        errors: list[BaseException] = []
+        next_index = 0
+
+        def launch() -> None:
+            nonlocal next_index
+            provider = self.providers[next_index]
+            next_index += 1
+            pending[asyncio.create_task(self._timed(provider, request))] = provider
+
+        launch()
+        try:
+            while pending:
+                timeout = self.hedge_delay if next_index < len(self.providers) else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    # Latency budget exceeded - hedge to the next provider
+                    self.hedges += 1
+                    launch()
+                    continue
+
+                for task in done:
+                    provider = pending.pop(task)
+                    if task.exception() is None:
+                        provider.wins += 1
+                        return task.result()
+                    errors.append(task.exception())
+
+                # Fail over right away instead of waiting for the budget
+                if next_index < len(self.providers):
+                    launch()
+
+            raise errors[0]
+        finally:
+            for task, provider in pending.items():
+                task.cancel()
+                provider.cancelled += 1
+
+    @staticmethod
+    async def _timed(provider: Provider, request: Callable[[Provider], Awaitable[T]]) -> T:
+        """Run a request on a provider and record its latency."""
+        provider.requests += 1
+        started = time.monotonic()
+        try:
+            result = await request(provider)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            provider.errors += 1
+            raise
+        provider.latencies.append(time.monotonic() - started)
+        return result
+
+    def get_stats(self) -> dict[str, float]:
+        """
+        Return per-provider statistics.
+
+        Returns:
+            Dictionary with the hedge count and "<provider>_<stat>" entries
+        """
+        stats: dict[str, float] = {"hedges": self.hedges}
+        for provider in self.providers:
+            for key, value in provider.get_stats().items():
+                stats[f"{provider.name}_{key}"] = value
+        return stats
@@ -0,0 +1,60 @@
+"""Typed task parsing result and its JSON schema for structured output."""
+from dataclasses import dataclass
+from datetime import datetime
+
+
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# JSON schema sent to providers that support structured output
+TASK_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "task": {"type": "string", "description": "Описание задачи"},
+        "datetime": {
+            "type": ["string", "null"],
+            "description": "Время напоминания в формате YYYY-MM-DD HH:MM:SS или null",
+        },
+    },
+    "required": ["task", "datetime"],
+    "additionalProperties": False,
+}
+
+
+@dataclass(frozen=True)
+class ParsedTask:
+    """Validated result of task parsing."""
+
+    task: str
+    datetime: str | None
+
+    @classmethod
+    def from_dict(cls, data: object) -> "ParsedTask":
+        """
+        Validate decoded JSON and build a ParsedTask.
+
+        Args:
+            data: Decoded JSON value
+
+        Returns:
+            Validated ParsedTask
+
+        Raises:
+            ValueError: If the structure, types or datetime format are invalid
+        """
+        if not isinstance(data, dict) or set(data) != {"task", "datetime"}:
+            raise ValueError(f"Invalid response structure: {data}")
+
+        task = data["task"]
+        scheduled = data["datetime"]
+        if not isinstance(task, str) or not task.strip():
+            raise ValueError(f"Invalid task: {task!r}")
+        if scheduled is not None:
+            if not isinstance(scheduled, str):
+                raise ValueError(f"Invalid datetime: {scheduled!r}")
+            datetime.strptime(scheduled, DATETIME_FORMAT)
+
+        return cls(task=task.strip(), datetime=scheduled or None)
+
+    def to_dict(self) -> dict[str, str | None]:
+        """Return the result in the parse_task_message dict format."""
+        return {"task": self.task, "datetime": self.datetime}
@@ -1,9 +1,74 @@
+import asyncio
+import io
 import os
 import json
 from datetime import datetime
+from typing import BinaryIO
 from json_repair import repair_json
-from openai import AsyncOpenAI
-from pathlib import Path
+from openai import AsyncOpenAI, BadRequestError
+
+from .batcher import ParseBatcher
+from .cache import ParseCache
+from .limiter import AdaptiveLimiter
+from .local_parser import parse_task_locally
+from .providers import HedgedCaller, Provider, parse_providers
+from .schema import TASK_SCHEMA, ParsedTask
+
+
+# Static instructions - must stay byte-identical between requests so that
+# providers can cache the prompt prefix. The current time is sent separately.
+SYSTEM_PROMPT = """Ты — умный парсер задач для таск-менеджера. Твоя задача — извлекать из сообщения пользователя описание задачи и время напоминания.
+
+Текущее время (UTC+3) передаётся отдельным сообщением после этих инструкций.
+
+ПРАВИЛА:
+1. Извлеки суть задачи из сообщения пользователя
+2. Если указано время/дата — рассчитай точную дату и время в формате "YYYY-MM-DD HH:MM:SS"
+3. Понимай относительные времена: "завтра", "через час", "в следующий вторник", "послезавтра в 15:00" и т.д.
+4. Если время НЕ указано — верни null в поле datetime
+5. Возвращай ТОЛЬКО чистый JSON, БЕЗ markdown блоков (```json)
+
+ФОРМАТ ОТВЕТА:
+{"task": "описание задачи", "datetime": "YYYY-MM-DD HH:MM:SS"}
+
+ИЛИ если времени нет:
+{"task": "описание задачи", "datetime": null}
+
+ПРИМЕРЫ (текущее время 2025-12-29 20:15:49):
+Пользователь: "Напомни купить хлеба завтра в 9 утра"
+Ответ: {"task": "Купить хлеба", "datetime": "2025-12-30 09:00:00"}
+
+Пользователь: "Позвонить маме"
+Ответ: {"task": "Позвонить маме", "datetime": null}
+
+Пользователь: "Через 2 часа сходить в магазин"
+Ответ: {"task": "Сходить в магазин", "datetime": "2025-12-29 22:15:49"}"""
+
+BATCH_PROMPT_SUFFIX = """
+
+ПАКЕТНЫЙ РЕЖИМ:
+Пользователь пришлёт JSON-массив сообщений. Верни JSON-массив ответов той же длины и в том же порядке, по одному объекту на сообщение."""
+
+
+# Words in a 400 error that mean the provider rejected the structured output request itself
+STRUCTURED_OUTPUT_ERROR_MARKERS = ("response_format", "json_schema", "structured output", "structured_output")
+
+
+def is_structured_output_error(error: BadRequestError) -> bool:
+    """
+    Check whether a 400 error is about the JSON schema response format.
+    
+    Other 400s (context length, content filter, ...) must not disable the
+    structured mode for the whole process.
+    
+    Args:
+        error: Error returned by the provider
+        
+    Returns:
+        True if the error mentions response_format / json_schema
+    """
+    text = f"{error} {error.body}".lower()
+    return any(marker in text for marker in STRUCTURED_OUTPUT_ERROR_MARKERS)
 
 
 class AIService:
@@ -18,9 +83,11 @@ class AIService:
             raise ValueError("AI_API_KEY is not set in environment variables")
         
         # Client for chat (via OpenRouter or custom provider)
+        # Retries are handled by the limiters below, so the SDK ones are off
         self.client = AsyncOpenAI(
             api_key=api_key,
-            base_url=base_url
+            base_url=base_url,
+            max_retries=0
         )
         
         # Client for Whisper (native OpenAI API only)
@@ -28,55 +95,190 @@ class AIService:
         openai_key = os.getenv("OPENAI_API_KEY", api_key)
         self.whisper_client = AsyncOpenAI(
             api_key=openai_key,
-            base_url="https://api.openai.com/v1"
+            base_url="https://api.openai.com/v1",
+            max_retries=0
         )
         
         # Using DeepSeek V3 - fast and cheap model
         self.model = "deepseek/deepseek-chat"
+        
+        # Concurrency limiters with 429-aware retries, one per upstream API
+        limiter_settings = dict(
+            max_limit=int(os.getenv("AI_MAX_CONCURRENCY", "8")),
+            max_retries=int(os.getenv("AI_MAX_RETRIES", "3")),
+            latency_target=float(os.getenv("AI_LATENCY_TARGET", "10"))
+        )
+        self.chat_limiter = AdaptiveLimiter(**limiter_settings)
+        self.whisper_limiter = AdaptiveLimiter(**limiter_settings)
+        
+        # Ordered chat providers: the primary one above plus optional fallbacks.
+        # A request is hedged to the next provider after AI_HEDGE_DELAY_MS.
+        providers = [Provider("primary", self.client, self.model, self.chat_limiter)]
+        providers += parse_providers(os.getenv("AI_FALLBACK_PROVIDERS", ""), limiter_settings)
+        self.providers = HedgedCaller(
+            providers,
+            hedge_delay=float(os.getenv("AI_HEDGE_DELAY_MS", "3000")) / 1000
+        )
+        
+        # Structured output (JSON schema) mode, falls back to the text path
+        self.structured_output = os.getenv("AI_STRUCTURED_OUTPUT", "0") == "1"
+        self.parse_stats = {"structured_calls": 0, "structured_errors": 0, "text_calls": 0, "repairs": 0}
+        
+        # Token accounting from the API "usage" field
+        self.token_usage = {"requests": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0}
+        
+        # Counters for the local fast path (see get_stats)
+        self.local_hits = 0
+        self.llm_calls = 0
+        
+        # Cache of LLM parses for repeated phrasings
+        self.parse_cache = ParseCache(
+            max_entries=int(os.getenv("AI_CACHE_SIZE", "1000")),
+            max_bytes=int(os.getenv("AI_CACHE_MAX_BYTES", "1000000")),
+            ttl=float(os.getenv("AI_CACHE_TTL", "86400"))
+        )
+        
+        # Optional micro-batching of concurrent LLM parses (disabled when window is 0)
+        batch_window_ms = float(os.getenv("AI_BATCH_WINDOW_MS", "0"))
+        self.batcher: ParseBatcher | None = None
+        if batch_window_ms > 0:
+            self.batcher = ParseBatcher(
+                parse_batch=self._parse_batch_with_llm,
+                parse_single=self._parse_with_llm,
+                window=batch_window_ms / 1000,
+                max_size=int(os.getenv("AI_BATCH_SIZE", "8"))
+            )
 
-    def _build_system_prompt(self, current_datetime: str) -> str:
+    def get_stats(self) -> dict[str, float]:
         """
-        Build system prompt with current datetime for task parsing.
+        Return usage counters of the service.
+        
+        Returns:
+            Dictionary with local parser hits, LLM calls, local hit rate
+            parse cache statistics (prefixed with "cache_") and batching
+            statistics (prefixed with "batch_") when batching is enabled,
+            limiter statistics (prefixed with "chat_" and "whisper_"),
+            per-provider latency and win rate (prefixed with "provider_") and
+            token usage (prefixed with "tokens_"), structured/text path
+            counters (prefixed with "parse_")
+        """
+        total = self.local_hits + self.llm_calls
+        stats = {
+            "local_hits": self.local_hits,
+            "llm_calls": self.llm_calls,
+            "local_hit_rate": self.local_hits / total if total else 0.0,
+        }
+        for key, value in self.parse_cache.get_stats().items():
+            stats[f"cache_{key}"] = value
+        if self.batcher is not None:
+            for key, value in self.batcher.get_stats().items():
+                stats[f"batch_{key}"] = value
+        for key, value in self.chat_limiter.get_stats().items():
+            stats[f"chat_{key}"] = value
+        for key, value in self.whisper_limiter.get_stats().items():
+            stats[f"whisper_{key}"] = value
+        for key, value in self.providers.get_stats().items():
+            stats[f"provider_{key}"] = value
+        for key, value in self.parse_stats.items():
+            stats[f"parse_{key}"] = value
+        for key, value in self.token_usage.items():
+            stats[f"tokens_{key}"] = value
+        prompt_tokens = self.token_usage["prompt_tokens"]
+        stats["tokens_cached_ratio"] = self.token_usage["cached_tokens"] / prompt_tokens if prompt_tokens else 0.0
+        return stats
+
+    def _build_messages(self, user_content: str, current_dt: datetime, batch: bool = False) -> list[dict[str, str]]:
+        """
+        Build chat messages for task parsing.
+        
+        The static instructions come first and are byte-identical across
+        calls, so providers can cache the prompt prefix. The current time is
+        sent in a small trailing system message.
         
         Args:
-            current_datetime: Current date and time in format "YYYY-MM-DD HH:MM:SS"
+            user_content: User message (or JSON array of messages in batch mode)
+            current_dt: Current datetime used as the anchor for relative times
+            batch: Whether the request parses several messages at once
             
         Returns:
-            System prompt for AI
+            List of chat messages
         """
-        return f"""Ты — умный парсер задач для таск-менеджера. Твоя задача — извлекать из сообщения пользователя описание задачи и время напоминания.
-
-ТЕКУЩЕЕ ВРЕМЯ: {current_datetime} (UTC+3)
-
-ПРАВИЛА:
-1. Извлеки суть задачи из сообщения пользователя
-2. Если указано время/дата — рассчитай точную дату и время в формате "YYYY-MM-DD HH:MM:SS"
-3. Понимай относительные времена: "завтра", "через час", "в следующий вторник", "послезавтра в 15:00" и т.д.
-4. Если время НЕ указано — верни null в поле datetime
-5. Возвращай ТОЛЬКО чистый JSON, БЕЗ markdown блоков (```json)
-
-ФОРМАТ ОТВЕТА:
-{{"task": "описание задачи", "datetime": "YYYY-MM-DD HH:MM:SS"}}
-
-ИЛИ если времени нет:
-{{"task": "описание задачи", "datetime": null}}
+        system_prompt = SYSTEM_PROMPT + BATCH_PROMPT_SUFFIX if batch else SYSTEM_PROMPT
+        current_datetime_str = current_dt.strftime("%Y-%m-%d %H:%M:%S")
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "system", "content": f"ТЕКУЩЕЕ ВРЕМЯ: {current_datetime_str} (UTC+3)"},
+            {"role": "user", "content": user_content}
+        ]
 
-ПРИМЕРЫ:
-Пользователь: "Напомни купить хлеба завтра в 9 утра"
-Ответ: {{"task": "Купить хлеба", "datetime": "2025-12-30 09:00:00"}}
+    async def _complete(self, user_id: int | None, **kwargs):
+        """
+        Run a chat completion across the configured providers.
+        
+        Each provider call goes through its own concurrency limiter; slow
+        requests are hedged to the next provider (see HedgedCaller).
+        
+        Args:
+            user_id: Telegram user ID, used for fair queueing
+            **kwargs: Arguments for chat.completions.create (without model)
+            
+        Returns:
+            Chat completion response
+        """
+        async def request(provider: Provider):
+            return await self._request(provider, user_id, **kwargs)
+        
+        response = await self.providers.call(request)
+        self._record_usage(response)
+        return response
 
-Пользователь: "Позвонить маме"
-Ответ: {{"task": "Позвонить маме", "datetime": null}}
+    @staticmethod
+    async def _request(provider: Provider, user_id: int | None, **kwargs):
+        """
+        Run a chat completion on one provider through its concurrency limiter.
+        
+        Args:
+            provider: Provider to call
+            user_id: Telegram user ID, used for fair queueing
+            **kwargs: Arguments for chat.completions.create (without model)
+            
+        Returns:
+            Chat completion response
+        """
+        return await provider.limiter.run(
+            lambda: provider.client.chat.completions.create(model=provider.model, **kwargs),
+            user_id
+        )
 
-Пользователь: "Через 2 часа сходить в магазин"
-Ответ: {{"task": "Сходить в магазин", "datetime": "2025-12-29 22:15:49"}}"""
+    def _record_usage(self, response) -> None:
+        """
+        Add token usage of a chat completion to the counters.
+        
+        Args:
+            response: Chat completion response
+        """
+        usage = getattr(response, "usage", None)
+        self.token_usage["requests"] += 1
+        if usage is None:
+            return
+        
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", None) or 0
+        self.token_usage["prompt_tokens"] += usage.prompt_tokens or 0
+        self.token_usage["cached_tokens"] += cached
+        self.token_usage["completion_tokens"] += usage.completion_tokens or 0
 
-    async def parse_task_message(self, user_message: str) -> dict[str, str | None]:
+    async def parse_task_message(self, user_message: str, user_id: int | None = None) -> dict[str, str | None]:
         """
         Parse user message to extract task and scheduled datetime.
         
+        Simple phrasings are resolved by the local rule-based parser,
+        repeated phrasings are served from the parse cache and everything
+        else is sent to the LLM.
+        
         Args:
             user_message: User's input message
+            user_id: Telegram user ID, used for fair queueing of LLM calls
             
         Returns:
             Dictionary with keys 'task' (str) and 'datetime' (str | None)
@@ -85,89 +287,272 @@ class AIService:
         Raises:
             Exception: If API call fails or response parsing fails
         """
+        # Get current datetime in UTC+3
+        current_dt = datetime.now()
+        
+        # Fast path: common phrasings are resolved without calling the LLM
+        parsed = parse_task_locally(user_message, current_dt)
+        if parsed is not None:
+            self.local_hits += 1
+            return parsed
+        
+        parsed = self.parse_cache.get(user_message, current_dt)
+        if parsed is not None:
+            return parsed
+        
+        self.llm_calls += 1
+        if self.batcher is not None:
+            parsed = await self.batcher.parse(user_message, user_id)
+        else:
+            parsed = await self._parse_with_llm(user_message, current_dt, user_id)
+        self.parse_cache.put(user_message, parsed, current_dt)
+        return parsed
+
+    async def _parse_with_llm(
+        self, user_message: str, current_dt: datetime, user_id: int | None = None
+    ) -> dict[str, str | None]:
+        """
+        Parse user message with the LLM.
+        
+        Uses structured output when enabled and falls back to the text path
+        if the request is rejected or returns an invalid result.
+        
+        Args:
+            user_message: User's input message
+            current_dt: Current datetime used as the anchor for relative times
+            user_id: Telegram user ID, used for fair queueing
+            
+        Returns:
+            Dictionary with keys 'task' (str) and 'datetime' (str | None)
+            
+        Raises:
+            Exception: If API call fails or response parsing fails
+        """
+        messages = self._build_messages(user_message, current_dt)
+        
+        if self.structured_output:
+            try:
+                return await self._parse_structured(messages, user_id)
+            except BadRequestError as e:
+                # Unrelated 400 (e.g. content filter) - keep the mode, retry this call as text
+                self.parse_stats["structured_errors"] += 1
+                print(f"Structured output request rejected, falling back to text mode: {e}")
+            except ValueError as e:
+                self.parse_stats["structured_errors"] += 1
+                print(f"Invalid structured output, falling back to text mode: {e}")
+        
         try:
-            # Get current datetime in UTC+3
-            current_dt = datetime.now()
-            current_datetime_str = current_dt.strftime("%Y-%m-%d %H:%M:%S")
-            
-            system_prompt = self._build_system_prompt(current_datetime_str)
-            
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_message}
-                ],
+            self.parse_stats["text_calls"] += 1
+            response = await self._complete(
+                user_id,
+                messages=messages,
                 max_tokens=300,
                 temperature=0.3  # Lower temperature for more consistent parsing
             )
             
-            # Extract the response content
-            if response.choices and len(response.choices) > 0:
-                content = response.choices[0].message.content
-                if not content:
-                    raise ValueError("Empty response from AI")
-                
-                # Clean up the response (remove markdown code blocks if present)
-                content = content.strip()
-                if content.startswith("```json"):
-                    content = content[7:]
-                if content.startswith("```"):
-                    content = content[3:]
-                if content.endswith("```"):
-                    content = content[:-3]
-                content = content.strip()
-                
-                # Try to parse JSON, use json_repair if needed
-                try:
-                    parsed = json.loads(content)
-                except json.JSONDecodeError:
-                    # Try to repair the JSON
-                    repaired = repair_json(content)
-                    parsed = json.loads(repaired)
-                
-                # Validate structure
-                if not isinstance(parsed, dict) or 'task' not in parsed or 'datetime' not in parsed:
-                    raise ValueError(f"Invalid response structure: {parsed}")
-                
-                return {
-                    "task": str(parsed["task"]),
-                    "datetime": str(parsed["datetime"]) if parsed["datetime"] else None
-                }
-            else:
-                raise ValueError("No response from AI")
+            return self._validate_result(self._load_json(response))
                 
         except Exception as e:
             # Log the error (in production, use proper logging)
             print(f"AI Task Parsing Error: {e}")
             raise
 
-    async def transcribe_voice(self, audio_file_path: str) -> str:
+    async def _parse_structured(self, messages: list[dict[str, str]], user_id: int | None = None) -> dict[str, str | None]:
+        """
+        Parse a task with JSON schema structured output.
+        
+        Support is tracked per provider: a provider that rejects the JSON
+        schema is switched to the text path and the request is retried on it
+        as text, without affecting the other providers.
+        
+        Args:
+            messages: Chat messages built by _build_messages
+            user_id: Telegram user ID, used for fair queueing
+            
+        Returns:
+            Dictionary with keys 'task' (str) and 'datetime' (str | None)
+            
+        Raises:
+            BadRequestError: If the request is rejected for another reason
+            ValueError: If the response does not match the schema
+        """
+        async def request(provider: Provider):
+            if provider.structured_output:
+                try:
+                    response = await self._request(
+                        provider,
+                        user_id,
+                        messages=messages,
+                        response_format={
+                            "type": "json_schema",
+                            "json_schema": {"name": "task", "strict": True, "schema": TASK_SCHEMA}
+                        },
+                        max_tokens=120,  # A single short JSON object
+                        temperature=0.3
+                    )
+                    return response, True
+                except BadRequestError as e:
+                    if not is_structured_output_error(e):
+                        raise
+                    # This provider or model does not support JSON schema output
+                    print(f"Structured output is not supported by {provider.name}, switching it to text mode: {e}")
+                    provider.structured_output = False
+            
+            response = await self._request(provider, user_id, messages=messages, max_tokens=300, temperature=0.3)
+            return response, False
+        
+        response, structured = await self.providers.call(request)
+        self._record_usage(response)
+        
+        if not structured:
+            self.parse_stats["text_calls"] += 1
+            return self._validate_result(self._load_json(response))
+        
+        self.parse_stats["structured_calls"] += 1
+        if not response.choices or not response.choices[0].message.content:
+            raise ValueError("Empty response from AI")
+        try:
+            data = json.loads(response.choices[0].message.content)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON in structured output: {e}") from e
+        return ParsedTask.from_dict(data).to_dict()
+
+    async def _parse_batch_with_llm(
+        self, user_messages: list[str], current_dt: datetime, user_ids: list[int | None] | None = None
+    ) -> list[dict[str, str | None]]:
+        """
+        Parse several user messages with a single LLM completion.
+        
+        The completion is queued in the limiter under the user with the most
+        messages in the batch, so a user flooding the bot does not get extra
+        throughput by riding in batches.
+        
+        Args:
+            user_messages: User messages to parse
+            current_dt: Current datetime used as the anchor for relative times
+            user_ids: Telegram user IDs of the messages, used for fair queueing
+            
+        Returns:
+            Parsed results in the same order as user_messages
+            
+        Raises:
+            Exception: If API call fails or the response is not a matching JSON array
+        """
+        messages = self._build_messages(json.dumps(user_messages, ensure_ascii=False), current_dt, batch=True)
+        
+        user_ids = user_ids or [None]
+        response = await self._complete(
+            max(set(user_ids), key=user_ids.count),
+            messages=messages,
+            max_tokens=300 * len(user_messages),
+            temperature=0.3
+        )
+        
+        parsed = self._load_json(response)
+        if not isinstance(parsed, list) or len(parsed) != len(user_messages):
+            raise ValueError(f"Invalid batch response structure: {parsed}")
+        
+        return [self._validate_result(item) for item in parsed]
+
+    def _load_json(self, response) -> object:
+        """
+        Extract JSON from a chat completion response.
+        
+        Args:
+            response: Chat completion response
+            
+        Returns:
+            Decoded JSON value
+            
+        Raises:
+            ValueError: If the response is empty
+        """
+        if not response.choices:
+            raise ValueError("No response from AI")
+        
+        content = response.choices[0].message.content
+        if not content:
+            raise ValueError("Empty response from AI")
+        
+        # Clean up the response (remove markdown code blocks if present)
+        content = content.strip()
+        if content.startswith("```json"):
+            content = content[7:]
+        if content.startswith("```"):
+            content = content[3:]
+        if content.endswith("```"):
+            content = content[:-3]
+        content = content.strip()
+        
+        # Try to parse JSON, use json_repair if needed
+        try:
+            return json.loads(content)
+        except json.JSONDecodeError:
+            # Try to repair the JSON
+            self.parse_stats["repairs"] += 1
+            repaired = repair_json(content)
+            return json.loads(repaired)
+
+    @staticmethod
+    def _validate_result(parsed: object) -> dict[str, str | None]:
+        """
+        Validate a decoded parse result and normalize its types.
+        
+        Args:
+            parsed: Decoded JSON value
+            
+        Returns:
+            Dictionary with keys 'task' (str) and 'datetime' (str | None)
+            
+        Raises:
+            ValueError: If required keys are missing
+        """
+        if not isinstance(parsed, dict) or 'task' not in parsed or 'datetime' not in parsed:
+            raise ValueError(f"Invalid response structure: {parsed}")
+        
+        return {
+            "task": str(parsed["task"]),
+            "datetime": str(parsed["datetime"]) if parsed["datetime"] else None
+        }
+
+    async def transcribe_voice(
+        self, audio_file: BinaryIO, user_id: int | None = None, filename: str = "voice.ogg"
+    ) -> str:
         """
         Transcribe voice message using Whisper API.
         
         Args:
-            audio_file_path: Path to audio file (ogg, mp3, etc.)
+            audio_file: Audio file object (in-memory buffer or spooled file)
+            user_id: Telegram user ID, used for fair queueing
+            filename: File name with extension, used by Whisper to detect the format
             
         Returns:
             Transcribed text from the audio
             
         Raises:
-            Exception: If API call fails or file not found
+            Exception: If API call fails
         """
         try:
-            # Check if file exists
-            if not os.path.exists(audio_file_path):
-                raise FileNotFoundError(f"Audio file not found: {audio_file_path}")
+            if isinstance(audio_file, io.BytesIO):
+                # In-memory buffer is passed to the client as is
+                content: BinaryIO | bytes = audio_file
+            else:
+                # Spooled files may live on disk - read them off the event loop
+                audio_file.seek(0)
+                content = await asyncio.to_thread(audio_file.read)
             
-            # Open and transcribe audio file
-            with open(audio_file_path, "rb") as audio_file:
-                transcript = await self.whisper_client.audio.transcriptions.create(
+            async def transcribe():
+                if isinstance(content, io.BytesIO):
+                    # Rewind the buffer in case this is a retry
+                    content.seek(0)
+                return await self.whisper_client.audio.transcriptions.create(
                     model="whisper-1",
-                    file=audio_file,
+                    file=(filename, content),
                     language="ru"  # Russian language hint for better accuracy
                 )
             
+            transcript = await self.whisper_limiter.run(transcribe, user_id)
+            
             return transcript.text.strip()
             
         except Exception as e:
@@ -1,19 +1,19 @@
 import asyncio
+import contextlib
 import logging
 import os
 from datetime import datetime
 from dotenv import load_dotenv
 
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
-from handlers import router, admin_router
-from database.engine import async_main as create_db
-from middlewares import AccessControlMiddleware
-from scheduler import init_scheduler, start_scheduler, shutdown_scheduler, add_task_reminder
-from database.requests import get_user_tasks
-from database.models import Task
-from sqlalchemy import select
-from database.engine import async_session_maker
+from handlers import router, admin_router, sweep_speculative_parses, SPECULATIVE_PARSE_TTL
+from database.engine import async_main as create_db, close_db
+from database.storage import DatabaseStorage
+from middlewares import AccessControlMiddleware, init_outbound_queue
+from broadcast import init_broadcasts
+from scheduler import (
+    init_scheduler, start_scheduler, shutdown_scheduler, load_reminders, catch_up_missed_reminders
+)
 
 
 async def main():
@@ -39,44 +39,59 @@ async def main():
     logging.info("База данных готова!")
     
     # Создаем объекты бота и диспетчера с хранилищем для FSM
-    storage = MemoryStorage()
+    # (состояния диалогов хранятся в базе и переживают перезапуск)
+    storage = DatabaseStorage()
     bot = Bot(token=bot_token)
     dp = Dispatcher(storage=storage)
     
+    # Все исходящие сообщения идут через общую очередь с приоритетами и лимитами Telegram
+    outbound_queue = init_outbound_queue()
+    bot.session.middleware(outbound_queue)
+    
     # Инициализируем планировщик задач
     logging.info("Инициализация планировщика задач...")
-    init_scheduler(bot)
+    scheduler = init_scheduler(bot)
+    
+    # Периодически убираем неподтверждённые спекулятивные разборы голосовых
+    scheduler.add_job(
+        sweep_speculative_parses,
+        trigger='interval',
+        seconds=SPECULATIVE_PARSE_TTL,
+        id='sweep_speculative_parses',
+        replace_existing=True
+    )
     
-    # Загружаем существующие запланированные задачи в планировщик
+    # Загружаем ближайшие запланированные задачи (остальные подгружаются в фоне)
     logging.info("Загрузка запланированных задач...")
-    async with async_session_maker() as session:
-        # Получаем все незавершенные задачи с назначенным временем в будущем
-        now = datetime.now()
-        result = await session.execute(
-            select(Task).where(
-                Task.scheduled_time >= now,
-                Task.is_completed == False
-            )
-        )
-        tasks = result.scalars().all()
-        
-        # Добавляем каждую задачу в планировщик
-        for task in tasks:
-            if task.scheduled_time:
-                add_task_reminder(
-                    bot=bot,
-                    user_id=task.user_id,
-                    task_id=task.id,
-                    text=task.text,
-                    scheduled_time=task.scheduled_time
-                )
-        
-        logging.info(f"Загружено {len(tasks)} запланированных задач")
+    startup_time = datetime.now()
+    loaded = await load_reminders(startup_time)
+    logging.info(f"Загружено {loaded} запланированных задач")
+    
+    # Досылаем напоминания, пропущенные, пока бот был выключен (в фоне)
+    catch_up = asyncio.create_task(catch_up_missed_reminders(bot, startup_time))
+    catch_up.add_done_callback(
+        lambda task: task.cancelled() or logging.info(f"Досланы пропущенные напоминания: {task.result()}")
+    )
     
     # Запускаем планировщик
     start_scheduler()
     logging.info("Планировщик запущен!")
     
+    # Продолжаем рассылки, прерванные перезапуском
+    broadcasts = init_broadcasts(bot)
+    resumed = await broadcasts.resume_running()
+    if resumed:
+        logging.info(f"Продолжено рассылок: {resumed}")
+    
+    # Подхватываем рассылки упавших экземпляров, когда истекает их аренда
+    scheduler.add_job(
+        broadcasts.resume_running,
+        trigger='interval',
+        seconds=broadcasts.lease.total_seconds(),
+        id='resume_broadcasts',
+        replace_existing=True
+    )
+    
     # Регистрируем middleware для контроля доступа
     # Применяется ко всем сообщениям, проверяет разрешенных пользователей
     dp.message.middleware(AccessControlMiddleware())
@@ -94,7 +109,15 @@ async def main():
     finally:
         # Корректное завершение работы
         logging.info("Остановка планировщика...")
-        shutdown_scheduler()
+        # Досылка пропущенных напоминаний пишет в базу - останавливаем её до закрытия базы
+        catch_up.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await catch_up
+        await shutdown_scheduler()
+        await broadcasts.stop()
+        await outbound_queue.close()
+        await storage.close()
+        await close_db()
         await bot.session.close()
 
 
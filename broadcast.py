@@ -0,0 +1,357 @@
+"""Resumable newsletter broadcasts stored in the database."""
+import asyncio
+import os
+import time
+from contextlib import aclosing
+from datetime import datetime, timedelta
+from aiogram import Bot
+from aiogram.exceptions import TelegramForbiddenError
+from aiogram.types import InlineKeyboardMarkup
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+from database.models import Broadcast
+from database.requests import (
+    get_users_count, iter_users, create_broadcast, get_broadcast,
+    claim_broadcasts, release_broadcast, update_broadcast, checkpoint_broadcast
+)
+from middlewares import Priority, send_priority
+from scheduler import get_worker_id
+
+
+# Global broadcast manager instance
+broadcast_manager: "BroadcastManager | None" = None
+
+# How long stop() waits for running jobs to finish their current page (seconds)
+STOP_TIMEOUT = 30.0
+
+STATUS_TITLES = {
+    "running": "⏳ идёт",
+    "paused": "⏸ на паузе",
+    "cancelled": "❌ отменена",
+    "done": "✅ завершена",
+}
+
+
+def progress_keyboard(broadcast_id: int, status: str) -> InlineKeyboardMarkup | None:
+    """
+    Build pause/resume/cancel buttons for a broadcast progress message.
+    
+    Args:
+        broadcast_id: Broadcast ID in database
+        status: Current broadcast status
+    
+    Returns:
+        Keyboard, or None for finished broadcasts
+    """
+    builder = InlineKeyboardBuilder()
+    if status == "running":
+        builder.button(text="⏸ Пауза", callback_data=f"broadcast_pause:{broadcast_id}")
+    elif status == "paused":
+        builder.button(text="▶️ Продолжить", callback_data=f"broadcast_resume:{broadcast_id}")
+    else:
+        return None
+    builder.button(text="❌ Отменить", callback_data=f"broadcast_cancel:{broadcast_id}")
+    builder.adjust(2)
+    return builder.as_markup()
+
+
+def format_progress(broadcast: Broadcast) -> str:
+    """
+    Build the text of a broadcast progress message.
+    
+    Args:
+        broadcast: Broadcast row
+    
+    Returns:
+        Message text with status and counters
+    """
+    processed = broadcast.sent + broadcast.blocked + broadcast.failed
+    return (
+        f"📨 Рассылка #{broadcast.id}: {STATUS_TITLES.get(broadcast.status, broadcast.status)}\n\n"
+        f"📊 Статистика:\n"
+        f"✅ Успешно: {broadcast.sent}\n"
+        f"🚫 Заблокировали бота: {broadcast.blocked}\n"
+        f"❌ Другие ошибки: {broadcast.failed}\n"
+        f"👥 Обработано: {processed} из {broadcast.total}"
+    )
+
+
+class BroadcastManager:
+    """
+    Runs broadcast jobs persisted in the `broadcasts` table.
+    
+    Recipients are processed in pages ordered by tg_id. Each page is sent
+    with bounded concurrency, after which the cursor (last processed tg_id)
+    and counters are checkpointed with one UPDATE. A restarted bot resumes
+    running jobs from their cursor, so at most one page can be delivered
+    twice after a crash. A graceful stop lets the current page finish and
+    checkpoint first, so nothing is delivered twice.
+    
+    Several bot instances may share one database. A job is run only by the
+    instance holding its lease (claimed_by / lease_until), which every
+    checkpoint renews. Jobs whose lease expired (e.g. a crashed instance)
+    are claimed by resume_running on any live instance.
+    """
+    
+    def __init__(self, bot: Bot) -> None:
+        """
+        Initialize the manager.
+        
+        Args:
+            bot: Telegram bot instance
+        """
+        self.bot = bot
+        self.page_size = int(os.getenv("BROADCAST_PAGE_SIZE", "50"))
+        self.concurrency = int(os.getenv("BROADCAST_CONCURRENCY", "25"))
+        self.progress_interval = float(os.getenv("BROADCAST_PROGRESS_SECONDS", "3"))
+        self.worker_id = get_worker_id()
+        self.lease = timedelta(seconds=float(os.getenv("BROADCAST_LEASE_SECONDS", "300")))
+        
+        # Running jobs and statuses requested by the admin (checked between pages)
+        self._jobs: dict[int, asyncio.Task] = {}
+        self._requested: dict[int, str] = {}
+        
+        # Set by stop(): loops exit after checkpointing their current page
+        self._stopping = False
+    
+    async def create(self, from_chat_id: int, message_id: int, admin_chat_id: int, progress_message_id: int) -> int:
+        """
+        Create a broadcast job and start it.
+        
+        Args:
+            from_chat_id: Chat of the message to broadcast
+            message_id: ID of the message to broadcast
+            admin_chat_id: Admin chat for progress updates
+            progress_message_id: Message in the admin chat that shows progress
+        
+        Returns:
+            Broadcast ID in database
+        """
+        broadcast_id = await create_broadcast(
+            from_chat_id=from_chat_id,
+            message_id=message_id,
+            admin_chat_id=admin_chat_id,
+            progress_message_id=progress_message_id,
+            total=await get_users_count(reachable_only=True),
+            worker_id=self.worker_id,
+            lease=self.lease
+        )
+        self.start(broadcast_id)
+        return broadcast_id
+    
+    def start(self, broadcast_id: int) -> None:
+        """
+        Start (or restart) the delivery loop of a job.
+        
+        Args:
+            broadcast_id: Broadcast ID in database
+        """
+        self._requested.pop(broadcast_id, None)
+        job = self._jobs.get(broadcast_id)
+        if job is not None and not job.done():
+            return
+        
+        job = asyncio.create_task(self._run(broadcast_id))
+        self._jobs[broadcast_id] = job
+        job.add_done_callback(lambda _: self._jobs.pop(broadcast_id, None))
+    
+    async def resume_running(self) -> int:
+        """
+        Resume running jobs that no instance holds a lease on.
+        
+        Called on startup (jobs interrupted by a restart) and periodically
+        (jobs of a crashed instance, once their lease expires).
+        
+        Returns:
+            Number of resumed jobs
+        """
+        broadcast_ids = await claim_broadcasts(self.worker_id, self.lease)
+        for broadcast_id in broadcast_ids:
+            self.start(broadcast_id)
+        return len(broadcast_ids)
+    
+    async def pause(self, broadcast_id: int) -> None:
+        """Pause a job after its current page."""
+        await self._set_status(broadcast_id, "paused")
+    
+    async def resume(self, broadcast_id: int) -> None:
+        """Resume a paused job from its cursor."""
+        if broadcast_id in self._jobs:
+            # Pause was requested but the loop has not stopped yet
+            if self._requested.get(broadcast_id) == "paused":
+                del self._requested[broadcast_id]
+            return
+        
+        broadcast = await get_broadcast(broadcast_id)
+        if broadcast is None or broadcast.status != "paused":
+            return
+        await update_broadcast(
+            broadcast_id, status="running", claimed_by=self.worker_id, lease_until=datetime.now() + self.lease
+        )
+        self.start(broadcast_id)
+    
+    async def cancel(self, broadcast_id: int) -> None:
+        """Cancel a job after its current page."""
+        await self._set_status(broadcast_id, "cancelled")
+    
+    async def _set_status(self, broadcast_id: int, status: str) -> None:
+        """Stop a running or paused job with the given status."""
+        broadcast = await get_broadcast(broadcast_id)
+        if broadcast is None or broadcast.status not in ("running", "paused"):
+            return
+        
+        if broadcast_id in self._jobs:
+            # The loop stores the status itself once the current page is checkpointed
+            self._requested[broadcast_id] = status
+        else:
+            await update_broadcast(broadcast_id, status=status)
+            broadcast.status = status
+            await self._show_progress(broadcast)
+    
+    async def _run(self, broadcast_id: int) -> None:
+        """Deliver a job page by page, checkpointing after each page."""
+        try:
+            broadcast = await get_broadcast(broadcast_id)
+            if broadcast is None or broadcast.status != "running":
+                return
+            
+            semaphore = asyncio.Semaphore(self.concurrency)
+            shown_at = 0.0
+            async with aclosing(iter_users(self.page_size, after=broadcast.cursor)) as pages:
+                async for user_ids in pages:
+                    if self._stopping:
+                        # Bot is shutting down: the job stays running and resumes from its cursor
+                        await release_broadcast(broadcast_id, self.worker_id)
+                        return
+                    
+                    requested = self._requested.pop(broadcast_id, None)
+                    if requested is not None:
+                        broadcast.status = requested
+                        break
+                    
+                    status = await self._send_page(broadcast, user_ids, semaphore)
+                    if status is None:
+                        # The lease expired and another instance took the job over
+                        print(f"Broadcast {broadcast_id} was taken over by another instance")
+                        return
+                    if status != "running":
+                        # Paused or cancelled on another instance
+                        broadcast.status = status
+                        await self._show_progress(broadcast)
+                        return
+                    
+                    if time.monotonic() - shown_at >= self.progress_interval:
+                        await self._show_progress(broadcast)
+                        shown_at = time.monotonic()
+                else:
+                    # Every recipient is processed, a late pause or cancel has nothing to stop
+                    self._requested.pop(broadcast_id, None)
+                    broadcast.status = "done"
+            
+            await update_broadcast(broadcast_id, status=broadcast.status)
+            await self._show_progress(broadcast)
+        
+        except Exception as e:
+            print(f"Error in broadcast {broadcast_id}: {e}")
+    
+    async def _send_page(self, broadcast: Broadcast, user_ids: list[int], semaphore: asyncio.Semaphore) -> str | None:
+        """
+        Send one page of recipients, checkpoint the cursor and counters and renew the lease.
+        
+        Returns:
+            Current job status, or None if another instance took the job over
+        """
+        with send_priority(Priority.BULK):
+            results = await asyncio.gather(
+                *(self._deliver(broadcast, user_id, semaphore) for user_id in user_ids)
+            )
+        
+        sent = results.count("sent")
+        blocked = results.count("blocked")
+        failed = results.count("failed")
+        status = await checkpoint_broadcast(
+            broadcast.id, user_ids[-1], sent, blocked, failed, self.worker_id, self.lease
+        )
+        broadcast.cursor = user_ids[-1]
+        broadcast.sent += sent
+        broadcast.blocked += blocked
+        broadcast.failed += failed
+        return status
+    
+    async def _deliver(self, broadcast: Broadcast, user_id: int, semaphore: asyncio.Semaphore) -> str:
+        """Copy the broadcast message to one recipient and return the outcome."""
+        async with semaphore:
+            try:
+                await self.bot.copy_message(
+                    chat_id=user_id,
+                    from_chat_id=broadcast.from_chat_id,
+                    message_id=broadcast.message_id
+                )
+                return "sent"
+            except TelegramForbiddenError:
+                # User blocked the bot
+                return "blocked"
+            except Exception as e:
+                print(f"Error sending broadcast {broadcast.id} to user {user_id}: {e}")
+                return "failed"
+    
+    async def _show_progress(self, broadcast: Broadcast) -> None:
+        """Edit the admin's progress message."""
+        if broadcast.progress_message_id is None:
+            return
+        try:
+            await self.bot.edit_message_text(
+                chat_id=broadcast.admin_chat_id,
+                message_id=broadcast.progress_message_id,
+                text=format_progress(broadcast),
+                reply_markup=progress_keyboard(broadcast.id, broadcast.status)
+            )
+        except Exception as e:
+            # E.g. "message is not modified" or the message was deleted
+            print(f"Error updating broadcast {broadcast.id} progress: {e}")
+    
+    async def stop(self) -> None:
+        """
+        Stop delivery loops; running jobs are resumed from their cursor on the next start.
+        
+        Each loop finishes and checkpoints the page it is sending. Loops that
+        do not finish within STOP_TIMEOUT are cancelled.
+        """
+        self._stopping = True
+        jobs = list(self._jobs.values())
+        if not jobs:
+            return
+        
+        _, pending = await asyncio.wait(jobs, timeout=STOP_TIMEOUT)
+        for job in pending:
+            job.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+def init_broadcasts(bot: Bot) -> "BroadcastManager":
+    """
+    Initialize the global broadcast manager.
+    
+    Args:
+        bot: Telegram bot instance
+    
+    Returns:
+        BroadcastManager instance
+    """
+    global broadcast_manager
+    
+    if broadcast_manager is None:
+        broadcast_manager = BroadcastManager(bot)
+    
+    return broadcast_manager
+
+
+def get_broadcast_manager() -> "BroadcastManager":
+    """
+    Return the global broadcast manager.
+    
+    Raises:
+        RuntimeError: If init_broadcasts() was not called
+    """
+    if broadcast_manager is None:
+        raise RuntimeError("Broadcasts not initialized")
+    return broadcast_manager
@@ -0,0 +1,177 @@
+"""Версионные миграции схемы базы данных"""
+from datetime import datetime
+from typing import Callable
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, event, inspect, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.schema import CreateColumn
+
+from database.models import Base, Task
+
+
+# Таблица с номерами применённых миграций (вне Base, чтобы не смешивать с моделями)
+schema_version = Table(
+    'schema_version',
+    MetaData(),
+    Column('version', Integer, primary_key=True),
+    Column('name', String, nullable=False),
+    Column('applied_at', DateTime, nullable=False),
+)
+
+
+def add_missing_columns(conn: Connection) -> None:
+    """
+    Добавляет в существующие таблицы колонки и индексы, появившиеся в моделях позже.
+
+    create_all создаёт только отсутствующие таблицы, поэтому такие колонки
+    досоздаются через ALTER TABLE.
+
+    Args:
+        conn: Синхронное соединение с базой данных
+    """
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                ddl = CreateColumn(column).compile(dialect=conn.dialect)
+                conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {ddl}")
+
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
+def add_task_indexes(conn: Connection) -> None:
+    """
+    Создаёт индексы для частых запросов по задачам.
+
+    - ix_tasks_user_open (user_id, is_completed, scheduled_time) - задачи
+      пользователя (/mytasks) и задачи дня для сводки
+    - ix_tasks_open_scheduled (scheduled_time) WHERE is_completed = 0 -
+      загрузка напоминаний и пропущенные напоминания
+
+    Args:
+        conn: Синхронное соединение с базой данных
+    """
+    for index in Task.__table__.indexes:
+        index.create(conn, checkfirst=True)
+
+
+def add_task_lease_index(conn: Connection) -> None:
+    """
+    Создаёт частичный индекс по аренде напоминаний.
+
+    - ix_tasks_open_lease (lease_until) WHERE is_completed = 0 AND
+      lease_until IS NOT NULL - незавершённые задачи в аренде
+
+    Колонки аренды добавлены миграцией 3; если их всё же нет, они
+    досоздаются здесь же.
+
+    Args:
+        conn: Синхронное соединение с базой данных
+    """
+    existing = {column["name"] for column in inspect(conn).get_columns("tasks")}
+    for name in ("claimed_by", "lease_until"):
+        if name not in existing:
+            ddl = CreateColumn(Task.__table__.c[name]).compile(dialect=conn.dialect)
+            conn.exec_driver_sql(f"ALTER TABLE tasks ADD COLUMN {ddl}")
+
+    for index in Task.__table__.indexes:
+        if index.name == "ix_tasks_open_lease":
+            index.create(conn, checkfirst=True)
+
+
+# Миграции по порядку: (версия, описание, функция). Номера не меняются после выпуска.
+MIGRATIONS: list[tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "Колонки и индексы, добавленные в модели после создания таблиц", add_missing_columns),
+    (2, "Индексы для частых запросов по задачам", add_task_indexes),
+    (3, "Аренда напоминаний: tasks.claimed_by и tasks.lease_until", add_missing_columns),
+    (4, "Индекс по аренде напоминаний", add_task_lease_index),
+    (5, "Аренда рассылок: broadcasts.claimed_by и broadcasts.lease_until", add_missing_columns),
+]
+
+
+def run_migrations(conn: Connection) -> list[int]:
+    """
+    Применяет миграции, которые ещё не были применены к этой базе.
+
+    Вызывается после create_all в той же транзакции: на новой базе
+    миграции лишь отмечаются применёнными (все объекты уже созданы),
+    на существующей - досоздают колонки и индексы.
+
+    Args:
+        conn: Синхронное соединение с базой данных
+
+    Returns:
+        list[int]: Версии применённых миграций
+    """
+    schema_version.create(conn, checkfirst=True)
+    applied = set(conn.execute(select(schema_version.c.version)).scalars())
+
+    done = []
+    for version, name, migrate in MIGRATIONS:
+        if version in applied:
+            continue
+        migrate(conn)
+        conn.execute(schema_version.insert().values(version=version, name=name, applied_at=datetime.now()))
+        done.append(version)
+    return done
+
+
+async def check_query_plans(engine: AsyncEngine) -> list[str]:
+    """
+    Проверяет через EXPLAIN QUERY PLAN (SQLite), что частые запросы используют свои индексы.
+
+    Выполняет настоящие функции database.requests с пустыми аргументами,
+    перехватывает их SQL и разбирает план каждого запроса.
+
+    Args:
+        engine: Движок базы данных
+
+    Returns:
+        list[str]: Описания запросов, которые не используют ожидаемый индекс
+    """
+    # Импорт здесь: requests зависит от engine, а engine - от этого модуля
+    from database import requests
+
+    now = datetime.now()
+
+    async def first_chunk(chunks) -> None:
+        async for _ in chunks:
+            break
+        await chunks.aclose()
+
+    hot_queries = [
+        ("reminder window", "ix_tasks_open_scheduled", lambda: first_chunk(requests.iter_reminders_between(now, now))),
+        ("overdue reminders", "ix_tasks_open_scheduled", lambda: first_chunk(requests.iter_overdue_tasks(now))),
+        ("user tasks", "ix_tasks_user_open", lambda: first_chunk(requests.iter_user_tasks(0))),
+        ("digest tasks", "ix_tasks_user_open", lambda: requests.get_users_tasks_between([0], now, now)),
+        ("leased tasks", "ix_tasks_open_lease", requests.get_lease_counts),
+        ("users", "ix_users_reachable_tg_id", lambda: first_chunk(requests.iter_users(1))),
+        ("timezone users", "ix_users_timezone_reachable_tg_id", lambda: first_chunk(requests.iter_users(1, timezone=""))),
+    ]
+
+    problems = []
+    for name, index_name, run_query in hot_queries:
+        statements: list[tuple[str, tuple]] = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany) -> None:
+            statements.append((statement, parameters))
+
+        event.listen(engine.sync_engine, "before_cursor_execute", capture)
+        try:
+            await run_query()
+        finally:
+            event.remove(engine.sync_engine, "before_cursor_execute", capture)
+
+        async with engine.connect() as conn:
+            for statement, parameters in statements:
+                result = await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+                plan = " | ".join(row[-1] for row in result.all())
+                if index_name not in plan:
+                    problems.append(f"{name}: expected {index_name}, got {plan}")
+    return problems
@@ -1,9 +1,13 @@
 """Модели базы данных"""
 from datetime import datetime
-from sqlalchemy import BigInteger, String, DateTime, Boolean, ForeignKey
+from sqlalchemy import BigInteger, String, DateTime, Boolean, ForeignKey, Text, Index, LargeBinary, text
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
 
+# Часовой пояс пользователя по умолчанию
+DEFAULT_TIMEZONE = "Europe/Moscow"
+
+
 class Base(DeclarativeBase):
     """Базовый класс для всех моделей"""
     pass
@@ -12,6 +16,12 @@ class Base(DeclarativeBase):
 class User(Base):
     """Модель пользователя"""
     __tablename__ = 'users'
+    __table_args__ = (
+        # Постраничный обход доступных пользователей (рассылки)
+        Index('ix_users_reachable_tg_id', 'is_reachable', 'tg_id'),
+        # Постраничный обход доступных пользователей одного часового пояса (ежедневная сводка)
+        Index('ix_users_timezone_reachable_tg_id', 'timezone', 'is_reachable', 'tg_id'),
+    )
     
     # Первичный ключ
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
@@ -22,13 +32,41 @@ class User(Base):
     # Имя пользователя (может быть None)
     username: Mapped[str | None] = mapped_column(String, nullable=True)
     
+    # Часовой пояс (IANA, например "Europe/Moscow") для ежедневной сводки
+    timezone: Mapped[str] = mapped_column(
+        String, default=DEFAULT_TIMEZONE, server_default=DEFAULT_TIMEZONE
+    )
+    
+    # Можно ли писать пользователю (False - заблокировал бота, удалён или чат не найден)
+    is_reachable: Mapped[bool] = mapped_column(Boolean, default=True, server_default="1")
+    
+    # Причина (blocked / deactivated / chat_not_found) и время, когда пользователь стал недоступен
+    unreachable_reason: Mapped[str | None] = mapped_column(String, nullable=True)
+    unreachable_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    
     def __repr__(self) -> str:
-        return f"User(id={self.id}, tg_id={self.tg_id}, username={self.username})"
+        return f"User(id={self.id}, tg_id={self.tg_id}, username={self.username}, timezone={self.timezone}, is_reachable={self.is_reachable})"
 
 
 class Task(Base):
     """Модель задачи"""
     __tablename__ = 'tasks'
+    __table_args__ = (
+        # Задачи пользователя (/mytasks) и задачи дня для сводки
+        Index('ix_tasks_user_open', 'user_id', 'is_completed', 'scheduled_time'),
+        # Загрузка напоминаний и пропущенные напоминания: только незавершённые задачи
+        Index(
+            'ix_tasks_open_scheduled', 'scheduled_time',
+            sqlite_where=text('is_completed = 0'),
+            postgresql_where=text('is_completed = false')
+        ),
+        # Незавершённые задачи в аренде (действующей и истёкшей) для статистики
+        Index(
+            'ix_tasks_open_lease', 'lease_until',
+            sqlite_where=text('is_completed = 0 AND lease_until IS NOT NULL'),
+            postgresql_where=text('is_completed = false AND lease_until IS NOT NULL')
+        ),
+    )
     
     # Первичный ключ
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
@@ -45,5 +83,88 @@ class Task(Base):
     # Статус выполнения
     is_completed: Mapped[bool] = mapped_column(Boolean, default=False)
     
+    # Аренда напоминания: какой экземпляр бота взял задачу на отправку и до какого времени.
+    # Пока аренда не истекла, другие экземпляры эту задачу не отправляют.
+    claimed_by: Mapped[str | None] = mapped_column(String, nullable=True)
+    lease_until: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    
     def __repr__(self) -> str:
         return f"Task(id={self.id}, user_id={self.user_id}, text={self.text}, scheduled_time={self.scheduled_time}, is_completed={self.is_completed})"
+
+
+class VoiceTranscript(Base):
+    """Кэш распознанных голосовых сообщений"""
+    __tablename__ = 'voice_transcripts'
+    
+    # Первичный ключ
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    
+    # Telegram file_unique_id голосового сообщения (одинаковый для пересланных копий)
+    file_unique_id: Mapped[str] = mapped_column(String, unique=True)
+    
+    # Распознанный текст
+    text: Mapped[str] = mapped_column(Text)
+    
+    # Время последнего использования (для вытеснения старых записей)
+    last_used_at: Mapped[datetime] = mapped_column(DateTime, index=True)
+    
+    def __repr__(self) -> str:
+        return f"VoiceTranscript(id={self.id}, file_unique_id={self.file_unique_id}, last_used_at={self.last_used_at})"
+
+
+class Broadcast(Base):
+    """Задание рассылки (переживает перезапуск бота)"""
+    __tablename__ = 'broadcasts'
+    
+    # Первичный ключ
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    
+    # Откуда копировать сообщение рассылки
+    from_chat_id: Mapped[int] = mapped_column(BigInteger)
+    message_id: Mapped[int] = mapped_column(BigInteger)
+    
+    # Чат админа и сообщение с прогрессом, которое редактируется по ходу рассылки
+    admin_chat_id: Mapped[int] = mapped_column(BigInteger)
+    progress_message_id: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
+    
+    # running / paused / cancelled / done
+    status: Mapped[str] = mapped_column(String, default="running", index=True)
+    
+    # tg_id последнего обработанного получателя (получатели идут по возрастанию tg_id)
+    cursor: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
+    
+    # Счётчики
+    total: Mapped[int] = mapped_column(default=0)
+    sent: Mapped[int] = mapped_column(default=0)
+    blocked: Mapped[int] = mapped_column(default=0)
+    failed: Mapped[int] = mapped_column(default=0)
+    
+    # Аренда задания: какой экземпляр бота ведёт рассылку и до какого времени.
+    # Пока аренда не истекла, другие экземпляры это задание не продолжают.
+    claimed_by: Mapped[str | None] = mapped_column(String, nullable=True)
+    lease_until: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
+    
+    def __repr__(self) -> str:
+        return f"Broadcast(id={self.id}, status={self.status}, cursor={self.cursor}, sent={self.sent}, total={self.total})"
+
+
+class FsmRecord(Base):
+    """Состояние FSM и данные диалога пользователя (хранилище aiogram)"""
+    __tablename__ = 'fsm_states'
+    
+    # Ключ хранилища: bot_id:chat_id:user_id[:thread_id][:business_connection_id]:destiny
+    key: Mapped[str] = mapped_column(String, primary_key=True)
+    
+    # Текущее состояние (None - состояние не установлено)
+    state: Mapped[str | None] = mapped_column(String, nullable=True)
+    
+    # Данные диалога в компактном сериализованном виде (None - данных нет)
+    data: Mapped[bytes | None] = mapped_column(LargeBinary, nullable=True)
+    
+    # Когда запись устаревает и удаляется (брошенные диалоги)
+    expires_at: Mapped[datetime] = mapped_column(DateTime, index=True)
+    
+    def __repr__(self) -> str:
+        return f"FsmRecord(key={self.key}, state={self.state}, expires_at={self.expires_at})"
@@ -1,64 +1,268 @@
 """Функции для работы с базой данных"""
-from datetime import datetime
-from sqlalchemy import select, func
-from sqlalchemy.dialects.sqlite import insert
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Callable
+from sqlalchemy import Select, select, func, update, delete, or_, case
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from database.engine import async_session_maker
-from database.models import User, Task
+from database.engine import async_session_maker, db_writer
+from database.models import Base, User, Task, VoiceTranscript, Broadcast, FsmRecord
+
+
+# insert() с поддержкой ON CONFLICT для каждого поддерживаемого диалекта
+UPSERT_INSERTS = {
+    "sqlite": sqlite.insert,
+    "postgresql": postgresql.insert,
+}
+
+
+async def _upsert(
+    session: AsyncSession,
+    model: type[Base],
+    values: dict,
+    index_elements: list[str],
+    set_: dict
+) -> None:
+    """
+    Вставляет строку или обновляет существующую (INSERT ... ON CONFLICT DO UPDATE).
+    
+    SQLite и PostgreSQL поддерживают одинаковый синтаксис, но в SQLAlchemy
+    он доступен только через insert() конкретного диалекта.
+    
+    Args:
+        session: Сессия базы данных
+        model: Модель таблицы
+        values: Значения новой строки
+        index_elements: Уникальные колонки, по которым определяется конфликт
+        set_: Поля для обновления существующей строки
+    """
+    dialect = session.bind.dialect.name
+    if dialect not in UPSERT_INSERTS:
+        raise NotImplementedError(f"Upsert is not supported for {dialect}")
+    
+    stmt = UPSERT_INSERTS[dialect](model).values(**values)
+    stmt = stmt.on_conflict_do_update(index_elements=index_elements, set_=set_)
+    await session.execute(stmt)
 
 
 async def set_user(tg_id: int, username: str | None = None):
     """
     Добавляет нового пользователя или обновляет существующего (upsert).
     
+    Пользователь снова считается доступным: раз он написал боту, писать ему можно.
+    
     Args:
         tg_id: Telegram ID пользователя
         username: Имя пользователя (может быть None)
     """
-    async with async_session_maker() as session:
-        # SQLite upsert с использованием insert().on_conflict_do_update()
-        stmt = insert(User).values(
-            tg_id=tg_id,
-            username=username
-        )
-        
-        # При конфликте (duplicate tg_id) обновляем username
-        stmt = stmt.on_conflict_do_update(
+    async def write(session: AsyncSession) -> None:
+        # При конфликте (duplicate tg_id) обновляем username и сбрасываем недоступность
+        await _upsert(
+            session,
+            User,
+            values=dict(tg_id=tg_id, username=username),
             index_elements=['tg_id'],  # Указываем уникальное поле
-            set_=dict(username=username)  # Поля для обновления
+            set_=dict(  # Поля для обновления
+                username=username,
+                is_reachable=True,
+                unreachable_reason=None,
+                unreachable_at=None
+            )
         )
-        
-        await session.execute(stmt)
-        await session.commit()
+    
+    await db_writer.run(write)
 
 
-async def get_users_count() -> int:
+async def get_users_count(reachable_only: bool = False) -> int:
     """
     Возвращает количество пользователей в базе данных.
     
+    Args:
+        reachable_only: Считать только пользователей, которым можно писать
+    
     Returns:
         int: Количество записей в таблице users
     """
     async with async_session_maker() as session:
         stmt = select(func.count(User.id))
+        if reachable_only:
+            stmt = stmt.where(User.is_reachable == True)
         result = await session.execute(stmt)
         count = result.scalar()
         return count
 
 
-async def get_users() -> list[int]:
+async def _stream_keyset(
+    page: Callable[[tuple | None], Select],
+    chunk_size: int
+) -> AsyncIterator[list[tuple]]:
+    """
+    Потоково читает результат запроса частями с пагинацией по ключу.
+    
+    Каждая часть читается отдельным коротким запросом через серверный
+    курсор (session.stream), поэтому в памяти одновременно находится не
+    больше одной части, а транзакция чтения не держится, пока вызывающий
+    код обрабатывает её (например, отправляет рассылку и пишет прогресс).
+    
+    Args:
+        page: Строит упорядоченный запрос страницы после последней строки
+            предыдущей части (None для первой)
+        chunk_size: Размер части
+        
+    Yields:
+        list[tuple]: Части результата в виде кортежей колонок
+    """
+    after = None
+    while True:
+        async with async_session_maker() as session:
+            result = await session.stream(page(after).limit(chunk_size))
+            chunk = [tuple(row) async for row in result]
+        
+        if chunk:
+            yield chunk
+        if len(chunk) < chunk_size:
+            return
+        after = chunk[-1]
+
+
+async def iter_users(
+    chunk_size: int = 1000,
+    after: int | None = None,
+    timezone: str | None = None
+) -> AsyncIterator[list[int]]:
+    """
+    Потоково отдаёт Telegram ID доступных пользователей по возрастанию tg_id.
+    
+    Запрос использует индекс (is_reachable, tg_id) или, с фильтром по
+    часовому поясу, (timezone, is_reachable, tg_id).
+    
+    Args:
+        chunk_size: Размер части
+        after: Начать после этого tg_id (например, с сохранённого курсора рассылки)
+        timezone: Только пользователи этого часового пояса
+        
+    Yields:
+        list[int]: Части списка tg_id
+    """
+    stmt = select(User.tg_id).where(User.is_reachable == True)
+    if timezone is not None:
+        stmt = stmt.where(User.timezone == timezone)
+    
+    def page(last: tuple | None) -> Select:
+        start = last[0] if last is not None else after
+        page_stmt = stmt if start is None else stmt.where(User.tg_id > start)
+        return page_stmt.order_by(User.tg_id)
+    
+    async for chunk in _stream_keyset(page, chunk_size):
+        yield [tg_id for tg_id, in chunk]
+
+
+async def mark_users_unreachable(reasons: dict[int, str]) -> None:
+    """
+    Отмечает пользователей недоступными (заблокировали бота, удалены, чат не найден).
+    
+    Args:
+        reasons: tg_id -> причина (blocked / deactivated / chat_not_found)
+    """
+    if not reasons:
+        return
+    
+    now = datetime.now()
+    
+    async def write(session: AsyncSession) -> None:
+        # Один UPDATE на каждую причину
+        for reason in set(reasons.values()):
+            tg_ids = [tg_id for tg_id, tg_reason in reasons.items() if tg_reason == reason]
+            await session.execute(
+                update(User)
+                .where(User.tg_id.in_(tg_ids), User.is_reachable == True)
+                .values(is_reachable=False, unreachable_reason=reason, unreachable_at=now)
+            )
+    
+    await db_writer.run(write)
+
+
+async def get_user_timezone(tg_id: int) -> str | None:
+    """
+    Возвращает часовой пояс пользователя.
+    
+    Args:
+        tg_id: Telegram ID пользователя
+        
+    Returns:
+        str | None: Имя часового пояса или None, если пользователя нет
+    """
+    async with async_session_maker() as session:
+        result = await session.execute(select(User.timezone).where(User.tg_id == tg_id))
+        return result.scalar_one_or_none()
+
+
+async def set_user_timezone(tg_id: int, timezone: str) -> bool:
+    """
+    Сохраняет часовой пояс пользователя.
+    
+    Args:
+        tg_id: Telegram ID пользователя
+        timezone: Имя часового пояса IANA (например, "Europe/Moscow")
+        
+    Returns:
+        bool: True, если пользователь найден и обновлён
+    """
+    async def write(session: AsyncSession) -> bool:
+        result = await session.execute(
+            update(User).where(User.tg_id == tg_id).values(timezone=timezone)
+        )
+        return result.rowcount > 0
+    
+    return await db_writer.run(write)
+
+
+async def get_user_timezones() -> list[str]:
+    """
+    Возвращает список часовых поясов, в которых есть доступные пользователи.
+    
+    Returns:
+        list[str]: Различные значения users.timezone
+    """
+    async with async_session_maker() as session:
+        result = await session.execute(
+            select(User.timezone).where(User.is_reachable == True).distinct()
+        )
+        return list(result.scalars().all())
+
+
+async def get_users_tasks_between(
+    user_ids: list[int],
+    start: datetime,
+    end: datetime
+) -> list[tuple[int, datetime, str]]:
     """
-    Возвращает список Telegram ID всех пользователей.
+    Возвращает незавершённые задачи пользователей с временем напоминания в [start, end).
+    
+    Читаются только нужные колонки, без загрузки ORM-объектов.
     
+    Args:
+        user_ids: Telegram ID пользователей
+        start: Начало интервала (включительно)
+        end: Конец интервала (не включительно)
+        
     Returns:
-        list[int]: Список tg_id всех пользователей
+        list[tuple[int, datetime, str]]: Список (user_id, scheduled_time, text),
+        упорядоченный по пользователю и времени
     """
+    if not user_ids:
+        return []
+    
     async with async_session_maker() as session:
-        stmt = select(User.tg_id)
+        stmt = select(Task.user_id, Task.scheduled_time, Task.text).where(
+            Task.user_id.in_(user_ids),
+            Task.scheduled_time >= start,
+            Task.scheduled_time < end,
+            Task.is_completed == False
+        ).order_by(Task.user_id, Task.scheduled_time)
+        
         result = await session.execute(stmt)
-        # Извлекаем все tg_id
-        users = result.scalars().all()
-        return list(users)
+        return [tuple(row) for row in result.all()]
 
 
 async def add_task(user_id: int, text: str, scheduled_time: datetime | None = None) -> Task:
@@ -73,7 +277,7 @@ async def add_task(user_id: int, text: str, scheduled_time: datetime | None = No
     Returns:
         Task: Созданная задача
     """
-    async with async_session_maker() as session:
+    async def write(session: AsyncSession) -> Task:
         task = Task(
             user_id=user_id,
             text=text,
@@ -81,30 +285,544 @@ async def add_task(user_id: int, text: str, scheduled_time: datetime | None = No
             is_completed=False
         )
         session.add(task)
-        await session.commit()
+        await session.flush()
         await session.refresh(task)
         return task
+    
+    return await db_writer.run(write)
 
 
-async def get_user_tasks(user_id: int, include_completed: bool = False) -> list[Task]:
+async def iter_user_tasks(
+    user_id: int,
+    include_completed: bool = False,
+    chunk_size: int = 100
+) -> AsyncIterator[list[tuple[int, str, datetime | None]]]:
     """
-    Получает все задачи пользователя.
+    Потоково отдаёт задачи пользователя частями: сначала запланированные
+    по времени, затем бэклог по id.
+    
+    Не загружает ORM-объекты и не держит все задачи в памяти.
     
     Args:
         user_id: Telegram ID пользователя
         include_completed: Включать ли завершенные задачи
+        chunk_size: Размер части
+        
+    Yields:
+        list[tuple[int, str, datetime | None]]: Части списка (id, text, scheduled_time)
+    """
+    stmt = select(Task.id, Task.text, Task.scheduled_time).where(Task.user_id == user_id)
+    if not include_completed:
+        stmt = stmt.where(Task.is_completed == False)
+    
+    def scheduled_page(after: tuple | None) -> Select:
+        page = stmt.where(Task.scheduled_time.is_not(None))
+        if after is not None:
+            after_time, after_id = after[2], after[0]
+            page = page.where(
+                (Task.scheduled_time > after_time)
+                | ((Task.scheduled_time == after_time) & (Task.id > after_id))
+            )
+        return page.order_by(Task.scheduled_time, Task.id)
+    
+    def backlog_page(after: tuple | None) -> Select:
+        page = stmt.where(Task.scheduled_time.is_(None))
+        if after is not None:
+            page = page.where(Task.id > after[0])
+        return page.order_by(Task.id)
+    
+    async for chunk in _stream_keyset(scheduled_page, chunk_size):
+        yield chunk
+    async for chunk in _stream_keyset(backlog_page, chunk_size):
+        yield chunk
+
+
+async def iter_reminders_between(
+    start: datetime,
+    end: datetime,
+    chunk_size: int = 1000
+) -> AsyncIterator[list[tuple[int, int, datetime]]]:
+    """
+    Потоково отдаёт незавершённые задачи с временем напоминания в [start, end).
+    
+    Пагинация по ключу (scheduled_time, id), запрос использует индекс по scheduled_time.
+    
+    Args:
+        start: Начало окна (включительно)
+        end: Конец окна (не включительно)
+        chunk_size: Размер части
+        
+    Yields:
+        list[tuple[int, int, datetime]]: Части списка (id, user_id, scheduled_time)
+    """
+    stmt = select(Task.id, Task.user_id, Task.scheduled_time).where(
+        Task.scheduled_time >= start,
+        Task.scheduled_time < end,
+        Task.is_completed == False
+    )
+    
+    def page(after: tuple | None) -> Select:
+        page_stmt = stmt
+        if after is not None:
+            after_id, _, after_time = after
+            page_stmt = page_stmt.where(
+                (Task.scheduled_time > after_time)
+                | ((Task.scheduled_time == after_time) & (Task.id > after_id))
+            )
+        return page_stmt.order_by(Task.scheduled_time, Task.id)
+    
+    async for chunk in _stream_keyset(page, chunk_size):
+        yield chunk
+
+
+async def iter_overdue_tasks(
+    before: datetime,
+    chunk_size: int = 1000
+) -> AsyncIterator[list[tuple[int, int, str, datetime]]]:
+    """
+    Потоково отдаёт незавершённые задачи, время напоминания которых уже прошло.
+    
+    Задачи упорядочены по (user_id, id), чтобы пропущенные напоминания
+    одного пользователя шли подряд.
+    
+    Args:
+        before: Граница "просроченности" (не включительно)
+        chunk_size: Размер части
+        
+    Yields:
+        list[tuple[int, int, str, datetime]]: Части списка (id, user_id, text, scheduled_time)
+    """
+    stmt = select(Task.id, Task.user_id, Task.text, Task.scheduled_time).where(
+        Task.scheduled_time < before,
+        Task.is_completed == False
+    )
+    
+    def page(after: tuple | None) -> Select:
+        page_stmt = stmt
+        if after is not None:
+            after_id, after_user = after[0], after[1]
+            page_stmt = page_stmt.where(
+                (Task.user_id > after_user)
+                | ((Task.user_id == after_user) & (Task.id > after_id))
+            )
+        return page_stmt.order_by(Task.user_id, Task.id)
+    
+    async for chunk in _stream_keyset(page, chunk_size):
+        yield chunk
+
+
+async def claim_tasks(task_ids: list[int], worker_id: str, lease: timedelta) -> dict[int, str]:
+    """
+    Берёт задачи в аренду для отправки напоминаний.
+    
+    Условный UPDATE атомарно захватывает только незавершённые задачи без
+    действующей аренды, поэтому при нескольких экземплярах бота каждое
+    напоминание отправляет ровно один из них. Если экземпляр упал, не
+    отправив напоминание, аренда истекает и задачу забирает другой. На
+    PostgreSQL строки, которые прямо сейчас захватывает другой экземпляр,
+    пропускаются (FOR UPDATE SKIP LOCKED) вместо ожидания блокировки.
+    
+    Задачи пользователей, отмеченных недоступными (заблокировали бота,
+    удалены), в той же транзакции отмечаются выполненными, а не
+    захватываются: отправить напоминание всё равно нельзя, а незавершённая
+    задача попадала бы в каждую проверку пропущенных напоминаний.
+    
+    Args:
+        task_ids: ID задач
+        worker_id: Идентификатор экземпляра бота
+        lease: Длительность аренды
         
     Returns:
-        list[Task]: Список задач пользователя
+        dict[int, str]: ID захваченных задач -> текст задачи
+    """
+    if not task_ids:
+        return {}
+    
+    async def write(session: AsyncSession) -> dict[int, str]:
+        now = datetime.now()
+        await session.execute(
+            update(Task)
+            .where(
+                Task.id.in_(task_ids),
+                Task.is_completed == False,
+                Task.user_id.in_(select(User.tg_id).where(User.is_reachable == False))
+            )
+            .values(is_completed=True)
+            .execution_options(synchronize_session=False)
+        )
+        
+        claimable = select(Task.id).where(
+            Task.id.in_(task_ids),
+            Task.is_completed == False,
+            or_(Task.lease_until.is_(None), Task.lease_until < now)
+        )
+        if session.bind.dialect.name == "postgresql":
+            claimable = claimable.with_for_update(skip_locked=True)
+        
+        result = await session.execute(
+            update(Task)
+            .where(Task.id.in_(claimable.scalar_subquery()))
+            .values(claimed_by=worker_id, lease_until=now + lease)
+            .returning(Task.id, Task.text)
+            .execution_options(synchronize_session=False)
+        )
+        return dict(result.all())
+    
+    return await db_writer.run(write)
+
+
+async def get_lease_counts() -> dict[str, int]:
+    """
+    Считает незавершённые задачи в аренде: с действующей и с истёкшей арендой.
+    
+    Истёкшая аренда у незавершённой задачи означает, что экземпляр бота
+    взял напоминание и не отправил его (например, упал); такие задачи
+    досылает фоновая проверка. Читается только частичный индекс
+    ix_tasks_open_lease.
+    
+    Returns:
+        dict[str, int]: {"leased": ..., "expired": ...}
+    """
+    now = datetime.now()
+    async with async_session_maker() as session:
+        stmt = select(
+            func.count(case((Task.lease_until >= now, 1))),
+            func.count(case((Task.lease_until < now, 1)))
+        ).where(Task.is_completed == False, Task.lease_until.is_not(None))
+        leased, expired = (await session.execute(stmt)).one()
+        return {"leased": leased, "expired": expired}
+
+
+async def complete_tasks(task_ids: list[int]) -> None:
+    """
+    Отмечает задачи выполненными одним UPDATE.
+    
+    Args:
+        task_ids: ID задач
+    """
+    if not task_ids:
+        return
+    
+    async def write(session: AsyncSession) -> None:
+        await session.execute(
+            update(Task).where(Task.id.in_(task_ids)).values(is_completed=True)
+        )
+    
+    await db_writer.run(write)
+
+
+async def get_voice_transcript(file_unique_id: str) -> str | None:
+    """
+    Возвращает сохранённую расшифровку голосового сообщения.
+    
+    Поиск идёт обычным чтением; через писателя проходит только обновление
+    last_used_at при попадании, поэтому промахи не занимают очередь записи.
+    
+    Args:
+        file_unique_id: Telegram file_unique_id голосового сообщения
+        
+    Returns:
+        str | None: Текст расшифровки или None, если её нет в кэше
     """
     async with async_session_maker() as session:
-        stmt = select(Task).where(Task.user_id == user_id)
+        result = await session.execute(
+            select(VoiceTranscript.id, VoiceTranscript.text)
+            .where(VoiceTranscript.file_unique_id == file_unique_id)
+        )
+        row = result.first()
+    
+    if row is None:
+        return None
+    
+    transcript_id, text = row
+    
+    async def write(session: AsyncSession) -> None:
+        await session.execute(
+            update(VoiceTranscript)
+            .where(VoiceTranscript.id == transcript_id)
+            .values(last_used_at=datetime.now())
+        )
+    
+    await db_writer.run(write)
+    return text
+
+
+async def save_voice_transcript(file_unique_id: str, text: str, max_entries: int) -> None:
+    """
+    Сохраняет расшифровку голосового сообщения и вытесняет давно не использованные.
+    
+    Args:
+        file_unique_id: Telegram file_unique_id голосового сообщения
+        text: Распознанный текст
+        max_entries: Максимальное количество записей в кэше
+    """
+    async def write(session: AsyncSession) -> None:
+        now = datetime.now()
+        await _upsert(
+            session,
+            VoiceTranscript,
+            values=dict(file_unique_id=file_unique_id, text=text, last_used_at=now),
+            index_elements=['file_unique_id'],
+            set_=dict(text=text, last_used_at=now)
+        )
+        
+        # Удаляем записи, которые не попадают в max_entries самых свежих
+        cutoff = (
+            select(VoiceTranscript.last_used_at)
+            .order_by(VoiceTranscript.last_used_at.desc())
+            .offset(max_entries)
+            .limit(1)
+            .scalar_subquery()
+        )
+        await session.execute(
+            delete(VoiceTranscript).where(VoiceTranscript.last_used_at <= cutoff)
+        )
+    
+    await db_writer.run(write)
+
+
+async def create_broadcast(
+    from_chat_id: int,
+    message_id: int,
+    admin_chat_id: int,
+    progress_message_id: int | None,
+    total: int,
+    worker_id: str,
+    lease: timedelta
+) -> int:
+    """
+    Создаёт задание рассылки, сразу взятое в аренду создавшим его экземпляром.
+    
+    Args:
+        from_chat_id: Чат с сообщением для рассылки
+        message_id: ID сообщения для рассылки
+        admin_chat_id: Чат админа для отчёта о прогрессе
+        progress_message_id: Сообщение в чате админа, в котором показывается прогресс
+        total: Количество получателей на момент создания
+        worker_id: Идентификатор экземпляра бота
+        lease: Длительность аренды
         
-        if not include_completed:
-            stmt = stmt.where(Task.is_completed == False)
+    Returns:
+        int: ID задания
+    """
+    async def write(session: AsyncSession) -> int:
+        broadcast = Broadcast(
+            from_chat_id=from_chat_id,
+            message_id=message_id,
+            admin_chat_id=admin_chat_id,
+            progress_message_id=progress_message_id,
+            total=total,
+            status="running",
+            claimed_by=worker_id,
+            lease_until=datetime.now() + lease
+        )
+        session.add(broadcast)
+        await session.flush()
+        return broadcast.id
+    
+    return await db_writer.run(write)
+
+
+async def get_broadcast(broadcast_id: int) -> Broadcast | None:
+    """
+    Возвращает задание рассылки.
+    
+    Args:
+        broadcast_id: ID задания
         
-        stmt = stmt.order_by(Task.scheduled_time.asc().nulls_last())
+    Returns:
+        Broadcast | None: Задание или None, если его нет
+    """
+    async with async_session_maker() as session:
+        return await session.get(Broadcast, broadcast_id)
+
+
+async def claim_broadcasts(worker_id: str, lease: timedelta) -> list[int]:
+    """
+    Берёт в аренду незавершённые задания рассылки, которые никто не ведёт.
+    
+    Как и claim_tasks, условный UPDATE захватывает только задания со
+    статусом running без действующей аренды, поэтому при нескольких
+    экземплярах бота каждое задание продолжает ровно один из них. Если
+    экземпляр упал, аренда истекает и задание забирает другой.
+    
+    Args:
+        worker_id: Идентификатор экземпляра бота
+        lease: Длительность аренды
         
-        result = await session.execute(stmt)
-        tasks = result.scalars().all()
-        return list(tasks)
+    Returns:
+        list[int]: ID захваченных заданий
+    """
+    async def write(session: AsyncSession) -> list[int]:
+        now = datetime.now()
+        claimable = select(Broadcast.id).where(
+            Broadcast.status == "running",
+            or_(Broadcast.lease_until.is_(None), Broadcast.lease_until < now)
+        )
+        if session.bind.dialect.name == "postgresql":
+            claimable = claimable.with_for_update(skip_locked=True)
+        
+        result = await session.execute(
+            update(Broadcast)
+            .where(Broadcast.id.in_(claimable.scalar_subquery()))
+            .values(claimed_by=worker_id, lease_until=now + lease)
+            .returning(Broadcast.id)
+            .execution_options(synchronize_session=False)
+        )
+        return sorted(result.scalars().all())
+    
+    return await db_writer.run(write)
+
+
+async def release_broadcast(broadcast_id: int, worker_id: str) -> None:
+    """
+    Снимает аренду задания, чтобы другой экземпляр (или этот же после
+    перезапуска) мог продолжить его сразу, не дожидаясь истечения аренды.
+    
+    Args:
+        broadcast_id: ID задания
+        worker_id: Идентификатор экземпляра бота, который держит аренду
+    """
+    async def write(session: AsyncSession) -> None:
+        await session.execute(
+            update(Broadcast)
+            .where(Broadcast.id == broadcast_id, Broadcast.claimed_by == worker_id)
+            .values(lease_until=None)
+        )
+    
+    await db_writer.run(write)
+
+
+async def update_broadcast(broadcast_id: int, **values) -> None:
+    """
+    Обновляет поля задания рассылки.
+    
+    Args:
+        broadcast_id: ID задания
+        **values: Новые значения полей
+    """
+    async def write(session: AsyncSession) -> None:
+        await session.execute(
+            update(Broadcast).where(Broadcast.id == broadcast_id).values(**values)
+        )
+    
+    await db_writer.run(write)
+
+
+async def checkpoint_broadcast(
+    broadcast_id: int,
+    cursor: int,
+    sent: int,
+    blocked: int,
+    failed: int,
+    worker_id: str,
+    lease: timedelta
+) -> str | None:
+    """
+    Сохраняет прогресс рассылки после обработки страницы получателей.
+    
+    Курсор, счётчики и продление аренды записываются одним UPDATE, поэтому
+    после перезапуска рассылка продолжается ровно с сохранённого места.
+    Прогресс сохраняется, только пока аренда принадлежит этому экземпляру.
+    
+    Args:
+        broadcast_id: ID задания
+        cursor: tg_id последнего обработанного получателя
+        sent: Сколько доставлено на этой странице
+        blocked: Сколько получателей заблокировали бота
+        failed: Сколько отправок завершилось другой ошибкой
+        worker_id: Идентификатор экземпляра бота
+        lease: Длительность аренды
+        
+    Returns:
+        str | None: Текущий статус задания (его мог изменить другой
+        экземпляр) или None, если аренду забрал другой экземпляр
+    """
+    async def write(session: AsyncSession) -> str | None:
+        result = await session.execute(
+            update(Broadcast)
+            .where(Broadcast.id == broadcast_id, Broadcast.claimed_by == worker_id)
+            .values(
+                cursor=cursor,
+                sent=Broadcast.sent + sent,
+                blocked=Broadcast.blocked + blocked,
+                failed=Broadcast.failed + failed,
+                lease_until=datetime.now() + lease
+            )
+            .returning(Broadcast.status)
+        )
+        return result.scalar_one_or_none()
+    
+    return await db_writer.run(write)
+
+
+async def get_fsm_record(key: str) -> tuple[str | None, bytes | None, datetime] | None:
+    """
+    Возвращает запись хранилища FSM.
+    
+    Args:
+        key: Ключ хранилища
+        
+    Returns:
+        tuple | None: (state, data, expires_at) или None, если записи нет или она устарела
+    """
+    async with async_session_maker() as session:
+        result = await session.execute(
+            select(FsmRecord.state, FsmRecord.data, FsmRecord.expires_at).where(
+                FsmRecord.key == key,
+                FsmRecord.expires_at > datetime.now()
+            )
+        )
+        row = result.one_or_none()
+        return tuple(row) if row is not None else None
+
+
+async def save_fsm_record(key: str, state: str | None, data: bytes | None, expires_at: datetime) -> None:
+    """
+    Сохраняет запись хранилища FSM (upsert).
+    
+    Args:
+        key: Ключ хранилища
+        state: Состояние
+        data: Сериализованные данные
+        expires_at: Время устаревания записи
+    """
+    async def write(session: AsyncSession) -> None:
+        await _upsert(
+            session,
+            FsmRecord,
+            values=dict(key=key, state=state, data=data, expires_at=expires_at),
+            index_elements=['key'],
+            set_=dict(state=state, data=data, expires_at=expires_at)
+        )
+    
+    await db_writer.run(write)
+
+
+async def delete_fsm_record(key: str) -> None:
+    """
+    Удаляет запись хранилища FSM.
+    
+    Args:
+        key: Ключ хранилища
+    """
+    async def write(session: AsyncSession) -> None:
+        await session.execute(delete(FsmRecord).where(FsmRecord.key == key))
+    
+    await db_writer.run(write)
+
+
+async def delete_expired_fsm_records() -> int:
+    """
+    Удаляет устаревшие записи хранилища FSM (брошенные диалоги).
+    
+    Returns:
+        int: Количество удалённых записей
+    """
+    async def write(session: AsyncSession) -> int:
+        result = await session.execute(
+            delete(FsmRecord).where(FsmRecord.expires_at <= datetime.now())
+        )
+        return result.rowcount
+    
+    return await db_writer.run(write)
@@ -0,0 +1,200 @@
+"""Хранилище состояний FSM в базе данных бота"""
+import asyncio
+import json
+import os
+import time
+import zlib
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+
+from database.requests import (
+    get_fsm_record, save_fsm_record, delete_fsm_record, delete_expired_fsm_records
+)
+
+
+# Данные длиннее этого порога (в байтах JSON) сжимаются zlib
+COMPRESS_THRESHOLD = 512
+
+
+def serialize_data(data: dict[str, Any]) -> bytes | None:
+    """
+    Сериализует данные диалога в компактный вид.
+
+    JSON без пробелов и без экранирования кириллицы; длинные данные
+    (например, расшифровка голосового) дополнительно сжимаются.
+    Первый байт - формат: b"j" (JSON) или b"z" (JSON + zlib).
+
+    Args:
+        data: Данные диалога
+
+    Returns:
+        bytes | None: Сериализованные данные или None для пустых
+    """
+    if not data:
+        return None
+    raw = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode()
+    if len(raw) > COMPRESS_THRESHOLD:
+        return b"z" + zlib.compress(raw)
+    return b"j" + raw
+
+
+def deserialize_data(blob: bytes | None) -> dict[str, Any]:
+    """
+    Восстанавливает данные диалога, сериализованные serialize_data().
+
+    Args:
+        blob: Сериализованные данные
+
+    Returns:
+        dict[str, Any]: Данные диалога (пустой словарь, если данных нет)
+    """
+    if not blob:
+        return {}
+    raw = zlib.decompress(blob[1:]) if blob[:1] == b"z" else blob[1:]
+    return json.loads(raw)
+
+
+class DatabaseStorage(BaseStorage):
+    """
+    Хранилище FSM aiogram в таблице fsm_states вместо MemoryStorage.
+
+    Состояния и данные диалогов (черновик рассылки, расшифровка голосового
+    до подтверждения) переживают перезапуск и доступны всем экземплярам
+    бота с общей базой. Каждая запись живёт FSM_TTL_SECONDS с последнего
+    изменения, устаревшие записи удаляются в фоне, поэтому брошенные
+    диалоги не накапливаются.
+
+    Чтение идёт через кэш в памяти (write-through): каждое изменение сразу
+    пишется в базу и в кэш. Кэш ограничен FSM_CACHE_SIZE записями (LRU) и
+    доверяет записи не дольше FSM_CACHE_SECONDS, чтобы подхватывать
+    изменения других экземпляров. Кэшируются и пустые записи: состояние
+    читается на каждое обновление, а у большинства пользователей его нет.
+    """
+
+    def __init__(self, key_builder: KeyBuilder | None = None) -> None:
+        """
+        Инициализация хранилища.
+
+        Args:
+            key_builder: Построитель ключей (по умолчанию с bot_id и destiny)
+        """
+        self.key_builder = key_builder or DefaultKeyBuilder(
+            prefix="fsm",
+            with_bot_id=True,
+            with_business_connection_id=True,
+            with_destiny=True,
+        )
+        self.ttl = timedelta(seconds=float(os.getenv("FSM_TTL_SECONDS", "86400")))
+        self.cache_size = int(os.getenv("FSM_CACHE_SIZE", "10000"))
+        self.cache_seconds = float(os.getenv("FSM_CACHE_SECONDS", "60"))
+        self.cleanup_interval = float(os.getenv("FSM_CLEANUP_MINUTES", "10")) * 60
+
+        # ключ -> (когда запись в кэше устаревает по time.monotonic(), expires_at, state, data)
+        self._cache: OrderedDict[str, tuple[float, datetime | None, str | None, dict[str, Any]]] = OrderedDict()
+        self._cleaner: asyncio.Task | None = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    async def _get(self, key: StorageKey) -> tuple[str, str | None, dict[str, Any]]:
+        """Прочитать запись из кэша или базы: (ключ, state, data)."""
+        storage_key = self.key_builder.build(key)
+        cached = self._cache.get(storage_key)
+        if cached is not None:
+            cached_until, expires_at, state, data = cached
+            if cached_until > time.monotonic() and (expires_at is None or expires_at > datetime.now()):
+                self._cache.move_to_end(storage_key)
+                self.hits += 1
+                return storage_key, state, data
+
+        self.misses += 1
+        record = await get_fsm_record(storage_key)
+        if record is None:
+            state, data, expires_at = None, {}, None
+        else:
+            state, blob, expires_at = record
+            data = deserialize_data(blob)
+        self._remember(storage_key, expires_at, state, data)
+        return storage_key, state, data
+
+    async def _put(self, storage_key: str, state: str | None, data: dict[str, Any]) -> None:
+        """Записать запись в базу и в кэш; пустая запись удаляется."""
+        self._start_cleanup()
+        # Если запись не удалась, в кэше не должно остаться старого значения
+        self._cache.pop(storage_key, None)
+
+        if state is None and not data:
+            await delete_fsm_record(storage_key)
+            self._remember(storage_key, None, None, {})
+            return
+
+        expires_at = datetime.now() + self.ttl
+        await save_fsm_record(storage_key, state, serialize_data(data), expires_at)
+        self._remember(storage_key, expires_at, state, data)
+
+    def _remember(self, storage_key: str, expires_at: datetime | None, state: str | None, data: dict[str, Any]) -> None:
+        """Положить запись в кэш, вытеснив самые давно использованные."""
+        self._cache[storage_key] = (time.monotonic() + self.cache_seconds, expires_at, state, data)
+        self._cache.move_to_end(storage_key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        """Установить состояние, сохранив данные диалога."""
+        storage_key, _, data = await self._get(key)
+        await self._put(storage_key, state.state if isinstance(state, State) else state, data)
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        """Получить текущее состояние."""
+        _, state, _ = await self._get(key)
+        return state
+
+    async def set_data(self, key: StorageKey, data: dict[str, Any]) -> None:
+        """Заменить данные диалога, сохранив состояние."""
+        storage_key, state, _ = await self._get(key)
+        await self._put(storage_key, state, data.copy())
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        """Получить копию данных диалога."""
+        _, _, data = await self._get(key)
+        return data.copy()
+
+    def _start_cleanup(self) -> None:
+        """Запустить фоновое удаление устаревших записей (при первой записи)."""
+        if self._cleaner is None:
+            self._cleaner = asyncio.create_task(self._cleanup())
+
+    async def _cleanup(self) -> None:
+        """Периодически удалять устаревшие записи из базы."""
+        while True:
+            await asyncio.sleep(self.cleanup_interval)
+            try:
+                self.evicted += await delete_expired_fsm_records()
+            except Exception as e:
+                print(f"Error deleting expired FSM states: {e}")
+
+    async def close(self) -> None:
+        """Остановить фоновую очистку (все записи уже в базе)."""
+        if self._cleaner is not None:
+            self._cleaner.cancel()
+            self._cleaner = None
+        self._cache.clear()
+
+    def get_stats(self) -> dict[str, int]:
+        """
+        Получить статистику хранилища.
+
+        Returns:
+            Размер кэша, попадания и промахи кэша, число удалённых устаревших записей
+        """
+        return {
+            "cached": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evicted": self.evicted,
+        }
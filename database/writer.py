@@ -0,0 +1,147 @@
+"""Очередь записи в базу данных с групповым коммитом"""
+import asyncio
+import os
+from typing import Awaitable, Callable, TypeVar
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+
+T = TypeVar("T")
+
+WriteOperation = Callable[[AsyncSession], Awaitable[T]]
+
+
+class DatabaseWriter:
+    """
+    Единственный писатель в базу данных.
+
+    SQLite допускает одну пишущую транзакцию за раз, поэтому параллельные
+    коммиты из обработчиков, напоминаний и рассылок конкурируют за блокировку
+    и иногда получают "database is locked". Здесь все записи выстраиваются в
+    очередь, а фоновая задача выполняет накопившиеся операции в одной
+    транзакции (групповой коммит). Каждая операция выполняется в своей точке
+    сохранения (SAVEPOINT), поэтому ошибка одной не откатывает остальные.
+    """
+
+    def __init__(self, session_maker: async_sessionmaker[AsyncSession]) -> None:
+        """
+        Инициализация писателя.
+
+        Args:
+            session_maker: Фабрика сессий пишущего движка
+        """
+        self.session_maker = session_maker
+
+        self._queue: asyncio.Queue[tuple[WriteOperation, asyncio.Future] | None] | None = None
+        self._runner: asyncio.Task | None = None
+
+        self.transactions = 0
+        self.operations = 0
+
+    async def run(self, operation: WriteOperation[T]) -> T:
+        """
+        Выполнить операцию записи в очередной групповой транзакции.
+
+        Операция не должна сама делать commit: транзакцию завершает писатель.
+
+        Args:
+            operation: Корутина-функция, принимающая сессию
+
+        Returns:
+            Результат операции (после фиксации транзакции)
+
+        Raises:
+            Exception: Ошибка операции или фиксации транзакции
+        """
+        if self._runner is None or self._runner.done():
+            self._queue = asyncio.Queue()
+            self._runner = asyncio.create_task(self._run())
+
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((operation, future))
+        return await future
+
+    async def _run(self) -> None:
+        """Забирать операции из очереди пачками и фиксировать каждую пачку одним коммитом."""
+        batch_size = int(os.getenv("DB_WRITE_BATCH_SIZE", "100"))
+        batch_window = float(os.getenv("DB_WRITE_BATCH_WINDOW_MS", "2")) / 1000
+        loop = asyncio.get_running_loop()
+
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+
+            # Подождать немного, чтобы собрать одновременные записи в одну транзакцию
+            deadline = loop.time() + batch_window
+            stop = False
+            while len(batch) < batch_size:
+                try:
+                    timeout = deadline - loop.time()
+                    item = self._queue.get_nowait() if timeout <= 0 else await asyncio.wait_for(self._queue.get(), timeout)
+                except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+
+            await self._commit(batch)
+            if stop:
+                return
+
+    async def _commit(self, batch: list[tuple[WriteOperation, asyncio.Future]]) -> None:
+        """Выполнить пачку операций в одной транзакции и раздать результаты."""
+        results: list[tuple[bool, object]] = []
+        try:
+            async with self.session_maker() as session:
+                async with session.begin():
+                    for operation, future in batch:
+                        if future.done():
+                            # Вызывающий отменил ожидание
+                            results.append((False, None))
+                            continue
+                        try:
+                            async with session.begin_nested():
+                                results.append((True, await operation(session)))
+                        except Exception as e:
+                            results.append((False, e))
+        except Exception as e:
+            print(f"Database write transaction Error: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.transactions += 1
+        self.operations += len(batch)
+        for (_, future), (ok, value) in zip(batch, results):
+            if future.done():
+                continue
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+    async def close(self) -> None:
+        """Выполнить операции, оставшиеся в очереди, и остановить писателя."""
+        if self._runner is None or self._runner.done():
+            return
+        self._queue.put_nowait(None)
+        await self._runner
+        self._runner = None
+
+    def get_stats(self) -> dict[str, float]:
+        """
+        Получить статистику писателя.
+
+        Returns:
+            Число транзакций, операций, средний размер группы и длина очереди
+        """
+        return {
+            "transactions": self.transactions,
+            "operations": self.operations,
+            "avg_batch_size": self.operations / self.transactions if self.transactions else 0.0,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+        }
@@ -1,5 +1,5 @@
 """Пакет с обработчиками команд бота"""
-from handlers.main import router
+from handlers.main import router, sweep_speculative_parses, SPECULATIVE_PARSE_TTL
 from handlers.admin import admin_router
 
-__all__ = ['router', 'admin_router']
+__all__ = ['router', 'admin_router', 'sweep_speculative_parses', 'SPECULATIVE_PARSE_TTL']
@@ -1,14 +1,17 @@
 """Админские команды бота"""
 import os
-from aiogram import Router, Bot
+from aiogram import Router, F
 from aiogram.filters import Command
 from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from aiogram.exceptions import TelegramForbiddenError
 
-from database.requests import get_users_count, get_users
+from broadcast import get_broadcast_manager
+from database.requests import get_users_count, get_lease_counts
+from handlers import main as main_handlers
 from handlers.fsm import Newsletter
+from middlewares import get_outbound_queue
+from scheduler import MAX_MESSAGE_LENGTH
 
 
 # Создаем роутер для админских хендлеров
@@ -36,15 +39,68 @@ def is_admin(message: Message) -> bool:
     return message.from_user.id in admin_ids
 
 
+def format_stats(title: str, stats: dict[str, float]) -> str:
+    """
+    Форматирует метрики компонента для /stats.
+    
+    Args:
+        title: Заголовок раздела
+        stats: Метрики (результат get_stats() компонента)
+        
+    Returns:
+        str: Раздел с метриками по одной в строке
+    """
+    lines = [title]
+    for key, value in stats.items():
+        if isinstance(value, float):
+            value = f"{value:.3g}"
+        lines.append(f"{key}: {value}")
+    return "\n".join(lines)
+
+
+def collect_stats() -> list[str]:
+    """
+    Собирает метрики компонентов бота, которые уже запущены.
+    
+    Returns:
+        list[str]: Разделы для /stats
+    """
+    sections = []
+    if main_handlers.ai_service is not None:
+        sections.append(format_stats("🤖 AI (парсинг, кэш, лимитеры, провайдеры, токены)", main_handlers.ai_service.get_stats()))
+    sections.append(format_stats("🎤 Кэш расшифровок голосовых", main_handlers.get_transcript_cache_stats()))
+    outbound_queue = get_outbound_queue()
+    if outbound_queue is not None:
+        sections.append(format_stats("📤 Очередь отправки", outbound_queue.get_stats()))
+    return sections
+
+
 @admin_router.message(Command("stats"), lambda message: is_admin(message))
 async def cmd_stats(message: Message):
     """
     Команда /stats - показывает статистику бота (только для админов).
     
-    Возвращает количество зарегистрированных пользователей.
+    Возвращает количество зарегистрированных и доступных пользователей,
+    напоминаний в аренде и метрики компонентов (AI, кэш расшифровок, очередь отправки).
     """
     users_count = await get_users_count()
-    await message.answer(f"📊 Всего пользователей: {users_count}")
+    reachable_count = await get_users_count(reachable_only=True)
+    leases = await get_lease_counts()
+    sections = [
+        f"📊 Всего пользователей: {users_count}\n"
+        f"✅ Доступны для рассылки: {reachable_count}\n"
+        f"⏳ Напоминаний в аренде: {leases['leased']} (аренда истекла: {leases['expired']})"
+    ]
+    sections += collect_stats()
+    
+    # Разделы собираются в сообщения, не превышающие лимит Telegram
+    text = ""
+    for section in sections:
+        if text and len(text) + len(section) + 2 > MAX_MESSAGE_LENGTH:
+            await message.answer(text)
+            text = ""
+        text = f"{text}\n\n{section}" if text else section
+    await message.answer(text[:MAX_MESSAGE_LENGTH])
 
 
 @admin_router.message(Command("stats"))
@@ -100,11 +156,13 @@ async def newsletter_message_received(message: Message, state: FSMContext):
 
 
 @admin_router.callback_query(lambda c: c.data == "newsletter_send")
-async def newsletter_send(callback: CallbackQuery, state: FSMContext, bot: Bot):
+async def newsletter_send(callback: CallbackQuery, state: FSMContext):
     """
     Обработчик кнопки "Отправить".
     
-    Рассылает сообщение всем пользователям с обработкой ошибок.
+    Создаёт задание рассылки в базе данных и запускает его в фоне.
+    Сообщение с кнопками превращается в отчёт о прогрессе с кнопками
+    паузы и отмены.
     """
     # Проверяем, что это админ
     if not is_admin_by_id(callback.from_user.id):
@@ -112,54 +170,57 @@ async def newsletter_send(callback: CallbackQuery, state: FSMContext, bot: Bot):
         return
     
     await callback.answer()
-    await callback.message.edit_text("⏳ Начинаю рассылку...")
     
     # Получаем данные сохраненного сообщения
     data = await state.get_data()
+    chat_id = data.get("chat_id")
     message_id = data.get("message_id")
-    from_chat_id = data.get("chat_id")
-    
-    # Получаем список всех пользователей
-    users = await get_users()
-    
-    # Счетчики
-    success_count = 0
-    blocked_count = 0
-    error_count = 0
-    
-    # Рассылка
-    for user_id in users:
-        try:
-            await bot.copy_message(
-                chat_id=user_id,
-                from_chat_id=from_chat_id,
-                message_id=message_id
-            )
-            success_count += 1
-        except TelegramForbiddenError:
-            # Пользователь заблокировал бота
-            blocked_count += 1
-        except Exception as e:
-            # Другие ошибки (например, пользователь удалил аккаунт)
-            error_count += 1
-            print(f"Ошибка при отправке пользователю {user_id}: {e}")
-    
-    # Отправляем отчет админу
-    report = (
-        f"✅ Рассылка завершена!\n\n"
-        f"📊 Статистика:\n"
-        f"✅ Успешно: {success_count}\n"
-        f"🚫 Заблокировали бота: {blocked_count}\n"
-        f"❌ Другие ошибки: {error_count}\n"
-        f"👥 Всего пользователей: {len(users)}"
-    )
+    if chat_id is None or message_id is None:
+        # Черновик потерян (например, состояние устарело) - рассылать нечего
+        await state.clear()
+        await callback.message.edit_text(
+            "❌ Сообщение для рассылки не найдено, возможно, черновик устарел.\n"
+            "Начните заново: /newsletter"
+        )
+        return
     
-    await callback.message.answer(report)
+    await callback.message.edit_text("⏳ Начинаю рассылку...")
+    
+    # Создаем задание рассылки: оно продолжится и после перезапуска бота
+    await get_broadcast_manager().create(
+        from_chat_id=chat_id,
+        message_id=message_id,
+        admin_chat_id=callback.message.chat.id,
+        progress_message_id=callback.message.message_id
+    )
     
     # Сбрасываем состояние
     await state.clear()
 
 
+@admin_router.callback_query(F.data.regexp(r"^broadcast_(pause|resume|cancel):\d+$"))
+async def broadcast_control(callback: CallbackQuery):
+    """
+    Обработчик кнопок "Пауза", "Продолжить" и "Отменить" в отчёте о рассылке.
+    """
+    if not is_admin_by_id(callback.from_user.id):
+        await callback.answer("⛔ Эта функция доступна только администраторам.", show_alert=True)
+        return
+    
+    action, broadcast_id = callback.data.removeprefix("broadcast_").split(":")
+    manager = get_broadcast_manager()
+    
+    if action == "pause":
+        await manager.pause(int(broadcast_id))
+        await callback.answer("⏸ Рассылка будет приостановлена")
+    elif action == "resume":
+        await manager.resume(int(broadcast_id))
+        await callback.answer("▶️ Рассылка продолжается")
+    else:
+        await manager.cancel(int(broadcast_id))
+        await callback.answer("❌ Рассылка будет отменена")
+
+
 @admin_router.callback_query(lambda c: c.data == "newsletter_cancel")
 async def newsletter_cancel(callback: CallbackQuery, state: FSMContext):
     """
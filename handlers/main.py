@@ -1,15 +1,22 @@
 from datetime import datetime
 from aiogram import Router, F, Bot
-from aiogram.filters import Command
-from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.filters import Command, CommandObject
+from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton, Voice
 from aiogram.enums import ChatAction
 from aiogram.fsm.context import FSMContext
+import asyncio
 import os
 import tempfile
+from typing import BinaryIO
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
-from database.requests import set_user, add_task, get_user_tasks
+from database.requests import (
+    set_user, add_task, iter_user_tasks, get_voice_transcript, save_voice_transcript,
+    get_user_timezone, set_user_timezone
+)
 from ai import AIService
-from scheduler import add_task_reminder
+from scheduler import add_task_reminder, MAX_MESSAGE_LENGTH
+from database.models import DEFAULT_TIMEZONE
 from handlers.fsm import VoiceConfirmation
 
 # Создаем роутер для обработчиков
@@ -27,6 +34,187 @@ def get_ai_service() -> AIService:
     return ai_service
 
 
+async def download_voice(bot: Bot, voice: Voice) -> BinaryIO:
+    """
+    Скачивает голосовое сообщение без записи временных файлов.
+    
+    Обычные голосовые скачиваются в io.BytesIO. Крупные файлы пишутся в
+    SpooledTemporaryFile, запись чанков выполняется в отдельном потоке,
+    чтобы не блокировать event loop.
+    
+    Args:
+        bot: Экземпляр бота
+        voice: Голосовое сообщение
+        
+    Returns:
+        BinaryIO: Файловый объект, установленный на начало
+    """
+    # Голосовые больше этого размера (в байтах) скачиваются в spooled-файл, а не в память
+    memory_limit = int(os.getenv("VOICE_MEMORY_LIMIT", str(5 * 1024 * 1024)))
+    
+    if voice.file_size is None or voice.file_size <= memory_limit:
+        return await bot.download(voice)
+    
+    voice_file = await bot.get_file(voice.file_id)
+    url = bot.session.api.file_url(bot.token, voice_file.file_path)
+    spooled = tempfile.SpooledTemporaryFile(max_size=memory_limit)
+    try:
+        async for chunk in bot.session.stream_content(url=url, raise_for_status=True):
+            await asyncio.to_thread(spooled.write, chunk)
+        await asyncio.to_thread(spooled.seek, 0)
+    except Exception:
+        spooled.close()
+        raise
+    return spooled
+
+
+# Статистика кэша расшифровок (показывается в /stats)
+transcript_cache_stats = {"hits": 0, "misses": 0}
+
+
+def get_transcript_cache_stats() -> dict[str, float]:
+    """
+    Возвращает статистику кэша расшифровок голосовых сообщений.
+    
+    Returns:
+        dict[str, float]: Попадания, промахи и доля попаданий
+    """
+    total = transcript_cache_stats["hits"] + transcript_cache_stats["misses"]
+    return {
+        **transcript_cache_stats,
+        "hit_rate": transcript_cache_stats["hits"] / total if total else 0.0,
+    }
+
+
+async def transcribe_voice_message(message: Message) -> str:
+    """
+    Распознаёт голосовое сообщение с кэшированием по file_unique_id.
+    
+    При попадании в кэш не выполняются ни скачивание файла, ни запрос к Whisper,
+    поэтому пересланные и повторно отправленные голосовые распознаются мгновенно.
+    
+    Args:
+        message: Сообщение с голосовым
+        
+    Returns:
+        str: Распознанный текст
+    """
+    voice = message.voice
+    
+    cached = await get_voice_transcript(voice.file_unique_id)
+    if cached is not None:
+        transcript_cache_stats["hits"] += 1
+        return cached
+    transcript_cache_stats["misses"] += 1
+    
+    # Скачиваем голосовое сообщение в память (без временных файлов на диске)
+    audio_file = await download_voice(message.bot, voice)
+    
+    # Отправляем уведомление о начале распознавания
+    status_msg = await message.answer("🎤 Распознаю голосовое сообщение...")
+    
+    # Распознаем голос с помощью Whisper
+    with audio_file:
+        transcribed_text = await get_ai_service().transcribe_voice(audio_file, message.from_user.id)
+    
+    # Удаляем сообщение о статусе
+    await status_msg.delete()
+    
+    if transcribed_text:
+        # Размер кэша расшифровок (записей в БД)
+        cache_size = int(os.getenv("TRANSCRIPT_CACHE_SIZE", "10000"))
+        await save_voice_transcript(voice.file_unique_id, transcribed_text, cache_size)
+    
+    return transcribed_text
+
+
+# Время жизни спекулятивного разбора, если пользователь так и не нажал кнопку (секунды)
+SPECULATIVE_PARSE_TTL = 600
+
+# Спекулятивные разборы распознанных голосовых: (chat_id, user_id) -> (текст, задача, время запуска)
+speculative_parses: dict[tuple[int, int], tuple[str, asyncio.Task, float]] = {}
+
+
+def _consume_task_result(task: asyncio.Task) -> None:
+    """Забирает исключение отброшенной задачи, чтобы asyncio не ругался в лог"""
+    if not task.cancelled():
+        task.exception()
+
+
+def start_speculative_parse(chat_id: int, user_id: int, text: str) -> None:
+    """
+    Запускает разбор задачи в фоне, пока пользователь подтверждает расшифровку.
+    
+    Args:
+        chat_id: ID чата
+        user_id: Telegram ID пользователя
+        text: Распознанный текст
+    """
+    cancel_speculative_parse(chat_id, user_id)
+    task = asyncio.create_task(get_ai_service().parse_task_message(text, user_id))
+    task.add_done_callback(_consume_task_result)
+    speculative_parses[(chat_id, user_id)] = (text, task, asyncio.get_running_loop().time())
+
+
+async def sweep_speculative_parses() -> int:
+    """
+    Убирает разборы, которые так и не были подтверждены за SPECULATIVE_PARSE_TTL.
+    
+    Запускается периодически из планировщика, чтобы брошенные разборы
+    не копились в памяти.
+    
+    Returns:
+        int: Количество удалённых разборов
+    """
+    now = asyncio.get_running_loop().time()
+    expired = [
+        key for key, (_, _, started) in speculative_parses.items()
+        if now - started > SPECULATIVE_PARSE_TTL
+    ]
+    for key in expired:
+        speculative_parses.pop(key)[1].cancel()
+    return len(expired)
+
+
+def cancel_speculative_parse(chat_id: int, user_id: int) -> None:
+    """
+    Отменяет спекулятивный разбор (например, если пользователь выбрал "Исправить").
+    
+    Args:
+        chat_id: ID чата
+        user_id: Telegram ID пользователя
+    """
+    entry = speculative_parses.pop((chat_id, user_id), None)
+    if entry is not None:
+        entry[1].cancel()
+
+
+async def take_speculative_parse(chat_id: int, user_id: int, text: str) -> dict[str, str | None]:
+    """
+    Возвращает результат спекулятивного разбора или выполняет разбор заново.
+    
+    Args:
+        chat_id: ID чата
+        user_id: Telegram ID пользователя
+        text: Подтверждённый текст
+        
+    Returns:
+        dict: Результат parse_task_message
+    """
+    entry = speculative_parses.pop((chat_id, user_id), None)
+    if entry is not None:
+        speculative_text, task, _ = entry
+        if speculative_text == text:
+            try:
+                return await task
+            except Exception as e:
+                print(f"Speculative parse failed, retrying: {e}")
+        else:
+            task.cancel()
+    
+    return await get_ai_service().parse_task_message(text, user_id)
+
+
 @router.message(Command("start"))
 async def cmd_start(message: Message):
     """Обработчик команды /start"""
@@ -49,39 +237,79 @@ async def cmd_start(message: Message):
         f"• \"Сходить в спортзал\" (добавится в бэклог)\n\n"
         f"Команды:\n"
         f"/mytasks — посмотреть свои задачи\n"
-        f"/addtask — добавить задачу вручную (без AI)"
+        f"/addtask — добавить задачу вручную (без AI)\n"
+        f"/timezone — часовой пояс для утренней сводки"
     )
 
 
+@router.message(Command("timezone"))
+async def cmd_timezone(message: Message, command: CommandObject):
+    """
+    Команда /timezone - показать или изменить часовой пояс пользователя.
+    
+    Ежедневная сводка приходит в 08:00 по этому часовому поясу.
+    """
+    if not command.args:
+        timezone = await get_user_timezone(message.from_user.id) or DEFAULT_TIMEZONE
+        await message.answer(
+            f"🕗 Твой часовой пояс: {timezone}\n\n"
+            f"Сводка на день приходит в 08:00 по этому времени.\n"
+            f"Чтобы изменить, отправь, например:\n"
+            f"/timezone Asia/Yekaterinburg"
+        )
+        return
+    
+    timezone = command.args.strip()
+    try:
+        ZoneInfo(timezone)
+    except (ZoneInfoNotFoundError, ValueError):
+        await message.answer(
+            "❌ Не знаю такой часовой пояс.\n\n"
+            "Укажи его в формате Регион/Город, например: Europe/Moscow, Asia/Novosibirsk"
+        )
+        return
+    
+    # Пользователь мог не нажимать /start - сначала сохраняем его
+    await set_user(tg_id=message.from_user.id, username=message.from_user.username)
+    await set_user_timezone(message.from_user.id, timezone)
+    await message.answer(f"✅ Часовой пояс сохранён: {timezone}")
+
+
 @router.message(Command("mytasks"))
 async def cmd_my_tasks(message: Message):
     """Показать список задач пользователя"""
     try:
-        tasks = await get_user_tasks(message.from_user.id, include_completed=False)
+        # Задачи читаются частями (сначала запланированные, затем бэклог),
+        # длинный список отправляется несколькими сообщениями
+        response = "📋 Твои задачи:\n\n"
+        section = None
+        has_tasks = False
+        
+        async for chunk in iter_user_tasks(message.from_user.id, include_completed=False):
+            for _, text, scheduled_time in chunk:
+                has_tasks = True
+                if scheduled_time is not None:
+                    kind, header = "scheduled", "⏰ Запланированные:\n"
+                    line = f"• {scheduled_time.strftime('%d.%m.%Y %H:%M')} — {text}\n"
+                else:
+                    kind, header = "backlog", "📝 Бэклог:\n"
+                    line = f"• {text}\n"
+                
+                if kind != section:
+                    # Между разделами - пустая строка
+                    response += ("\n" if section else "") + header
+                    section = kind
+                
+                if len(response) + len(line) > MAX_MESSAGE_LENGTH:
+                    await message.answer(response)
+                    response = ""
+                response += line
         
-        if not tasks:
+        if not has_tasks:
             await message.answer("У тебя пока нет задач. Добавь первую! 📝")
             return
         
-        # Разделяем задачи на запланированные и бэклог
-        scheduled_tasks = [t for t in tasks if t.scheduled_time]
-        backlog_tasks = [t for t in tasks if not t.scheduled_time]
-        
-        response = "📋 Твои задачи:\n\n"
-        
-        if scheduled_tasks:
-            response += "⏰ Запланированные:\n"
-            for task in scheduled_tasks:
-                time_str = task.scheduled_time.strftime("%d.%m.%Y %H:%M")
-                response += f"• {time_str} — {task.text}\n"
-            response += "\n"
-        
-        if backlog_tasks:
-            response += "📝 Бэклог:\n"
-            for task in backlog_tasks:
-                response += f"• {task.text}\n"
-        
-        await message.answer(response)
+        await message.answer(response[:MAX_MESSAGE_LENGTH])
         
     except Exception as e:
         await message.answer("❌ Ошибка при получении задач")
@@ -98,46 +326,33 @@ async def voice_message_handler(message: Message, state: FSMContext):
             action=ChatAction.TYPING
         )
         
-        # Получаем AI сервис
-        service = get_ai_service()
+        # Распознаем голос (из кэша или через Whisper)
+        transcribed_text = await transcribe_voice_message(message)
         
-        # Создаем временную директорию для аудиофайла
-        with tempfile.TemporaryDirectory() as temp_dir:
-            # Скачиваем голосовое сообщение
-            voice_file = await message.bot.get_file(message.voice.file_id)
-            file_path = os.path.join(temp_dir, f"{message.voice.file_id}.ogg")
-            await message.bot.download_file(voice_file.file_path, file_path)
+        # Если распознавание прошло успешно
+        if transcribed_text:
+            # Сохраняем распознанный текст в FSM
+            await state.update_data(transcribed_text=transcribed_text)
             
-            # Отправляем уведомление о начале распознавания
-            status_msg = await message.answer("🎤 Распознаю голосовое сообщение...")
+            # Начинаем разбор задачи, не дожидаясь подтверждения
+            start_speculative_parse(message.chat.id, message.from_user.id, transcribed_text)
             
-            # Распознаем голос с помощью Whisper
-            transcribed_text = await service.transcribe_voice(file_path)
+            # Создаем inline-кнопки для подтверждения
+            keyboard = InlineKeyboardMarkup(inline_keyboard=[
+                [
+                    InlineKeyboardButton(text="✅ Верно", callback_data="voice_confirm"),
+                    InlineKeyboardButton(text="✏️ Исправить", callback_data="voice_correct")
+                ]
+            ])
             
-            # Удаляем сообщение о статусе
-            await status_msg.delete()
+            await message.answer(
+                f"📝 Распознал: \"{transcribed_text}\"\n\n"
+                f"Всё верно?",
+                reply_markup=keyboard
+            )
+        else:
+            await message.answer("❌ Не удалось распознать голосовое сообщение. Попробуй ещё раз!")
             
-            # Если распознавание прошло успешно
-            if transcribed_text:
-                # Сохраняем распознанный текст в FSM
-                await state.update_data(transcribed_text=transcribed_text)
-                
-                # Создаем inline-кнопки для подтверждения
-                keyboard = InlineKeyboardMarkup(inline_keyboard=[
-                    [
-                        InlineKeyboardButton(text="✅ Верно", callback_data="voice_confirm"),
-                        InlineKeyboardButton(text="✏️ Исправить", callback_data="voice_correct")
-                    ]
-                ])
-                
-                await message.answer(
-                    f"📝 Распознал: \"{transcribed_text}\"\n\n"
-                    f"Всё верно?",
-                    reply_markup=keyboard
-                )
-            else:
-                await message.answer("❌ Не удалось распознать голосовое сообщение. Попробуй ещё раз!")
-                
     except Exception as e:
         # Обработка ошибок
         error_message = str(e)
@@ -174,14 +389,15 @@ async def voice_confirm_callback(callback: CallbackQuery, state: FSMContext):
         # Удаляем кнопки
         await callback.message.edit_reply_markup(reply_markup=None)
         
-        # Показываем индикатор
-        await callback.message.answer("⏳ Обрабатываю...")
+        # Показываем индикатор, только если разбор ещё не готов
+        entry = speculative_parses.get((callback.message.chat.id, callback.from_user.id))
+        if entry is None or not entry[1].done():
+            await callback.message.answer("⏳ Обрабатываю...")
         
-        # Получаем AI сервис
-        service = get_ai_service()
-        
-        # Парсим задачу с помощью AI
-        parsed = await service.parse_task_message(transcribed_text)
+        # Берём результат спекулятивного разбора (или парсим заново)
+        parsed = await take_speculative_parse(
+            callback.message.chat.id, callback.from_user.id, transcribed_text
+        )
         
         task_text = parsed["task"]
         datetime_str = parsed["datetime"]
@@ -205,10 +421,8 @@ async def voice_confirm_callback(callback: CallbackQuery, state: FSMContext):
         if scheduled_time:
             # Добавляем задачу в планировщик
             add_task_reminder(
-                bot=callback.bot,
                 user_id=callback.from_user.id,
                 task_id=task.id,
-                text=task_text,
                 scheduled_time=scheduled_time
             )
             
@@ -238,6 +452,9 @@ async def voice_confirm_callback(callback: CallbackQuery, state: FSMContext):
 @router.callback_query(F.data == "voice_correct")
 async def voice_correct_callback(callback: CallbackQuery, state: FSMContext):
     """Обработчик запроса на исправление текста"""
+    # Текст будет другим - спекулятивный разбор больше не нужен
+    cancel_speculative_parse(callback.message.chat.id, callback.from_user.id)
+    
     # Удаляем кнопки
     await callback.message.edit_reply_markup(reply_markup=None)
     
@@ -264,7 +481,7 @@ async def voice_correction_text_handler(message: Message, state: FSMContext):
         service = get_ai_service()
         
         # Парсим задачу с помощью AI
-        parsed = await service.parse_task_message(message.text)
+        parsed = await service.parse_task_message(message.text, message.from_user.id)
         
         task_text = parsed["task"]
         datetime_str = parsed["datetime"]
@@ -288,10 +505,8 @@ async def voice_correction_text_handler(message: Message, state: FSMContext):
         if scheduled_time:
             # Добавляем задачу в планировщик
             add_task_reminder(
-                bot=message.bot,
                 user_id=message.from_user.id,
                 task_id=task.id,
-                text=task_text,
                 scheduled_time=scheduled_time
             )
             
@@ -339,7 +554,7 @@ async def task_message_handler(message: Message):
         service = get_ai_service()
         
         # Парсим задачу с помощью AI
-        parsed = await service.parse_task_message(message.text)
+        parsed = await service.parse_task_message(message.text, message.from_user.id)
         
         task_text = parsed["task"]
         datetime_str = parsed["datetime"]
@@ -364,10 +579,8 @@ async def task_message_handler(message: Message):
         if scheduled_time:
             # Добавляем задачу в планировщик
             add_task_reminder(
-                bot=message.bot,
                 user_id=message.from_user.id,
                 task_id=task.id,
-                text=task_text,
                 scheduled_time=scheduled_time
             )
             
@@ -1,3 +1,7 @@
 from .access_control import AccessControlMiddleware
+from .outbound import OutboundQueue, Priority, send_priority, init_outbound_queue, get_outbound_queue
 
-__all__ = ["AccessControlMiddleware"]
+__all__ = [
+    "AccessControlMiddleware", "OutboundQueue", "Priority", "send_priority",
+    "init_outbound_queue", "get_outbound_queue",
+]
@@ -0,0 +1,380 @@
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Any, Iterator
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+from aiogram.methods import Response, SendChatAction, TelegramMethod
+
+from database.requests import mark_users_unreachable
+
+
+class Priority(IntEnum):
+    """Классы приоритета исходящих сообщений (меньше - важнее)."""
+
+    INTERACTIVE = 0  # Ответы пользователю в обработчиках
+    REMINDER = 1     # Напоминания о задачах
+    DIGEST = 2       # Ежедневная сводка
+    BULK = 3         # Рассылки
+
+
+# Приоритет запросов текущего контекста (по умолчанию - ответы в обработчиках)
+current_priority: ContextVar[Priority] = ContextVar("outbound_priority", default=Priority.INTERACTIVE)
+
+# Методы, на которые действуют лимиты Telegram на отправку сообщений
+LIMITED_METHOD_PREFIXES = ("Send", "Copy", "Forward", "Edit")
+
+# Сколько последних задержек в очереди хранить для перцентилей
+LATENCY_WINDOW = 500
+
+# Как часто записывать недоступных пользователей в базу данных (секунды)
+UNREACHABLE_FLUSH_INTERVAL = 1.0
+
+
+def unreachable_reason(error: Exception) -> str | None:
+    """
+    Определить, означает ли ошибка, что пользователю больше нельзя писать.
+    
+    Args:
+        error: Ошибка Telegram API
+        
+    Returns:
+        Причина (blocked / deactivated / chat_not_found) или None
+    """
+    message = str(error).lower()
+    if isinstance(error, TelegramForbiddenError):
+        return "deactivated" if "deactivated" in message else "blocked"
+    if isinstance(error, TelegramBadRequest) and "chat not found" in message:
+        return "chat_not_found"
+    return None
+
+
+@contextmanager
+def send_priority(priority: Priority) -> Iterator[None]:
+    """
+    Отправлять сообщения внутри блока с заданным приоритетом.
+
+    Приоритет наследуется задачами asyncio, созданными внутри блока.
+
+    Args:
+        priority: Класс приоритета
+    """
+    token = current_priority.set(priority)
+    try:
+        yield
+    finally:
+        current_priority.reset(token)
+
+
+class OutboundQueue(BaseRequestMiddleware):
+    """
+    Единая очередь исходящих сообщений бота.
+
+    Подключается к сессии бота, поэтому через неё проходят все отправки:
+    ответы обработчиков, напоминания, сводки и рассылки. Запросы ждут
+    токен в общем ведре (~30 сообщений/с) и в ведре своего чата
+    (~1 сообщение/с с небольшим запасом); из готовых к отправке первым
+    уходит запрос с наивысшим приоритетом. При RetryAfter чат блокируется
+    на указанное время, и запрос повторяется автоматически.
+    
+    Пользователи, которым писать больше нельзя (Forbidden, chat not found),
+    пачками отмечаются недоступными в базе данных, чтобы рассылки и сводки
+    их пропускали.
+    """
+
+    def __init__(self) -> None:
+        """Инициализация очереди с настройками из переменных окружения."""
+        self.global_rate = float(os.getenv("OUTBOUND_GLOBAL_RATE", "30"))
+        self.chat_interval = 1 / float(os.getenv("OUTBOUND_CHAT_RATE", "1"))
+        self.chat_burst = float(os.getenv("OUTBOUND_CHAT_BURST", "3"))
+        self.max_retries = int(os.getenv("OUTBOUND_MAX_RETRIES", "3"))
+
+        # Общее ведро токенов
+        self._tokens = self.global_rate
+        self._refilled_at = time.monotonic()
+
+        # Очереди чатов: chat_id -> куча (priority, seq, future)
+        self._chats: dict[Any, list[tuple[int, int, asyncio.Future]]] = {}
+        # Когда чату снова можно отправлять и остаток токенов в ведре чата
+        self._chat_ready_at: dict[Any, float] = {}
+        self._chat_tokens: dict[Any, tuple[float, float]] = {}
+        # Чаты, готовые к отправке: (priority, seq, chat_id) головы очереди чата
+        self._ready: list[tuple[int, int, Any]] = []
+        # Чаты, ждущие своего ведра: (ready_at, chat_id)
+        self._delayed: list[tuple[float, Any]] = []
+
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._runner: asyncio.Task | None = None
+
+        self.sent = {priority: 0 for priority in Priority}
+        self.waits = {priority: deque(maxlen=LATENCY_WINDOW) for priority in Priority}
+        self.retry_after = 0
+        self.failed = 0
+        
+        # Недоступные пользователи, ещё не записанные в базу: tg_id -> причина
+        self._unreachable: dict[int, str] = {}
+        self._unreachable_flusher: asyncio.Task | None = None
+        self.unreachable = 0
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType,
+        bot: Bot,
+        method: TelegramMethod
+    ) -> Response:
+        """
+        Дождаться своей очереди и выполнить запрос, повторяя его при RetryAfter.
+
+        Args:
+            make_request: Следующий обработчик запроса в цепочке
+            bot: Экземпляр бота
+            method: Метод Telegram Bot API
+
+        Returns:
+            Ответ Telegram
+        """
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None or isinstance(method, SendChatAction) \
+                or not type(method).__name__.startswith(LIMITED_METHOD_PREFIXES):
+            # Служебные запросы (getUpdates, getFile, answerCallbackQuery...) идут без очереди
+            return await make_request(bot, method)
+
+        priority = current_priority.get()
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            await self._acquire(chat_id, priority)
+            self.waits[priority].append(time.monotonic() - started)
+            try:
+                response = await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                self.retry_after += 1
+                self._block_chat(chat_id, e.retry_after)
+                if attempt >= self.max_retries:
+                    self.failed += 1
+                    raise
+                attempt += 1
+                continue
+            except (TelegramForbiddenError, TelegramBadRequest) as e:
+                reason = unreachable_reason(e)
+                if reason is not None and isinstance(chat_id, int) and chat_id > 0:
+                    self._mark_unreachable(chat_id, reason)
+                raise
+            self.sent[priority] += 1
+            return response
+    
+    def _mark_unreachable(self, chat_id: int, reason: str) -> None:
+        """Запомнить недоступного пользователя; запись в базу идёт пачкой в фоне."""
+        self._unreachable[chat_id] = reason
+        self.unreachable += 1
+        if self._unreachable_flusher is None or self._unreachable_flusher.done():
+            self._unreachable_flusher = asyncio.create_task(self._flush_unreachable_later())
+    
+    async def _flush_unreachable_later(self) -> None:
+        """Подождать, пока накопится пачка, и записать её."""
+        await asyncio.sleep(UNREACHABLE_FLUSH_INTERVAL)
+        await self.flush_unreachable()
+    
+    async def flush_unreachable(self) -> None:
+        """Записать накопленных недоступных пользователей одним UPDATE на причину."""
+        reasons, self._unreachable = self._unreachable, {}
+        try:
+            await mark_users_unreachable(reasons)
+        except Exception as e:
+            print(f"Error marking users unreachable: {e}")
+
+    async def _acquire(self, chat_id: Any, priority: Priority) -> None:
+        """Встать в очередь чата и дождаться разрешения на отправку."""
+        if self._runner is None or self._runner.done():
+            self._runner = asyncio.create_task(self._run())
+
+        future = asyncio.get_running_loop().create_future()
+        seq = next(self._seq)
+        queue = self._chats.setdefault(chat_id, [])
+        heapq.heappush(queue, (priority, seq, future))
+
+        # Новый запрос стал головой очереди готового чата - он конкурирует сразу
+        if queue[0][1] == seq and self._chat_ready_at.get(chat_id, 0.0) <= time.monotonic():
+            heapq.heappush(self._ready, (priority, seq, chat_id))
+            self._wakeup.set()
+        elif len(queue) == 1:
+            heapq.heappush(self._delayed, (self._chat_ready_at[chat_id], chat_id))
+            self._wakeup.set()
+
+        await future
+
+    def _block_chat(self, chat_id: Any, seconds: float) -> None:
+        """Запретить отправку в чат на указанное время (после RetryAfter)."""
+        self._chat_ready_at[chat_id] = max(
+            self._chat_ready_at.get(chat_id, 0.0), time.monotonic() + seconds
+        )
+
+    def _take_token(self, now: float) -> float:
+        """Взять токен из общего ведра; вернуть, сколько ждать, если токенов нет."""
+        self._tokens = min(self.global_rate, self._tokens + (now - self._refilled_at) * self.global_rate)
+        self._refilled_at = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.global_rate
+
+    def _take_chat_token(self, chat_id: Any, now: float) -> None:
+        """Взять токен из ведра чата и запомнить, когда в нём появится следующий."""
+        tokens, refilled_at = self._chat_tokens.get(chat_id, (self.chat_burst, now))
+        tokens = min(self.chat_burst, tokens + (now - refilled_at) / self.chat_interval) - 1
+        self._chat_tokens[chat_id] = (tokens, now)
+        self._chat_ready_at[chat_id] = now + max(0.0, 1 - tokens) * self.chat_interval
+
+    def _schedule_chat(self, chat_id: Any) -> None:
+        """Поставить чат в ожидание следующего токена его ведра."""
+        queue = self._chats.get(chat_id)
+        if not queue:
+            self._chats.pop(chat_id, None)
+            return
+        heapq.heappush(self._delayed, (self._chat_ready_at.get(chat_id, 0.0), chat_id))
+
+    async def _run(self) -> None:
+        """Цикл выдачи разрешений: приоритет, общее ведро и ведра чатов."""
+        while True:
+            self._wakeup.clear()
+            now = time.monotonic()
+
+            # Чаты, у которых появился токен, становятся готовыми
+            while self._delayed and self._delayed[0][0] <= now:
+                ready_at, chat_id = heapq.heappop(self._delayed)
+                if self._chat_ready_at.get(chat_id, 0.0) > now:
+                    # Чат заблокирован после RetryAfter
+                    heapq.heappush(self._delayed, (self._chat_ready_at[chat_id], chat_id))
+                    continue
+                queue = self._chats.get(chat_id)
+                if queue:
+                    heapq.heappush(self._ready, (queue[0][0], queue[0][1], chat_id))
+
+            granted = False
+            while self._ready:
+                priority, seq, chat_id = self._ready[0]
+                queue = self._chats.get(chat_id)
+                if not queue or queue[0][1] != seq:
+                    # Устаревшая запись: голова очереди чата сменилась
+                    heapq.heappop(self._ready)
+                    continue
+                if queue[0][2].done():
+                    # Отправитель отменил ожидание
+                    heapq.heappop(self._ready)
+                    heapq.heappop(queue)
+                    if queue:
+                        heapq.heappush(self._ready, (queue[0][0], queue[0][1], chat_id))
+                    else:
+                        del self._chats[chat_id]
+                    continue
+                if self._chat_ready_at.get(chat_id, 0.0) > now:
+                    # Чат заблокирован после RetryAfter
+                    heapq.heappop(self._ready)
+                    self._schedule_chat(chat_id)
+                    continue
+
+                wait = self._take_token(now)
+                if wait:
+                    break
+
+                heapq.heappop(self._ready)
+                _, _, future = heapq.heappop(queue)
+                future.set_result(None)
+                self._take_chat_token(chat_id, now)
+                self._schedule_chat(chat_id)
+                granted = True
+
+            if granted:
+                # Не держать метки давно молчащих чатов
+                if len(self._chat_tokens) > 4 * len(self._chats) + 1024:
+                    idle = now - self.chat_burst * self.chat_interval
+                    self._chat_tokens = {
+                        chat_id: state for chat_id, state in self._chat_tokens.items()
+                        if state[1] > idle
+                    }
+                    self._chat_ready_at = {
+                        chat_id: ready_at for chat_id, ready_at in self._chat_ready_at.items()
+                        if ready_at > now
+                    }
+
+            timeout = None
+            if self._ready:
+                timeout = (1 - self._tokens) / self.global_rate
+            elif self._delayed:
+                timeout = max(0.0, self._delayed[0][0] - time.monotonic())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def close(self) -> None:
+        """Остановить цикл выдачи разрешений и записать недоступных пользователей."""
+        if self._runner is not None:
+            self._runner.cancel()
+            self._runner = None
+        if self._unreachable_flusher is not None:
+            self._unreachable_flusher.cancel()
+            self._unreachable_flusher = None
+        await self.flush_unreachable()
+
+    def get_stats(self) -> dict[str, float]:
+        """
+        Получить метрики очереди.
+
+        Returns:
+            Глубина очереди, число отправленных сообщений и задержки в очереди
+            (p50/p95, секунды) по классам приоритета, число RetryAfter, отказов
+            и обнаруженных недоступных пользователей
+        """
+        depth = {priority: 0 for priority in Priority}
+        for queue in self._chats.values():
+            for priority, _, future in queue:
+                if not future.done():
+                    depth[Priority(priority)] += 1
+
+        stats: dict[str, float] = {
+            "retry_after": self.retry_after,
+            "failed": self.failed,
+            "unreachable": self.unreachable,
+        }
+        for priority in Priority:
+            name = priority.name.lower()
+            samples = sorted(self.waits[priority])
+            stats[f"{name}_queued"] = depth[priority]
+            stats[f"{name}_sent"] = self.sent[priority]
+            stats[f"{name}_wait_p50"] = samples[len(samples) // 2] if samples else 0.0
+            stats[f"{name}_wait_p95"] = samples[min(len(samples) - 1, int(0.95 * len(samples)))] if samples else 0.0
+        return stats
+
+
+# Глобальная очередь исходящих сообщений (создаётся в bot.main)
+outbound_queue: OutboundQueue | None = None
+
+
+def init_outbound_queue() -> OutboundQueue:
+    """
+    Создать глобальную очередь исходящих сообщений.
+
+    Returns:
+        OutboundQueue: Очередь, которую нужно подключить к bot.session
+    """
+    global outbound_queue
+
+    if outbound_queue is None:
+        outbound_queue = OutboundQueue()
+
+    return outbound_queue
+
+
+def get_outbound_queue() -> OutboundQueue | None:
+    """Вернуть глобальную очередь исходящих сообщений (None, если не создана)."""
+    return outbound_queue
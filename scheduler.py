@@ -1,22 +1,78 @@
 """Task scheduler for managing reminders and daily digests."""
-from datetime import datetime, timedelta
+import asyncio
+import heapq
+import itertools
+import os
+import socket
+from datetime import datetime, timedelta, timezone as dt_timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.triggers.date import DateTrigger
 from aiogram import Bot
-from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncSession
-from database.models import Task
-from database.engine import async_session_maker
+from database.requests import (
+    iter_reminders_between, iter_overdue_tasks, claim_tasks, complete_tasks,
+    get_user_timezones, iter_users, get_users_tasks_between
+)
+from middlewares import Priority, send_priority
 
 
-# Global scheduler instance
+# Global scheduler instance (cron jobs only, e.g. daily digest)
 scheduler: AsyncIOScheduler | None = None
 
+# Global reminder engine instance (one-off task reminders)
+reminder_engine: "ReminderEngine | None" = None
+
+# Global write-behind buffer for completed reminders
+completion_writer: "CompletionWriter | None" = None
+
+# Upper bound for a single timer sleep, so clock changes are picked up
+MAX_TIMER_SLEEP = 60.0
+
+# Page size for loading reminders from the database
+REMINDER_PAGE_SIZE = 1000
+
+# Telegram message length limit
+MAX_MESSAGE_LENGTH = 4096
+
+# Local hour of the daily digest and how often the digest job checks timezones
+DIGEST_HOUR = 8
+DIGEST_TICK_MINUTES = 15
+
+# Users per page when sending the daily digest
+DIGEST_PAGE_SIZE = 500
+
+
+def get_worker_id() -> str:
+    """
+    Return this bot instance's worker ID, stored in claimed_by of leased rows.
+    
+    Returns:
+        WORKER_ID from the environment, or hostname:pid
+    """
+    return os.getenv("WORKER_ID") or f"{socket.gethostname()}:{os.getpid()}"
+
+
+def reminder_lease() -> tuple[str, timedelta]:
+    """
+    Return this bot instance's worker ID and the reminder lease duration.
+    
+    Several bot instances may share one database. Every instance loads the
+    same reminders, but a reminder is only sent by the instance that
+    claimed its task for the lease duration (see claim_tasks).
+    
+    Returns:
+        Tuple of (worker ID, lease duration)
+    """
+    lease = timedelta(seconds=float(os.getenv("REMINDER_LEASE_SECONDS", "300")))
+    return get_worker_id(), lease
+
 
 async def send_reminder(bot: Bot, user_id: int, text: str, task_id: int) -> None:
     """
     Send reminder message to user and mark task as completed.
     
+    The completion is buffered by CompletionWriter and written together
+    with other reminders of the same tick.
+    
     Args:
         bot: Telegram bot instance
         user_id: Telegram user ID
@@ -31,66 +87,493 @@ async def send_reminder(bot: Bot, user_id: int, text: str, task_id: int) -> None
         )
         
         # Mark task as completed in database
-        async with async_session_maker() as session:
-            result = await session.execute(
-                select(Task).where(Task.id == task_id)
-            )
-            task = result.scalar_one_or_none()
-            
-            if task:
-                task.is_completed = True
-                await session.commit()
+        if completion_writer is not None:
+            completion_writer.add(task_id)
+        else:
+            await complete_tasks([task_id])
                 
     except Exception as e:
         print(f"Error sending reminder: {e}")
 
 
-async def daily_digest(bot: Bot) -> None:
+async def send_reminders(bot: Bot, user_id: int, reminders: list[tuple[int, str]]) -> None:
     """
-    Send daily digest with today's scheduled tasks to all users.
-    This function runs every day at 8:00 AM UTC+3.
+    Send several reminders of one user as a single message and mark them completed.
+    
+    Args:
+        bot: Telegram bot instance
+        user_id: Telegram user ID
+        reminders: List of (task_id, text)
     """
     try:
-        async with async_session_maker() as session:
-            # Get all tasks scheduled for today that are not completed
-            today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-            today_end = today_start + timedelta(days=1)
+        lines = "".join(f"• {text}\n" for _, text in reminders)
+        await bot.send_message(
+            chat_id=user_id,
+            text=f"⏰ Напоминания!\n\n{lines}"[:MAX_MESSAGE_LENGTH]
+        )
+        
+        task_ids = [task_id for task_id, _ in reminders]
+        if completion_writer is not None:
+            for task_id in task_ids:
+                completion_writer.add(task_id)
+        else:
+            await complete_tasks(task_ids)
+    
+    except Exception as e:
+        print(f"Error sending reminders: {e}")
+
+
+class CompletionWriter:
+    """
+    Write-behind buffer for completed tasks.
+    
+    Collects task IDs and flushes them as a single
+    UPDATE tasks SET is_completed = 1 WHERE id IN (...) per tick, or
+    earlier when the buffer is full. Pending IDs are flushed on close.
+    """
+    
+    def __init__(self) -> None:
+        """Initialize the writer with settings from the environment."""
+        self.interval = float(os.getenv("REMINDER_FLUSH_INTERVAL", "1"))
+        self.max_size = int(os.getenv("REMINDER_FLUSH_SIZE", "500"))
+        
+        self._pending: set[int] = set()
+        self._full = asyncio.Event()
+        self._runner: asyncio.Task | None = None
+        self._lock = asyncio.Lock()
+        self._closing = False
+        
+        self.flushes = 0
+        self.written = 0
+    
+    def add(self, task_id: int) -> None:
+        """
+        Buffer a completed task.
+        
+        Args:
+            task_id: Task ID in database
+        """
+        self._pending.add(task_id)
+        if len(self._pending) >= self.max_size:
+            self._full.set()
+    
+    async def flush(self) -> None:
+        """Write all buffered completions in one UPDATE."""
+        async with self._lock:
+            if not self._pending:
+                return
+            task_ids, self._pending = list(self._pending), set()
+            self._full.clear()
+            try:
+                await complete_tasks(task_ids)
+            except asyncio.CancelledError:
+                # The write may not have happened - keep the IDs for the final flush
+                self._pending.update(task_ids)
+                raise
+            except Exception as e:
+                # Keep the IDs for the next attempt
+                self._pending.update(task_ids)
+                print(f"Error flushing completed tasks: {e}")
+                return
+            self.flushes += 1
+            self.written += len(task_ids)
+    
+    async def _run(self) -> None:
+        """Flush every interval or as soon as the buffer is full, until closed."""
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._full.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+    
+    def start(self) -> None:
+        """Start the periodic flush."""
+        if self._runner is None:
+            self._closing = False
+            self._runner = asyncio.create_task(self._run())
+    
+    async def close(self) -> None:
+        """
+        Stop the periodic flush and write what is still buffered.
+        
+        The runner is not cancelled: a flush in progress is allowed to finish,
+        so IDs already taken from the buffer are not lost.
+        """
+        if self._runner is not None:
+            self._closing = True
+            self._full.set()
+            await self._runner
+            self._runner = None
+        await asyncio.shield(self.flush())
+    
+    def get_stats(self) -> dict[str, int]:
+        """
+        Return writer statistics.
+        
+        Returns:
+            Dictionary with pending IDs, number of flushes and written rows
+        """
+        return {
+            "pending": len(self._pending),
+            "flushes": self.flushes,
+            "written": self.written,
+        }
+
+
+def _format_digest(tasks: list[tuple[int, datetime, str]]) -> list[str]:
+    """
+    Build digest messages for one user's tasks of the day.
+    
+    Times are shown as stored (server time), the same way they are parsed,
+    confirmed, listed in /mytasks and sent.
+    
+    Args:
+        tasks: List of (user_id, scheduled_time, text) of a single user, sorted by time
+        
+    Returns:
+        Message texts, split to fit the Telegram length limit
+    """
+    header = "📋 План на сегодня:\n\n"
+    messages = []
+    lines: list[str] = []
+    length = len(header)
+    for _, scheduled_time, text in tasks:
+        line = f"• {scheduled_time.strftime('%H:%M')} — {text}\n"
+        if lines and length + len(line) > MAX_MESSAGE_LENGTH:
+            messages.append(header + "".join(lines))
+            lines, length = [], len(header)
+        lines.append(line)
+        length += len(line)
+    if lines:
+        messages.append((header + "".join(lines))[:MAX_MESSAGE_LENGTH])
+    return messages
+
+
+async def _send_timezone_digest(bot: Bot, timezone: str, local_now: datetime) -> int:
+    """
+    Send the digest to all users of one timezone.
+    
+    Users are read page by page; for each page the day's tasks are loaded
+    with one column-only query and sent with bounded concurrency while the
+    next page is being read.
+    
+    Args:
+        bot: Telegram bot instance
+        timezone: IANA timezone name
+        local_now: Current time in this timezone
+        
+    Returns:
+        Number of users that received a digest
+    """
+    concurrency = asyncio.Semaphore(int(os.getenv("DIGEST_CONCURRENCY", "20")))
+    
+    # Task times are server time, so "today" is the user's current date on the server clock;
+    # the timezone only decides when the digest is sent
+    day_start = datetime.combine(local_now.date(), datetime.min.time())
+    day_end = day_start + timedelta(days=1)
+    
+    async def send(user_id: int, messages: list[str]) -> None:
+        async with concurrency:
+            try:
+                for message in messages:
+                    await bot.send_message(chat_id=user_id, text=message)
+            except Exception as e:
+                print(f"Error sending digest to user {user_id}: {e}")
+    
+    sent = 0
+    sending: asyncio.Future | None = None
+    with send_priority(Priority.DIGEST):
+        async for user_ids in iter_users(DIGEST_PAGE_SIZE, timezone=timezone):
+            tasks = await get_users_tasks_between(user_ids, day_start, day_end)
             
-            result = await session.execute(
-                select(Task).where(
-                    Task.scheduled_time >= today_start,
-                    Task.scheduled_time < today_end,
-                    Task.is_completed == False
-                )
-            )
-            tasks = result.scalars().all()
+            sends = []
+            for user_id, user_tasks in itertools.groupby(tasks, key=lambda task: task[0]):
+                sends.append(send(user_id, _format_digest(list(user_tasks))))
+            sent += len(sends)
             
-            # Group tasks by user
-            user_tasks: dict[int, list[Task]] = {}
-            for task in tasks:
-                if task.user_id not in user_tasks:
-                    user_tasks[task.user_id] = []
-                user_tasks[task.user_id].append(task)
+            # At most two pages in flight: wait for the previous one before starting this one
+            if sending is not None:
+                await sending
+            sending = asyncio.gather(*sends)
+        
+        if sending is not None:
+            await sending
+    return sent
+
+
+async def daily_digest(bot: Bot) -> None:
+    """
+    Send daily digest with today's scheduled tasks to users whose local time is 8:00.
+    
+    Runs every DIGEST_TICK_MINUTES, so digests of different timezones are
+    spread across the day instead of landing at one cron tick.
+    """
+    try:
+        now = datetime.now(dt_timezone.utc)
+        for timezone in await get_user_timezones():
+            try:
+                local_now = now.astimezone(ZoneInfo(timezone))
+            except (ZoneInfoNotFoundError, ValueError):
+                print(f"Unknown timezone in users table: {timezone}")
+                continue
             
-            # Send digest to each user
-            for user_id, user_task_list in user_tasks.items():
-                message = "📋 План на сегодня:\n\n"
-                for task in sorted(user_task_list, key=lambda t: t.scheduled_time or datetime.max):
-                    time_str = task.scheduled_time.strftime("%H:%M") if task.scheduled_time else "—"
-                    message += f"• {time_str} — {task.text}\n"
-                
-                try:
-                    await bot.send_message(chat_id=user_id, text=message)
-                except Exception as e:
-                    print(f"Error sending digest to user {user_id}: {e}")
+            if local_now.hour == DIGEST_HOUR and local_now.minute < DIGEST_TICK_MINUTES:
+                await _send_timezone_digest(bot, timezone, local_now)
                     
     except Exception as e:
         print(f"Error in daily_digest: {e}")
 
 
+class ReminderEngine:
+    """
+    Single-timer reminder dispatcher.
+    
+    Reminders are kept as compact (due, task_id) entries in a min-heap with
+    a task_id -> (due, user_id) index. Insert is O(log n), cancel is O(1)
+    (stale heap entries are skipped lazily). One timer loop sleeps until
+    the earliest reminder is due; reminders that became due while the loop
+    was busy are delivered late instead of being dropped.
+    
+    Only reminders due before `loaded_until` are held in memory. A
+    background refill pages in the next part of the window from the
+    database as time moves on, so startup cost does not depend on how many
+    reminders are scheduled far ahead.
+    
+    The earliest due reminder is held for the coalesce delay, and then
+    everything already due is dispatched together, so reminders of one user
+    that fall due within that delay go out as one message. Reminders are
+    never sent early; they may be sent up to the coalesce delay late.
+    """
+    
+    def __init__(self, bot: Bot) -> None:
+        """
+        Initialize the engine.
+        
+        Args:
+            bot: Telegram bot instance
+        """
+        self.bot = bot
+        
+        # How far ahead reminders are kept in memory and how often the window is extended
+        self.window = timedelta(hours=float(os.getenv("REMINDER_WINDOW_HOURS", "6")))
+        self.refill_interval = timedelta(minutes=float(os.getenv("REMINDER_REFILL_MINUTES", "30")))
+        self.loaded_until: datetime | None = None
+        
+        # The earliest due reminder waits this long so that reminders due meanwhile join it
+        self.coalesce_delay = timedelta(seconds=float(os.getenv("REMINDER_COALESCE_SECONDS", "5")))
+        
+        self._heap: list[tuple[datetime, int]] = []
+        self._entries: dict[int, tuple[datetime, int]] = {}
+        self._wakeup = asyncio.Event()
+        self._runner: asyncio.Task | None = None
+        self._refiller: asyncio.Task | None = None
+        self._dispatching: set[asyncio.Task] = set()
+        
+        self.delivered = 0
+        self.late = 0
+        self.messages = 0
+        self.skipped = 0
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def add(self, task_id: int, user_id: int, due: datetime) -> None:
+        """
+        Schedule (or reschedule) a reminder.
+        
+        Args:
+            task_id: Task ID in database
+            user_id: Telegram user ID
+            due: When to send the reminder
+        """
+        if self.loaded_until is not None and due >= self.loaded_until:
+            # Outside the loaded window - the refill will pick it up from the database
+            self.cancel(task_id)
+            return
+        
+        self._entries[task_id] = (due, user_id)
+        heapq.heappush(self._heap, (due, task_id))
+        
+        # Wake the timer if the new reminder is the earliest one
+        if self._heap[0] == (due, task_id):
+            self._wakeup.set()
+        
+        # Drop stale entries left by cancels and reschedules
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = [(entry_due, entry_id) for entry_id, (entry_due, _) in self._entries.items()]
+            heapq.heapify(self._heap)
+    
+    def cancel(self, task_id: int) -> None:
+        """
+        Cancel a scheduled reminder.
+        
+        Args:
+            task_id: Task ID in database
+        """
+        self._entries.pop(task_id, None)
+    
+    async def load_window(self, start: datetime | None = None) -> int:
+        """
+        Load reminders due before now + window that are not loaded yet.
+        
+        Args:
+            start: Start of the window for the first load (defaults to now)
+        
+        Returns:
+            Number of loaded reminders
+        """
+        start = self.loaded_until or start or datetime.now()
+        end = datetime.now() + self.window
+        if end <= start:
+            return 0
+        
+        # Move the boundary first: tasks created while the query runs are
+        # then added directly by add_task_reminder instead of being missed
+        self.loaded_until = end
+        
+        loaded = 0
+        async for chunk in iter_reminders_between(start, end, REMINDER_PAGE_SIZE):
+            for task_id, user_id, due in chunk:
+                self.add(task_id, user_id, due)
+            loaded += len(chunk)
+        return loaded
+    
+    async def _refill(self) -> None:
+        """Periodically extend the in-memory window."""
+        while True:
+            await asyncio.sleep(self.refill_interval.total_seconds())
+            try:
+                await self.load_window()
+            except Exception as e:
+                print(f"Error loading reminders: {e}")
+    
+    def start(self) -> None:
+        """Start the timer loop and the window refill."""
+        if self._runner is None:
+            self._runner = asyncio.create_task(self._run())
+        if self._refiller is None:
+            self._refiller = asyncio.create_task(self._refill())
+    
+    async def stop(self) -> None:
+        """Stop the timer loop and the window refill, wait for in-flight dispatches."""
+        for task in (self._runner, self._refiller):
+            if task is not None:
+                task.cancel()
+        self._runner = None
+        self._refiller = None
+        await asyncio.gather(*self._dispatching, return_exceptions=True)
+    
+    def _is_stale(self, heap_entry: tuple[datetime, int]) -> bool:
+        """Whether a heap entry was cancelled or rescheduled."""
+        due, task_id = heap_entry
+        entry = self._entries.get(task_id)
+        return entry is None or entry[0] != due
+    
+    def _pop_due(self, now: datetime) -> list[tuple[int, int, datetime]]:
+        """
+        Remove and return reminders to dispatch at `now` as (task_id, user_id, due).
+        
+        Nothing is returned until the earliest reminder has been due for the
+        coalesce delay; then all reminders due by `now` are returned, so a
+        user's reminders due within the delay can be sent as one message.
+        """
+        while self._heap and self._is_stale(self._heap[0]):
+            heapq.heappop(self._heap)
+        if not self._heap or self._heap[0][0] + self.coalesce_delay > now:
+            return []
+        
+        due_entries = []
+        while self._heap and self._heap[0][0] <= now:
+            heap_entry = heapq.heappop(self._heap)
+            if self._is_stale(heap_entry):
+                continue
+            due, task_id = heap_entry
+            user_id = self._entries.pop(task_id)[1]
+            due_entries.append((task_id, user_id, due))
+        return due_entries
+    
+    async def _run(self) -> None:
+        """Timer loop: sleep until the earliest reminder is due (plus the coalesce delay) and dispatch."""
+        while True:
+            self._wakeup.clear()
+            now = datetime.now()
+            
+            due_entries = self._pop_due(now)
+            if due_entries:
+                task = asyncio.create_task(self._dispatch(due_entries, now))
+                self._dispatching.add(task)
+                task.add_done_callback(self._dispatching.discard)
+            
+            timeout = MAX_TIMER_SLEEP
+            if self._heap:
+                wake_at = self._heap[0][0] + self.coalesce_delay
+                timeout = min(timeout, max(0.0, (wake_at - datetime.now()).total_seconds()))
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+    
+    async def _dispatch(self, due_entries: list[tuple[int, int, datetime]], now: datetime) -> None:
+        """Claim due reminders in one conditional UPDATE and send the claimed ones."""
+        worker_id, lease = reminder_lease()
+        try:
+            texts = await claim_tasks([task_id for task_id, _, _ in due_entries], worker_id, lease)
+        except Exception as e:
+            print(f"Error claiming due reminders: {e}")
+            return
+        
+        # Group reminders by user: one message per user
+        user_reminders: dict[int, list[tuple[int, str]]] = {}
+        for task_id, user_id, due in sorted(due_entries, key=lambda entry: entry[2]):
+            # Task was completed or deleted in the meantime, claimed by another instance
+            # or retired because its user is unreachable
+            if task_id not in texts:
+                self.skipped += 1
+                continue
+            if now - due > timedelta(minutes=1):
+                self.late += 1
+            self.delivered += 1
+            user_reminders.setdefault(user_id, []).append((task_id, texts[task_id]))
+        
+        # Pacing is done by the outbound queue, so users are sent to concurrently
+        sends = []
+        with send_priority(Priority.REMINDER):
+            for user_id, reminders in user_reminders.items():
+                self.messages += 1
+                if len(reminders) == 1:
+                    task_id, text = reminders[0]
+                    sends.append(send_reminder(self.bot, user_id, text, task_id))
+                else:
+                    sends.append(send_reminders(self.bot, user_id, reminders))
+            await asyncio.gather(*sends)
+    
+    def get_stats(self) -> dict[str, int | datetime | None]:
+        """
+        Return engine statistics.
+        
+        Returns:
+            Dictionary with scheduled, delivered, late and skipped (not
+            claimed) reminder counts, number of sent messages and the end
+            of the loaded window
+        """
+        return {
+            "scheduled": len(self._entries),
+            "heap_size": len(self._heap),
+            "loaded_until": self.loaded_until,
+            "delivered": self.delivered,
+            "messages": self.messages,
+            "late": self.late,
+            "skipped": self.skipped,
+        }
+
+
 def init_scheduler(bot: Bot) -> AsyncIOScheduler:
     """
-    Initialize and configure the scheduler.
+    Initialize and configure the scheduler and the reminder engine.
+    
+    APScheduler is only used for cron jobs, one-off reminders are handled
+    by ReminderEngine.
     
     Args:
         bot: Telegram bot instance
@@ -98,65 +581,241 @@ def init_scheduler(bot: Bot) -> AsyncIOScheduler:
     Returns:
         Configured AsyncIOScheduler instance
     """
-    global scheduler
+    global scheduler, reminder_engine, completion_writer
+    
+    if reminder_engine is None:
+        reminder_engine = ReminderEngine(bot)
+    
+    if completion_writer is None:
+        completion_writer = CompletionWriter()
     
     if scheduler is None:
         scheduler = AsyncIOScheduler(timezone="Europe/Moscow")
         
-        # Schedule daily digest at 8:00 AM UTC+3
+        # Check every DIGEST_TICK_MINUTES which timezones have reached 8:00 AM
         scheduler.add_job(
             daily_digest,
             trigger='cron',
-            hour=8,
-            minute=0,
+            minute=f"*/{DIGEST_TICK_MINUTES}",
             args=[bot],
             id='daily_digest',
             replace_existing=True
         )
+        
+        # Pick up reminders whose lease expired without delivery (e.g. a crashed instance)
+        scheduler.add_job(
+            sweep_expired_leases,
+            trigger='interval',
+            minutes=float(os.getenv("REMINDER_SWEEP_MINUTES", "5")),
+            args=[bot],
+            id='sweep_expired_leases',
+            replace_existing=True
+        )
     
     return scheduler
 
 
-def add_task_reminder(bot: Bot, user_id: int, task_id: int, text: str, scheduled_time: datetime) -> None:
+def add_task_reminder(user_id: int, task_id: int, scheduled_time: datetime) -> None:
     """
-    Add a new task reminder to the scheduler.
+    Add a new task reminder to the reminder engine.
     
     Args:
-        bot: Telegram bot instance
         user_id: Telegram user ID
         task_id: Task ID in database
-        text: Task text
         scheduled_time: When to send the reminder
     """
-    global scheduler
+    if reminder_engine is None:
+        raise RuntimeError("Scheduler not initialized")
     
-    if scheduler is None:
+    reminder_engine.add(task_id, user_id, scheduled_time)
+
+
+async def load_reminders(start: datetime | None = None) -> int:
+    """
+    Load reminders of the current window from the database.
+    
+    Args:
+        start: Reminders due before this moment are left to the catch-up stage
+    
+    Returns:
+        Number of loaded reminders
+    """
+    if reminder_engine is None:
         raise RuntimeError("Scheduler not initialized")
     
-    # Create unique job ID
-    job_id = f"task_reminder_{task_id}"
+    return await reminder_engine.load_window(start)
+
+
+async def _send_paced(bot: Bot, messages: list[tuple[int, str]], rate: float) -> None:
+    """
+    Send messages concurrently, starting at most `rate` sends per second.
     
-    # Add job to scheduler
-    scheduler.add_job(
-        send_reminder,
-        trigger=DateTrigger(run_date=scheduled_time),
-        args=[bot, user_id, text, task_id],
-        id=job_id,
-        replace_existing=True
-    )
+    Args:
+        bot: Telegram bot instance
+        messages: List of (chat_id, text)
+        rate: Messages per second
+    """
+    async def send(chat_id: int, text: str) -> None:
+        # RetryAfter is retried by the outbound queue
+        try:
+            await bot.send_message(chat_id=chat_id, text=text)
+        except Exception as e:
+            print(f"Error sending missed reminder to user {chat_id}: {e}")
+    
+    sends = []
+    with send_priority(Priority.REMINDER):
+        for chat_id, text in messages:
+            sends.append(asyncio.create_task(send(chat_id, text)))
+            await asyncio.sleep(1 / rate)
+    await asyncio.gather(*sends)
+
+
+def _format_missed(tasks: list[tuple[int, int, str, datetime]], collapse: bool) -> list[tuple[int, str]]:
+    """
+    Build messages for one user's missed reminders.
+    
+    Args:
+        tasks: List of (id, user_id, text, scheduled_time) of a single user
+        collapse: Send one combined message instead of one per reminder
+        
+    Returns:
+        List of (chat_id, text)
+    """
+    user_id = tasks[0][1]
+    if not collapse:
+        return [
+            (user_id, f"⏰ Напоминание! (пропущено в {due.strftime('%d.%m.%Y %H:%M')})\n\n{text}")
+            for _, _, text, due in tasks
+        ]
+    
+    tasks = sorted(tasks, key=lambda task: task[3])
+    messages = []
+    header = "⏰ Пока я был недоступен, ты пропустил напоминания:\n\n"
+    message = header
+    for _, _, text, due in tasks:
+        line = f"• {due.strftime('%d.%m.%Y %H:%M')} — {text}\n"
+        if len(message) + len(line) > MAX_MESSAGE_LENGTH and message != header:
+            messages.append((user_id, message))
+            message = header
+        message += line
+    messages.append((user_id, message[:MAX_MESSAGE_LENGTH]))
+    return messages
+
+
+async def catch_up_missed_reminders(bot: Bot, before: datetime) -> int:
+    """
+    Deliver reminders that came due while the bot was down.
+    
+    Overdue incomplete tasks are streamed chunk by chunk, claimed with a
+    lease (tasks leased by another running instance are skipped), sent
+    through a paced sender (optionally collapsed into one message per user)
+    and marked completed with one bulk UPDATE per chunk.
+    
+    Args:
+        bot: Telegram bot instance
+        before: Tasks due before this moment are considered missed
+        
+    Returns:
+        Number of delivered missed reminders
+    """
+    collapse = os.getenv("REMINDER_CATCHUP_COLLAPSE", "1") == "1"
+    rate = float(os.getenv("REMINDER_CATCHUP_RATE", "25"))
+    worker_id, lease = reminder_lease()
+    
+    async def deliver(tasks: list[tuple[int, int, str, datetime]]) -> None:
+        nonlocal delivered
+        claimed = await claim_tasks([task[0] for task in tasks], worker_id, lease)
+        tasks = [task for task in tasks if task[0] in claimed]
+        if not tasks:
+            return
+        
+        messages = []
+        for _, user_tasks in itertools.groupby(tasks, key=lambda task: task[1]):
+            messages += _format_missed(list(user_tasks), collapse)
+        
+        await _send_paced(bot, messages, rate)
+        await complete_tasks([task[0] for task in tasks])
+        delivered += len(tasks)
+    
+    delivered = 0
+    carry: list[tuple[int, int, str, datetime]] = []
+    try:
+        async for chunk in iter_overdue_tasks(before, REMINDER_PAGE_SIZE):
+            tasks = carry + chunk
+            
+            # The last user may continue in the next chunk - keep their tasks together
+            last_user = tasks[-1][1]
+            split = len(tasks)
+            while split and tasks[split - 1][1] == last_user:
+                split -= 1
+            if split:
+                tasks, carry = tasks[:split], tasks[split:]
+            else:
+                # A single user fills the whole chunk
+                carry = []
+            
+            await deliver(tasks)
+        
+        if carry:
+            await deliver(carry)
+        return delivered
+    except Exception as e:
+        print(f"Error in catch_up_missed_reminders: {e}")
+        return delivered
+
+
+async def sweep_expired_leases(bot: Bot) -> None:
+    """
+    Deliver overdue reminders that nobody holds a valid lease on.
+    
+    Covers reminders claimed by an instance that crashed before sending
+    them: once the lease expires, they are picked up here. Reminders that
+    are only slightly overdue are left to the reminder engine.
+    
+    Args:
+        bot: Telegram bot instance
+    """
+    _, lease = reminder_lease()
+    delivered = await catch_up_missed_reminders(bot, datetime.now() - lease)
+    if delivered:
+        print(f"Delivered {delivered} reminders with expired leases")
+
+
+def cancel_task_reminder(task_id: int) -> None:
+    """
+    Remove a task reminder from the reminder engine.
+    
+    Args:
+        task_id: Task ID in database
+    """
+    if reminder_engine is not None:
+        reminder_engine.cancel(task_id)
 
 
 def start_scheduler() -> None:
-    """Start the scheduler."""
+    """Start the scheduler and the reminder engine."""
     global scheduler
     
     if scheduler and not scheduler.running:
         scheduler.start()
+    
+    if reminder_engine is not None:
+        reminder_engine.start()
+    
+    if completion_writer is not None:
+        completion_writer.start()
 
 
-def shutdown_scheduler() -> None:
-    """Shutdown the scheduler gracefully."""
+async def shutdown_scheduler() -> None:
+    """Shutdown the scheduler and the reminder engine gracefully."""
     global scheduler
     
+    if reminder_engine is not None:
+        await reminder_engine.stop()
+    
+    # Persist completions of already sent reminders
+    if completion_writer is not None:
+        await completion_writer.close()
+    
     if scheduler and scheduler.running:
         scheduler.shutdown()
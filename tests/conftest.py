@@ -0,0 +1,98 @@
+"""Shared pytest setup: make the project root importable."""
+import asyncio
+import contextlib
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def postgres_test_url() -> str | None:
+    """
+    URL of a dedicated, disposable PostgreSQL test database (TEST_DATABASE_URL).
+
+    The app's DATABASE_URL is never used: tests drop all tables of the database.
+    """
+    url = os.getenv("TEST_DATABASE_URL", "")
+    return url if url.startswith("postgresql") else None
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "postgres: needs TEST_DATABASE_URL pointing at a PostgreSQL test database")
+    url = postgres_test_url()
+    if url is not None and url == os.getenv("DATABASE_URL"):
+        raise pytest.UsageError("TEST_DATABASE_URL must not be the app's DATABASE_URL: tests drop all its tables")
+
+
+def pytest_collection_modifyitems(config, items):
+    """Skip tests marked postgres unless TEST_DATABASE_URL points at PostgreSQL."""
+    if postgres_test_url() is not None:
+        return
+    skip = pytest.mark.skip(reason="TEST_DATABASE_URL is not set to a PostgreSQL test database")
+    for item in items:
+        if "postgres" in item.keywords:
+            item.add_marker(skip)
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """
+    Return an async context manager that opens a fresh database for one test.
+
+    Uses a temporary SQLite file, or the PostgreSQL test database from
+    TEST_DATABASE_URL, which is emptied (all tables dropped) before each test.
+    """
+    url = postgres_test_url() or f"sqlite+aiosqlite:///{tmp_path / 'test.db'}"
+    monkeypatch.setenv("DATABASE_URL", url)
+
+    @contextlib.asynccontextmanager
+    async def open_database():
+        from database import engine
+        from database.migrations import schema_version
+        from database.models import Base
+
+        if postgres_test_url() is not None:
+            engine.init_engines(url)
+            async with engine.write_engine.begin() as conn:
+                await conn.run_sync(Base.metadata.drop_all)
+                await conn.run_sync(schema_version.drop, checkfirst=True)
+
+        await engine.async_main()
+        try:
+            yield
+        finally:
+            await engine.close_db()
+
+    return open_database
+
+
+class FakeBot:
+    """Bot stub that records sent and copied messages instead of calling Telegram."""
+
+    def __init__(self, delay: float = 0.0) -> None:
+        self.delay = delay
+        # Calls started so far, including ones still in flight
+        self.calls = 0
+        self.sent: list[tuple[int, str]] = []
+        self.copied: list[int] = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        self.sent.append((chat_id, text))
+
+    async def copy_message(self, chat_id, from_chat_id, message_id, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        self.copied.append(chat_id)
+
+    async def edit_message_text(self, **kwargs):
+        pass
+
+
+@pytest.fixture
+def fake_bot() -> FakeBot:
+    """Return a bot stub; set `delay` to make each send take time."""
+    return FakeBot()
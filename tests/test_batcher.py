@@ -0,0 +1,45 @@
+"""Tests for micro-batching of task parses."""
+import asyncio
+
+from ai.batcher import ParseBatcher
+
+
+def test_user_ids_reach_batch_and_single_parsers():
+    calls = []
+
+    async def parse_batch(messages, current_dt, user_ids):
+        calls.append(("batch", messages, user_ids))
+        return [{"task": message, "datetime": None} for message in messages]
+
+    async def parse_single(message, current_dt, user_id):
+        calls.append(("single", [message], [user_id]))
+        return {"task": message, "datetime": None}
+
+    async def main():
+        batcher = ParseBatcher(parse_batch, parse_single, window=0.01)
+        results = await asyncio.gather(batcher.parse("a", 1), batcher.parse("b", 2))
+        single = await batcher.parse("c", 3)
+        return results, single
+
+    results, single = asyncio.run(main())
+    assert [result["task"] for result in results] == ["a", "b"]
+    assert single["task"] == "c"
+    assert calls == [("batch", ["a", "b"], [1, 2]), ("single", ["c"], [3])]
+
+
+def test_failed_batch_falls_back_with_user_ids():
+    singles = []
+
+    async def parse_batch(messages, current_dt, user_ids):
+        raise ValueError("bad batch")
+
+    async def parse_single(message, current_dt, user_id):
+        singles.append((message, user_id))
+        return {"task": message, "datetime": None}
+
+    async def main():
+        batcher = ParseBatcher(parse_batch, parse_single, window=0.01)
+        return await asyncio.gather(batcher.parse("a", 1), batcher.parse("b", 2))
+
+    asyncio.run(main())
+    assert sorted(singles) == [("a", 1), ("b", 2)]
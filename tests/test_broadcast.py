@@ -0,0 +1,94 @@
+"""Tests for resumable broadcast jobs."""
+import asyncio
+from datetime import datetime, timedelta
+
+from broadcast import BroadcastManager
+from database.requests import create_broadcast, get_broadcast, set_user, update_broadcast
+
+
+def test_stop_checkpoints_current_page(database, monkeypatch, fake_bot):
+    monkeypatch.setenv("BROADCAST_PAGE_SIZE", "2")
+
+    async def main():
+        async with database():
+            for tg_id in range(1, 6):
+                await set_user(tg_id)
+
+            fake_bot.delay = 0.05
+            manager = BroadcastManager(fake_bot)
+            broadcast_id = await manager.create(from_chat_id=1, message_id=1, admin_chat_id=1, progress_message_id=None)
+            # Stop while the first page is being sent
+            while not fake_bot.calls:
+                await asyncio.sleep(0.005)
+            await manager.stop()
+            return fake_bot.copied, await get_broadcast(broadcast_id)
+
+    copied, broadcast = asyncio.run(main())
+    assert sorted(copied) == [1, 2]
+    assert (broadcast.status, broadcast.cursor, broadcast.sent) == ("running", 2, 2)
+
+
+def test_running_job_is_resumed_by_one_instance_only(database, fake_bot):
+    async def main():
+        async with database():
+            for tg_id in range(1, 4):
+                await set_user(tg_id)
+            # A job left running by an instance that crashed before its lease expired
+            broadcast_id = await create_broadcast(1, 1, 1, None, total=3, worker_id="crashed", lease=timedelta(minutes=5))
+
+            first, second = BroadcastManager(fake_bot), BroadcastManager(fake_bot)
+            first.worker_id, second.worker_id = "first", "second"
+            held = await first.resume_running()
+
+            await update_broadcast(broadcast_id, lease_until=datetime.now() - timedelta(seconds=1))
+            resumed = await asyncio.gather(first.resume_running(), second.resume_running())
+            await asyncio.gather(*first._jobs.values(), *second._jobs.values())
+            return held, resumed, fake_bot.copied, await get_broadcast(broadcast_id)
+
+    held, resumed, copied, broadcast = asyncio.run(main())
+    assert held == 0
+    assert sorted(resumed) == [0, 1]
+    assert sorted(copied) == [1, 2, 3]
+    assert (broadcast.status, broadcast.sent) == ("done", 3)
+
+
+def test_job_taken_over_by_another_instance_stops(database, monkeypatch, fake_bot):
+    monkeypatch.setenv("BROADCAST_PAGE_SIZE", "1")
+
+    async def main():
+        async with database():
+            for tg_id in range(1, 4):
+                await set_user(tg_id)
+
+            fake_bot.delay = 0.05
+            manager = BroadcastManager(fake_bot)
+            broadcast_id = await manager.create(from_chat_id=1, message_id=1, admin_chat_id=1, progress_message_id=None)
+            while not fake_bot.calls:
+                await asyncio.sleep(0.005)
+            # Another instance claims the job while the first page is being sent
+            await update_broadcast(broadcast_id, claimed_by="other")
+            await asyncio.gather(*manager._jobs.values())
+            return fake_bot.copied, await get_broadcast(broadcast_id)
+
+    copied, broadcast = asyncio.run(main())
+    assert copied == [1]
+    assert (broadcast.status, broadcast.cursor, broadcast.claimed_by) == ("running", None, "other")
+
+
+def test_stop_releases_the_lease(database, fake_bot):
+    async def main():
+        async with database():
+            await set_user(1)
+            await set_user(2)
+            manager = BroadcastManager(fake_bot)
+            manager._stopping = True
+            broadcast_id = await manager.create(from_chat_id=1, message_id=1, admin_chat_id=1, progress_message_id=None)
+            await asyncio.gather(*manager._jobs.values())
+
+            restarted = BroadcastManager(fake_bot)
+            restarted.worker_id = "restarted"
+            resumed = await restarted.resume_running()
+            await restarted.stop()
+            return resumed
+
+    assert asyncio.run(main()) == 1
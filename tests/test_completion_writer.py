@@ -0,0 +1,52 @@
+"""Tests for the write-behind buffer of completed reminders."""
+import asyncio
+
+import scheduler
+from scheduler import CompletionWriter
+
+
+def test_close_during_flush_keeps_completions(monkeypatch):
+    written = []
+    started = asyncio.Event()
+
+    async def slow_complete_tasks(task_ids):
+        started.set()
+        await asyncio.sleep(0.05)
+        written.extend(task_ids)
+
+    monkeypatch.setattr(scheduler, "complete_tasks", slow_complete_tasks)
+    monkeypatch.setenv("REMINDER_FLUSH_SIZE", "2")
+
+    async def main():
+        writer = CompletionWriter()
+        writer.start()
+        writer.add(1)
+        writer.add(2)  # buffer is full - the runner starts a flush
+        await started.wait()
+        writer.add(3)
+        await writer.close()
+        return writer
+
+    writer = asyncio.run(main())
+    assert sorted(written) == [1, 2, 3]
+    assert writer.get_stats()["pending"] == 0
+
+
+def test_failed_flush_keeps_ids_for_next_attempt(monkeypatch):
+    attempts = []
+
+    async def flaky_complete_tasks(task_ids):
+        attempts.append(sorted(task_ids))
+        if len(attempts) == 1:
+            raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(scheduler, "complete_tasks", flaky_complete_tasks)
+
+    async def main():
+        writer = CompletionWriter()
+        writer.add(1)
+        await writer.flush()
+        await writer.close()
+
+    asyncio.run(main())
+    assert attempts == [[1], [1]]
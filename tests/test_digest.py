@@ -0,0 +1,29 @@
+"""Tests for the daily digest."""
+import asyncio
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from database.requests import add_task, set_user, set_user_timezone
+from scheduler import _send_timezone_digest
+
+
+def test_digest_shows_times_as_confirmed_to_the_user(database, fake_bot):
+    async def main():
+        async with database():
+            await set_user(1)
+            await set_user_timezone(1, "Asia/Novosibirsk")
+            # Confirmed to the user as "17.10.2026 в 09:00"
+            await add_task(1, "позвонить маме", datetime(2026, 10, 17, 9, 0))
+            await add_task(1, "завтрашняя задача", datetime(2026, 10, 18, 9, 0))
+
+            local_now = datetime(2026, 10, 17, 8, 0, tzinfo=ZoneInfo("Asia/Novosibirsk"))
+            sent = await _send_timezone_digest(fake_bot, "Asia/Novosibirsk", local_now)
+            return sent, fake_bot.sent
+
+    sent, messages = asyncio.run(main())
+    assert sent == 1
+    assert len(messages) == 1
+    chat_id, text = messages[0]
+    assert chat_id == 1
+    assert "09:00 — позвонить маме" in text
+    assert "завтрашняя задача" not in text
@@ -0,0 +1,88 @@
+"""Tests for the database-backed FSM storage."""
+import asyncio
+
+from aiogram.fsm.storage.base import StorageKey
+
+from database.requests import delete_expired_fsm_records, get_fsm_record
+from database.storage import DatabaseStorage, deserialize_data, serialize_data
+
+KEY = StorageKey(bot_id=1, chat_id=10, user_id=10)
+
+
+def test_serialization_round_trip():
+    small = {"chat_id": 1, "message_id": 2}
+    large = {"transcript": "купить молоко " * 100}
+
+    assert serialize_data({}) is None
+    assert serialize_data(small)[:1] == b"j"
+    assert serialize_data(large)[:1] == b"z"
+    assert len(serialize_data(large)) < len(str(large).encode())
+    assert deserialize_data(serialize_data(small)) == small
+    assert deserialize_data(serialize_data(large)) == large
+    assert deserialize_data(None) == {}
+
+
+def test_state_survives_restart_and_clear_deletes_record(database):
+    async def main():
+        async with database():
+            storage = DatabaseStorage()
+            await storage.set_state(KEY, "Newsletter:confirm")
+            await storage.update_data(KEY, {"chat_id": 5, "message_id": 7})
+            await storage.close()
+
+            # A new instance (e.g. after a restart) reads the record from the database
+            restarted = DatabaseStorage()
+            restored = await restarted.get_state(KEY), await restarted.get_data(KEY)
+
+            # FSMContext.clear()
+            await restarted.set_state(KEY, None)
+            await restarted.set_data(KEY, {})
+            record = await get_fsm_record(restarted.key_builder.build(KEY))
+            cleared = await restarted.get_state(KEY), await restarted.get_data(KEY)
+            await restarted.close()
+            return restored, record, cleared
+
+    restored, record, cleared = asyncio.run(main())
+    assert restored == ("Newsletter:confirm", {"chat_id": 5, "message_id": 7})
+    assert record is None
+    assert cleared == (None, {})
+
+
+def test_expired_state_is_dropped(database, monkeypatch):
+    monkeypatch.setenv("FSM_TTL_SECONDS", "0")
+
+    async def main():
+        async with database():
+            storage = DatabaseStorage()
+            await storage.set_state(KEY, "Newsletter:confirm")
+            await storage.set_data(KEY, {"chat_id": 5})
+            state, data = await storage.get_state(KEY), await storage.get_data(KEY)
+            evicted = await delete_expired_fsm_records()
+            await storage.close()
+            return state, data, evicted
+
+    state, data, evicted = asyncio.run(main())
+    assert (state, data) == (None, {})
+    assert evicted == 1
+
+
+def test_cache_is_bounded(database, monkeypatch):
+    monkeypatch.setenv("FSM_CACHE_SIZE", "2")
+
+    async def main():
+        async with database():
+            storage = DatabaseStorage()
+            for chat_id in range(5):
+                await storage.set_state(StorageKey(bot_id=1, chat_id=chat_id, user_id=chat_id), "Form:name")
+            cached = storage.get_stats()["cached"]
+
+            # The oldest entry was evicted from the cache but is still in the database
+            misses = storage.misses
+            state = await storage.get_state(StorageKey(bot_id=1, chat_id=0, user_id=0))
+            await storage.close()
+            return cached, state, storage.misses - misses
+
+    cached, state, new_misses = asyncio.run(main())
+    assert cached == 2
+    assert state == "Form:name"
+    assert new_misses == 1
@@ -0,0 +1,74 @@
+"""Tests for the adaptive concurrency limiter."""
+import asyncio
+
+import httpx
+from openai import RateLimitError
+
+from ai.limiter import AdaptiveLimiter
+
+
+def rate_limit_error(retry_after: str | None = None) -> RateLimitError:
+    headers = {"retry-after": retry_after} if retry_after is not None else {}
+    response = httpx.Response(429, headers=headers, request=httpx.Request("POST", "https://example.com"))
+    return RateLimitError("Too Many Requests", response=response, body=None)
+
+
+def test_rate_limited_call_is_retried_and_cap_is_cut():
+    async def main():
+        limiter = AdaptiveLimiter(max_limit=8)
+        attempts = 0
+
+        async def call():
+            nonlocal attempts
+            attempts += 1
+            if attempts == 1:
+                raise rate_limit_error("0")
+            return "ok"
+
+        result = await limiter.run(call, user_id=1)
+        return result, attempts, limiter.get_stats()
+
+    result, attempts, stats = asyncio.run(main())
+    assert (result, attempts) == ("ok", 2)
+    assert (stats["rate_limited"], stats["retries"], stats["inflight"]) == (1, 1, 0)
+    # Halved on 429, then grown a little by the successful retry
+    assert 4 <= stats["limit"] < 5
+
+
+def test_retries_are_exhausted():
+    async def main():
+        limiter = AdaptiveLimiter(max_retries=1, backoff_base=0.01)
+
+        async def call():
+            raise rate_limit_error()
+
+        try:
+            await limiter.run(call)
+        except RateLimitError:
+            return limiter.get_stats()
+
+    stats = asyncio.run(main())
+    assert (stats["rate_limited"], stats["retries"], stats["inflight"]) == (2, 1, 0)
+
+
+def test_waiting_users_are_served_round_robin():
+    async def main():
+        limiter = AdaptiveLimiter(max_limit=1)
+        order = []
+
+        def call(name):
+            async def run():
+                order.append(name)
+                await asyncio.sleep(0.01)
+            return run
+
+        await asyncio.gather(
+            limiter.run(call("a1"), user_id="a"),
+            limiter.run(call("a2"), user_id="a"),
+            limiter.run(call("a3"), user_id="a"),
+            limiter.run(call("b1"), user_id="b"),
+        )
+        return order
+
+    # User b does not wait behind all of user a's requests
+    assert asyncio.run(main()) == ["a1", "a2", "b1", "a3"]
@@ -0,0 +1,45 @@
+"""Tests for the rule-based date/time fast path."""
+from datetime import datetime
+
+import pytest
+
+from ai.local_parser import parse_task_locally
+
+
+# Monday
+NOW = datetime(2025, 12, 29, 10, 0)
+
+
+@pytest.mark.parametrize("message, expected", [
+    ("завтра в 9 купить хлеб", ("Купить хлеб", "2025-12-30 09:00:00")),
+    ("позвонить в 18:30", ("Позвонить", "2025-12-29 18:30:00")),
+    ("позвонить 18:30", ("Позвонить", "2025-12-29 18:30:00")),
+    ("Сходить к врачу в 12.05", ("Сходить к врачу", "2025-12-29 12:05:00")),
+    ("созвон 12.30 ч", ("Созвон", "2025-12-29 12:30:00")),
+    ("во вторник в 10 встреча", ("Встреча", "2025-12-30 10:00:00")),
+    ("через 2 часа позвонить", ("Позвонить", "2025-12-29 12:00:00")),
+    ("позвонить маме", ("Позвонить маме", None)),
+    # ё is kept in the task text
+    ("завтра в 10 купить ёлку", ("Купить ёлку", "2025-12-30 10:00:00")),
+    ("Ёлку нарядить в 18:00", ("Ёлку нарядить", "2025-12-29 18:00:00")),
+])
+def test_parses_common_phrasings(message, expected):
+    result = parse_task_locally(message, NOW)
+    assert (result["task"], result["datetime"]) == expected
+
+
+@pytest.mark.parametrize("message", [
+    # dd.mm date, not a time
+    "Сходить к врачу 12.05",
+    # "следующий"/"этот" are ambiguous about the week
+    "в следующий вторник в 10 встреча",
+    "в этот вторник в 10 встреча",
+    # 03:00 or 15:00
+    "завтра в 3 позвонить",
+    "завтра позвонить",
+    # Deadlines, not reminder times
+    "отправить отчет до 18:00",
+    "сдать отчёт к 18:00",
+])
+def test_leaves_ambiguous_messages_to_llm(message):
+    assert parse_task_locally(message, NOW) is None
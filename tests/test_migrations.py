@@ -0,0 +1,39 @@
+"""Tests for versioned schema migrations."""
+import asyncio
+
+from sqlalchemy import inspect, select
+
+from database import engine
+from database.migrations import MIGRATIONS, run_migrations, schema_version
+
+
+def test_database_at_version_3_gets_the_lease_index(database):
+    def downgrade_to_version_3(conn) -> None:
+        conn.exec_driver_sql("DROP INDEX ix_tasks_open_lease")
+        conn.execute(schema_version.delete().where(schema_version.c.version > 3))
+
+    def upgrade(conn):
+        done = run_migrations(conn)
+        indexes = {index["name"] for index in inspect(conn).get_indexes("tasks")}
+        versions = list(conn.execute(select(schema_version.c.version).order_by(schema_version.c.version)).scalars())
+        return done, indexes, versions
+
+    async def main():
+        async with database():
+            async with engine.write_engine.begin() as conn:
+                await conn.run_sync(downgrade_to_version_3)
+            async with engine.write_engine.begin() as conn:
+                return await conn.run_sync(upgrade)
+
+    done, indexes, versions = asyncio.run(main())
+    assert done == [version for version, _, _ in MIGRATIONS if version > 3]
+    assert "ix_tasks_open_lease" in indexes
+    assert versions == [version for version, _, _ in MIGRATIONS]
+
+
+def test_released_migrations_keep_their_numbers():
+    assert [(version, migrate.__name__) for version, _, migrate in MIGRATIONS[:3]] == [
+        (1, "add_missing_columns"),
+        (2, "add_task_indexes"),
+        (3, "add_missing_columns"),
+    ]
@@ -0,0 +1,77 @@
+"""Tests for the prioritized outbound queue."""
+import asyncio
+import time
+
+import pytest
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from database.requests import iter_users, set_user
+from middlewares.outbound import OutboundQueue, Priority, send_priority
+
+
+def test_higher_priority_is_sent_first_when_tokens_run_out(monkeypatch):
+    monkeypatch.setenv("OUTBOUND_GLOBAL_RATE", "2")
+
+    async def main():
+        queue = OutboundQueue()
+        order = []
+
+        async def make_request(bot, method):
+            order.append(method.chat_id)
+
+        async def send(chat_id, priority):
+            with send_priority(priority):
+                await queue(make_request, None, SendMessage(chat_id=chat_id, text="x"))
+
+        # Two tokens in the bucket: the broadcast enqueued first has to wait
+        await asyncio.gather(send(1, Priority.BULK), send(2, Priority.INTERACTIVE), send(3, Priority.REMINDER))
+        await queue.close()
+        return order, queue.get_stats()
+
+    order, stats = asyncio.run(main())
+    assert order == [2, 3, 1]
+    assert (stats["interactive_sent"], stats["reminder_sent"], stats["bulk_sent"]) == (1, 1, 1)
+
+
+def test_retry_after_blocks_chat_and_retries():
+    async def main():
+        queue = OutboundQueue()
+        calls = []
+
+        async def make_request(bot, method):
+            calls.append(time.monotonic())
+            if len(calls) == 1:
+                raise TelegramRetryAfter(method, "Too Many Requests", retry_after=1)
+            return "ok"
+
+        response = await queue(make_request, None, SendMessage(chat_id=1, text="x"))
+        await queue.close()
+        return response, calls, queue.get_stats()
+
+    response, calls, stats = asyncio.run(main())
+    assert response == "ok"
+    assert len(calls) == 2
+    assert calls[1] - calls[0] >= 0.9
+    assert (stats["retry_after"], stats["failed"]) == (1, 0)
+
+
+def test_blocked_user_is_marked_unreachable(database):
+    async def main():
+        async with database():
+            await set_user(1)
+            await set_user(2)
+            queue = OutboundQueue()
+
+            async def make_request(bot, method):
+                raise TelegramForbiddenError(method, "Forbidden: bot was blocked by the user")
+
+            with pytest.raises(TelegramForbiddenError):
+                await queue(make_request, None, SendMessage(chat_id=2, text="x"))
+            # Pending unreachable users are written on close
+            await queue.close()
+            return [tg_id async for chunk in iter_users(100) for tg_id in chunk], queue.get_stats()
+
+    users, stats = asyncio.run(main())
+    assert users == [1]
+    assert stats["unreachable"] == 1
@@ -0,0 +1,54 @@
+"""Tests for the task parse cache."""
+from datetime import datetime, timedelta
+
+from ai.cache import DATETIME_FORMAT, ParseCache, normalize_message
+
+NOW = datetime(2026, 3, 10, 12, 0)
+
+
+def test_relative_parse_is_re_anchored_to_current_time():
+    cache = ParseCache()
+    parsed = {"task": "позвонить маме", "datetime": (NOW + timedelta(hours=2)).strftime(DATETIME_FORMAT)}
+    cache.put("Через 2 часа позвонить маме", parsed, NOW)
+
+    later = NOW + timedelta(days=1)
+    assert cache.get("  через 2 часа   позвонить маме!", later) == {
+        "task": "позвонить маме",
+        "datetime": (later + timedelta(hours=2)).strftime(DATETIME_FORMAT),
+    }
+
+
+def test_calendar_anchored_parse_is_not_cached():
+    cache = ParseCache()
+    cache.put("завтра в 9 позвонить маме", {"task": "позвонить маме", "datetime": "2026-03-11 09:00:00"}, NOW)
+    cache.put("через 2 дня 12.05 позвонить", {"task": "позвонить", "datetime": "2026-05-12 12:00:00"}, NOW)
+
+    assert cache.get("завтра в 9 позвонить маме", NOW) is None
+    assert cache.get("через 2 дня 12.05 позвонить", NOW) is None
+    assert cache.get_stats()["entries"] == 0
+
+
+def test_backlog_task_is_cached():
+    cache = ParseCache()
+    cache.put("Купить молоко", {"task": "Купить молоко", "datetime": None}, NOW)
+
+    assert cache.get("купить молоко.", NOW) == {"task": "Купить молоко", "datetime": None}
+    assert normalize_message("Ёлка  к празднику!") == "елка к празднику"
+
+
+def test_lru_eviction_and_ttl():
+    cache = ParseCache(max_entries=2)
+    for text in ("a", "b"):
+        cache.put(text, {"task": text, "datetime": None}, NOW)
+    # "a" becomes the most recently used, so "b" is evicted
+    cache.get("a", NOW)
+    cache.put("c", {"task": "c", "datetime": None}, NOW)
+
+    assert cache.get("b", NOW) is None
+    assert cache.get("a", NOW) is not None
+    assert cache.get_stats()["evictions"] == 1
+
+    expired = ParseCache(ttl=-1)
+    expired.put("a", {"task": "a", "datetime": None}, NOW)
+    assert expired.get("a", NOW) is None
+    assert expired.get_stats()["entries"] == 0
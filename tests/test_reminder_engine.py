@@ -0,0 +1,88 @@
+"""Tests for the heap-based reminder engine."""
+import asyncio
+from datetime import datetime, timedelta
+
+from database.requests import add_task, iter_overdue_tasks, set_user
+from scheduler import ReminderEngine
+
+
+def test_pop_due_skips_cancelled_and_rescheduled(monkeypatch):
+    monkeypatch.setenv("REMINDER_COALESCE_SECONDS", "0")
+    engine = ReminderEngine(bot=None)
+    now = datetime(2026, 1, 1, 12, 0)
+
+    engine.add(1, 100, now - timedelta(minutes=2))
+    engine.add(2, 100, now - timedelta(minutes=1))
+    engine.add(3, 200, now - timedelta(minutes=3))
+    engine.add(4, 200, now + timedelta(minutes=5))
+    engine.cancel(2)
+    # Rescheduled to later: the old heap entry is stale
+    engine.add(3, 200, now + timedelta(minutes=1))
+
+    assert engine._pop_due(now) == [(1, 100, now - timedelta(minutes=2))]
+    assert len(engine) == 2
+    assert [task_id for task_id, _, _ in engine._pop_due(now + timedelta(minutes=10))] == [3, 4]
+    assert len(engine) == 0
+
+
+def test_pop_due_coalesces_only_reminders_already_due(monkeypatch):
+    monkeypatch.setenv("REMINDER_COALESCE_SECONDS", "5")
+    engine = ReminderEngine(bot=None)
+    now = datetime(2026, 1, 1, 12, 0)
+
+    engine.add(1, 100, now)
+    engine.add(2, 100, now + timedelta(seconds=3))
+    engine.add(3, 100, now + timedelta(seconds=30))
+    engine.add(4, 200, now + timedelta(seconds=4))
+
+    # The first reminder waits for the coalesce delay
+    assert engine._pop_due(now) == []
+    # Then everything already due goes out together; nothing is sent early
+    popped = engine._pop_due(now + timedelta(seconds=5))
+    assert sorted(task_id for task_id, _, _ in popped) == [1, 2, 4]
+    assert all(due <= now + timedelta(seconds=5) for _, _, due in popped)
+    assert sorted(engine._entries) == [3]
+
+
+def test_add_outside_loaded_window_is_left_to_refill():
+    engine = ReminderEngine(bot=None)
+    now = datetime.now()
+    engine.loaded_until = now + timedelta(hours=1)
+
+    engine.add(1, 100, now + timedelta(minutes=30))
+    engine.add(2, 100, now + timedelta(hours=2))
+
+    assert sorted(engine._entries) == [1]
+
+
+def test_due_reminders_of_one_user_are_sent_as_one_message(database, fake_bot, monkeypatch):
+    monkeypatch.setenv("REMINDER_COALESCE_SECONDS", "0.2")
+
+    async def main():
+        async with database():
+            await set_user(1)
+            due = datetime.now()
+            tasks = [await add_task(1, text, due) for text in ("купить молоко", "позвонить врачу")]
+
+            engine = ReminderEngine(fake_bot)
+            for task in tasks:
+                engine.add(task.id, 1, due)
+            engine.start()
+            try:
+                for _ in range(50):
+                    if engine.delivered == 2 and not engine._dispatching:
+                        break
+                    await asyncio.sleep(0.05)
+            finally:
+                await engine.stop()
+
+            remaining = [task async for chunk in iter_overdue_tasks(datetime.now() + timedelta(minutes=1)) for task in chunk]
+            return fake_bot.sent, engine.get_stats(), remaining
+
+    sent, stats, remaining = asyncio.run(main())
+    assert len(sent) == 1
+    chat_id, text = sent[0]
+    assert chat_id == 1
+    assert "купить молоко" in text and "позвонить врачу" in text
+    assert (stats["delivered"], stats["messages"], stats["skipped"]) == (2, 1, 0)
+    assert remaining == []
@@ -0,0 +1,80 @@
+"""Tests for reminder leases (claim_tasks) and catch-up delivery."""
+import asyncio
+from datetime import datetime, timedelta
+
+from database.requests import (
+    add_task, claim_tasks, get_lease_counts, iter_overdue_tasks, mark_users_unreachable, set_user
+)
+from scheduler import catch_up_missed_reminders
+
+
+async def overdue_ids(before: datetime) -> list[int]:
+    return [task[0] async for chunk in iter_overdue_tasks(before) for task in chunk]
+
+
+def test_due_task_is_delivered_once(database, fake_bot):
+    async def main():
+        async with database():
+            await set_user(42)
+            await add_task(42, "позвонить маме", datetime.now() - timedelta(hours=1))
+            delivered = await catch_up_missed_reminders(fake_bot, datetime.now())
+            # The task is completed, so the next sweep finds nothing
+            again = await catch_up_missed_reminders(fake_bot, datetime.now())
+            return delivered, again, fake_bot.sent, await overdue_ids(datetime.now())
+
+    delivered, again, sent, remaining = asyncio.run(main())
+    assert (delivered, again) == (1, 0)
+    assert [chat_id for chat_id, _ in sent] == [42]
+    assert "позвонить маме" in sent[0][1]
+    assert remaining == []
+
+
+def test_tasks_of_unreachable_user_are_retired(database, fake_bot):
+    async def main():
+        async with database():
+            await set_user(7)
+            await add_task(7, "купить хлеб", datetime.now() - timedelta(hours=1))
+            await mark_users_unreachable({7: "blocked"})
+            delivered = await catch_up_missed_reminders(fake_bot, datetime.now())
+            return delivered, fake_bot.sent, await overdue_ids(datetime.now())
+
+    delivered, sent, remaining = asyncio.run(main())
+    assert (delivered, sent) == (0, [])
+    # Completed instead of being rescanned by every sweep
+    assert remaining == []
+
+
+def test_concurrent_claims_do_not_overlap(database):
+    async def main():
+        async with database():
+            await set_user(1)
+            ids = [(await add_task(1, f"задача {i}", datetime.now())).id for i in range(20)]
+            lease = timedelta(minutes=5)
+            first, second = await asyncio.gather(
+                claim_tasks(ids, "worker-1", lease),
+                claim_tasks(ids, "worker-2", lease),
+            )
+            again = await claim_tasks(ids, "worker-3", lease)
+            return ids, first, second, again, await get_lease_counts()
+
+    ids, first, second, again, counts = asyncio.run(main())
+    assert not set(first) & set(second)
+    assert sorted(set(first) | set(second)) == ids
+    assert again == {}
+    assert counts == {"leased": 20, "expired": 0}
+
+
+def test_expired_lease_can_be_reclaimed(database):
+    async def main():
+        async with database():
+            await set_user(1)
+            task = await add_task(1, "полить цветы", datetime.now())
+            crashed = await claim_tasks([task.id], "crashed", timedelta(0))
+            counts = await get_lease_counts()
+            reclaimed = await claim_tasks([task.id], "alive", timedelta(minutes=5))
+            return task.id, crashed, counts, reclaimed
+
+    task_id, crashed, counts, reclaimed = asyncio.run(main())
+    assert crashed == {task_id: "полить цветы"}
+    assert counts == {"leased": 0, "expired": 1}
+    assert reclaimed == {task_id: "полить цветы"}
@@ -0,0 +1,27 @@
+"""Tests for cleaning up abandoned speculative voice parses."""
+import asyncio
+
+import handlers.main as handlers_main
+from handlers.main import SPECULATIVE_PARSE_TTL, sweep_speculative_parses
+
+
+def test_sweep_drops_only_expired_parses(monkeypatch):
+    parses = {}
+    monkeypatch.setattr(handlers_main, "speculative_parses", parses)
+
+    async def main():
+        now = asyncio.get_running_loop().time()
+        abandoned = asyncio.create_task(asyncio.sleep(60))
+        fresh = asyncio.create_task(asyncio.sleep(60))
+        parses[(1, 1)] = ("позвонить маме", abandoned, now - SPECULATIVE_PARSE_TTL - 1)
+        parses[(2, 2)] = ("купить хлеб", fresh, now)
+
+        removed = await sweep_speculative_parses()
+        await asyncio.sleep(0)
+        fresh.cancel()
+        return removed, list(parses), abandoned.cancelled()
+
+    removed, remaining, cancelled = asyncio.run(main())
+    assert removed == 1
+    assert remaining == [(2, 2)]
+    assert cancelled
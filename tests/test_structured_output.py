@@ -0,0 +1,71 @@
+"""Tests for deciding when structured output mode is turned off."""
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+import httpx
+from openai import BadRequestError
+
+from ai.limiter import AdaptiveLimiter
+from ai.providers import HedgedCaller, Provider
+from ai.service import AIService, is_structured_output_error
+
+
+def make_error(message: str, body: object = None) -> BadRequestError:
+    response = httpx.Response(400, request=httpx.Request("POST", "https://example.com/chat/completions"))
+    return BadRequestError(message, response=response, body=body)
+
+
+def test_schema_errors_disable_structured_mode():
+    assert is_structured_output_error(make_error("Invalid parameter: 'response_format' of type 'json_schema' is not supported"))
+    assert is_structured_output_error(make_error("Bad request", body={"error": {"param": "response_format"}}))
+
+
+def test_unrelated_errors_keep_structured_mode():
+    assert not is_structured_output_error(make_error("This model's maximum context length is 8192 tokens"))
+    assert not is_structured_output_error(make_error("Content filtered", body={"error": {"code": "content_filter"}}))
+
+
+def make_response(content: str) -> SimpleNamespace:
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=None)
+
+
+def make_provider(name: str, create) -> Provider:
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    return Provider(name, client, "model", AdaptiveLimiter())
+
+
+def test_schema_error_switches_only_that_provider_to_text(monkeypatch):
+    monkeypatch.setenv("AI_API_KEY", "test")
+    monkeypatch.setenv("AI_STRUCTURED_OUTPUT", "1")
+    answer = '{"task": "Позвонить маме", "datetime": "2026-10-18 09:00:00"}'
+    primary_formats = []
+
+    async def primary_create(**kwargs):
+        primary_formats.append("response_format" in kwargs)
+        await asyncio.sleep(0.05)
+        return make_response(answer)
+
+    async def fallback_create(**kwargs):
+        if "response_format" in kwargs:
+            raise make_error("Invalid parameter: 'response_format' of type 'json_schema' is not supported")
+        await asyncio.sleep(0.2)
+        return make_response(answer)
+
+    async def main():
+        service = AIService()
+        primary = make_provider("primary", primary_create)
+        fallback = make_provider("fallback", fallback_create)
+        service.providers = HedgedCaller([primary, fallback], hedge_delay=0.01)
+        messages = service._build_messages("завтра в 9 позвонить маме", datetime(2026, 10, 17, 12, 0))
+        first = await service._parse_with_llm("завтра в 9 позвонить маме", datetime(2026, 10, 17, 12, 0))
+        second = await service._parse_structured(messages)
+        return service, primary, fallback, first, second
+
+    service, primary, fallback, first, second = asyncio.run(main())
+    assert first == second == {"task": "Позвонить маме", "datetime": "2026-10-18 09:00:00"}
+    assert fallback.structured_output is False
+    assert primary.structured_output is True
+    assert service.structured_output is True
+    assert primary_formats == [True, True]
+    assert service.parse_stats["structured_errors"] == 0
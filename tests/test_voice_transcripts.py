@@ -0,0 +1,49 @@
+"""Tests for the voice transcript cache in the database."""
+import asyncio
+
+from sqlalchemy import select
+
+from database import requests
+from database.engine import async_session_maker
+from database.models import VoiceTranscript
+from database.requests import get_voice_transcript, save_voice_transcript
+
+
+class CountingWriter:
+    """Wraps the database writer and counts the writes routed through it."""
+
+    def __init__(self, writer) -> None:
+        self.writer = writer
+        self.writes = 0
+
+    async def run(self, write):
+        self.writes += 1
+        return await self.writer.run(write)
+
+
+async def last_used_at(file_unique_id: str):
+    async with async_session_maker() as session:
+        return await session.scalar(
+            select(VoiceTranscript.last_used_at).where(VoiceTranscript.file_unique_id == file_unique_id)
+        )
+
+
+def test_lookup_writes_only_on_hit(database, monkeypatch):
+    writer = CountingWriter(requests.db_writer)
+    monkeypatch.setattr(requests, "db_writer", writer)
+
+    async def main():
+        async with database():
+            await save_voice_transcript("voice", "позвонить маме", max_entries=10)
+            saved_at = await last_used_at("voice")
+
+            writer.writes = 0
+            missed = await get_voice_transcript("other")
+            miss_writes = writer.writes
+            hit = await get_voice_transcript("voice")
+            return missed, miss_writes, hit, writer.writes, saved_at, await last_used_at("voice")
+
+    missed, miss_writes, hit, writes, saved_at, used_at = asyncio.run(main())
+    assert (missed, miss_writes) == (None, 0)
+    assert (hit, writes) == ("позвонить маме", 1)
+    assert used_at > saved_at